@@ -0,0 +1,35 @@
+"""Shared setup for the benchmarks, which run under CPython against the stand-ins in `benchmarks/fakes`."""
+import sys
+
+
+def _parent(path: str) -> str:  # no os.path, so this also imports on MicroPython
+    index = path.rfind("/")
+    if index < 0:
+        return "."
+    return path[:index] or "/"
+
+
+BENCHMARKS_DIR = _parent(__file__)
+
+
+def use_fakes():
+    """Put the stand-ins for usniffs, mqtt_as and mpstore, and the project root, first on `sys.path`."""
+    for path in (_parent(BENCHMARKS_DIR), BENCHMARKS_DIR + "/fakes"):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def result(benchmark: str, case: str, value: float, unit: str, lower_is_better: bool = True) -> dict:
+    """One machine-readable measurement, as collected by `benchmarks/run.py`."""
+    return {
+        "benchmark": benchmark,
+        "case": case,
+        "value": value,
+        "unit": unit,
+        "lower_is_better": lower_is_better,
+    }
+
+
+def print_results(results: list):
+    for entry in results:
+        print(f"{entry['benchmark']:16s}  {entry['case']:40s}  {entry['value']:14.3f} {entry['unit']}")
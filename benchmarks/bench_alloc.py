@@ -0,0 +1,106 @@
+"""Heap allocated per `LocalSensor.update` and per `RemoteSensor` receive, with and without `preallocate`.
+
+On MicroPython this is the growth of `gc.mem_alloc()` per call with the collector disabled, i.e. the garbage each
+call leaves for the next collection. CPython frees most objects immediately, so there it is the peak of `tracemalloc`
+above the starting point during each call. Both include the coroutine objects every `await sensor.update(...)` and
+its `client.publish(...)` create, which `preallocate` does not avoid: it only saves the topic and payload objects.
+Compare cases within one runtime only: the `int16` decode reads ints with `int.from_bytes`, which returns a small int
+without allocating on MicroPython, where `struct.unpack` allocates a tuple, but costs more than `struct.unpack` on
+CPython.
+
+    python benchmarks/bench_alloc.py
+"""
+import gc
+import struct
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from msf.sensor import LocalSensor, LocalSensorsRegistry, RemoteSensor, RemoteSensorsRegistry
+from msf.utils.codec import FLOAT32, INT16
+from msf.utils.singleton import get_sniffs
+
+CALLS = 1000
+
+try:
+    from gc import mem_alloc
+
+    def _allocated(call, arg) -> float:
+        gc.collect()
+        gc.disable()
+        try:
+            before = mem_alloc()
+            for _ in range(CALLS):
+                call(arg)
+            return (mem_alloc() - before) / CALLS
+        finally:
+            gc.enable()
+
+except ImportError:  # CPython
+    import tracemalloc
+
+    def _allocated(call, arg) -> float:
+        tracemalloc.start()
+        total = 0
+        try:
+            for _ in range(CALLS):
+                start = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                call(arg)
+                total += tracemalloc.get_traced_memory()[1] - start
+        finally:
+            tracemalloc.stop()
+        return total / CALLS
+
+
+class _Client:
+    """Accepts publishes without suspending, so updates can be driven without an event loop."""
+
+    def isconnected(self) -> bool:
+        return True
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        self.last = msg
+
+
+def _update(local_sensor: LocalSensor):
+    def call(value):
+        try:
+            local_sensor.update(value).send(None)
+        except StopIteration:
+            pass
+
+    return call
+
+
+def run() -> list:
+    sniffs = get_sniffs()
+    client = sniffs.client
+    sniffs.client = _Client()
+    results = []
+    try:
+        for label, codec, value in (("int/text", None, 1234), ("int/int16", INT16, 1234), ("float/float32", FLOAT32, 21.5)):
+            for preallocate in (False, True):
+                LocalSensorsRegistry().reset()
+                local_sensor = LocalSensor(name="bench_sensor", codec=codec, preallocate=preallocate)
+                case = f"publish/{label}/" + ("preallocate" if preallocate else "default")
+                results.append(result("alloc", case, _allocated(_update(local_sensor), value), "bytes/call"))
+
+        RemoteSensorsRegistry().reset()
+        remote_sensor = RemoteSensor(name="bench_sensor", codec=INT16)
+        message = INT16.encode(1234)
+        results.append(
+            result("alloc", "decode/int16/struct_unpack", _allocated(lambda m: struct.unpack("<h", m)[0], message), "bytes/call")
+        )
+        results.append(result("alloc", "decode/int16/codec", _allocated(INT16.decode, message), "bytes/call"))
+        results.append(result("alloc", "receive/int16", _allocated(remote_sensor._receive, message), "bytes/call"))
+    finally:
+        sniffs.client = client
+        LocalSensorsRegistry().reset()
+        RemoteSensorsRegistry().reset()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,45 @@
+"""Encode/decode cost and payload size of the text format against the `struct` codecs.
+
+    python benchmarks/bench_codec.py
+"""
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from msf.utils.codec import TEXT, INT16, INT32, FLOAT32, FLOAT64
+from msf.utils.ticks import ticks_us, ticks_diff
+
+ROUNDS = 20000
+CASES = (
+    ("int", 1234, ((TEXT, int), (INT16, None), (INT32, None))),
+    ("float", 21.337, ((TEXT, float), (FLOAT32, None), (FLOAT64, None))),
+)
+
+
+def _time_per_call(func, arg) -> float:
+    start = ticks_us()
+    for _ in range(ROUNDS):
+        func(arg)
+    return ticks_diff(ticks_us(), start) / ROUNDS
+
+
+def run() -> list:
+    results = []
+    for label, value, codecs in CASES:
+        for codec, text_type in codecs:
+            payload = codec.encode(value)
+            if text_type is None:
+                decode = codec.decode
+            else:
+                # the text path leaves conversion to the subscriber
+                def decode(message, _codec=codec, _type=text_type):
+                    return _type(_codec.decode(message))
+            case = f"{label}/{codec.name}"
+            results.append(result("codec", case + "/bytes", len(payload), "bytes"))
+            results.append(result("codec", case + "/encode", _time_per_call(codec.encode, value), "us"))
+            results.append(result("codec", case + "/decode", _time_per_call(decode, payload), "us"))
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,56 @@
+"""Size of the `DevicesRegistry.on_mqtt_connect` publish burst against the number of settings.
+
+Reports, for a first connect and a reconnect with nothing changed, how many publishes go out, how many are in flight at
+once, and how long the connect takes when every publish costs `PUBLISH_DELAY_S`.
+
+    python benchmarks/bench_connect_burst.py
+"""
+import asyncio
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+import mpstore
+from mqtt_as import MQTTClient
+from msf.device import Device, DevicesRegistry, Setting, SettingsStore
+from msf.utils.ticks import ticks_us, ticks_diff
+
+BENCH_SETTINGS_PATH = "/tmp/msf_bench_devices.json"
+SETTING_COUNTS = (10, 50, 200)
+PUBLISH_DELAY_S = 0.0005
+
+
+async def _connect(registry: DevicesRegistry) -> tuple:
+    client = MQTTClient({})
+    client.publish_delay = PUBLISH_DELAY_S
+    start = ticks_us()
+    await registry.on_mqtt_connect(client)
+    return client, ticks_diff(ticks_us(), start)
+
+
+def run() -> list:
+    registry = DevicesRegistry()
+    store = registry.store
+    results = []
+    try:
+        for count in SETTING_COUNTS:
+            mpstore.clear()
+            registry.reset()
+            registry.store = SettingsStore(BENCH_SETTINGS_PATH)
+            Device("bench_device", [Setting(f"setting_{i}", i, f"Benchmark setting {i}.") for i in range(count)])
+            for label in ("first_connect", "reconnect"):
+                client, elapsed_us = asyncio.run(_connect(registry))
+                case = f"{label}/settings={count}"
+                results.append(result("connect_burst", case + "/published", client.published, "count"))
+                results.append(result("connect_burst", case + "/max_in_flight", client.max_in_flight, "count"))
+                results.append(result("connect_burst", case + "/duration", elapsed_us / 1000, "ms"))
+    finally:
+        registry.reset()
+        registry.store = store
+        mpstore.clear()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,82 @@
+"""Boot cost of `Device` construction against the number of settings.
+
+Compares the previous per-setting `read_store`/`write_store` path with the batched `SettingsStore`, for a first boot
+(every setting is a new default) and a warm boot (every setting is loaded from the saved state). The `mpstore`
+stand-in parses and serializes the whole file on every call, like the real one.
+
+    python benchmarks/bench_device_boot.py
+"""
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+import mpstore
+from mpstore import read_store, write_store
+from msf.device import Device, DevicesRegistry, Setting, SettingsStore
+from msf.utils.ticks import ticks_us, ticks_diff
+
+BENCH_SETTINGS_PATH = "/tmp/msf_bench_devices.json"
+SETTING_COUNTS = (1, 5, 10, 20, 40)
+REPEATS = 5  # the fastest of these boots is reported
+
+
+def _settings(count: int) -> list:
+    return [Setting(f"setting_{i}", i, f"Benchmark setting {i}.") for i in range(count)]
+
+
+def legacy_device(device_name: str, settings: list):
+    """The per-setting store access `Device.__init__` used to do."""
+    for setting in settings:
+        _store_setting = read_store(f"{device_name}.{setting.name}", BENCH_SETTINGS_PATH)
+        if not _store_setting:
+            setting_dict = {
+                "value": str(setting.value),
+                "type": setting.type.__name__,
+                "description": setting.description
+            }
+            write_store(f"{device_name}.{setting.name}", setting_dict, BENCH_SETTINGS_PATH)
+        else:
+            setting._value = setting.type(_store_setting["value"])
+
+
+def batched_device(device_name: str, settings: list):
+    registry = DevicesRegistry()
+    registry.reset()  # as after a reboot: the store reads the file again
+    Device(device_name, settings)
+
+
+def time_boot(construct, count: int, first: bool) -> int:
+    fastest = None
+    for _ in range(REPEATS):
+        if first:
+            mpstore.clear()
+        settings = _settings(count)
+        start = ticks_us()
+        construct("bench_device", settings)
+        elapsed = ticks_diff(ticks_us(), start)
+        if fastest is None or elapsed < fastest:
+            fastest = elapsed
+    return fastest
+
+
+def run() -> list:
+    registry = DevicesRegistry()
+    store = registry.store
+    registry.store = SettingsStore(BENCH_SETTINGS_PATH)
+    results = []
+    try:
+        for count in SETTING_COUNTS:
+            for label, construct in (("legacy", legacy_device), ("batched", batched_device)):
+                first = time_boot(construct, count, first=True)
+                warm = time_boot(construct, count, first=False)
+                results.append(result("device_boot", f"{label}_first/settings={count}", first, "us"))
+                results.append(result("device_boot", f"{label}_warm/settings={count}", warm, "us"))
+    finally:
+        registry.reset()
+        registry.store = store
+        mpstore.clear()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,279 @@
+"""Fleet load test: many simulated nodes, each with its own `DevicesRegistry`, sensor registries and `Sniffs`, running
+as asyncio tasks in one process and talking through the in-process broker in `benchmarks/fakes/broker.py`.
+
+Node `i` has `sensors` `LocalSensor`s and a `RemoteSensor` for each sensor of node `i + 1`, plus a device with
+`settings` settings, saved with a write-behind delay of `WRITE_DELAY_MS`. Reported:
+
+- `sensor_latency`: `LocalSensor.update` on one node to `RemoteSensor.on_update` on its neighbour, while every node
+  updates every sensor `rounds` times, `UPDATE_INTERVAL_MS` apart.
+- `setting_applied` / `setting_persisted`: a controller publishing one setting value per node, to the setting's
+  `on_update` callback running, and to the node's settings store committing it.
+- `reconnect_storm`: the broker drops every client at once and all nodes reconnect together: resubscribe and run
+  `DevicesRegistry.on_mqtt_connect`. Reports the time until the last node is back, the messages the nodes published,
+  and how many of them reached a monitor client subscribed to `MQTT_DEVICES_TOPIC/#`, as a dashboard would be.
+  `broker_restart_storm` does the same after the broker lost its retained messages, so every node republishes all
+  of its setting metadata.
+
+Nodes route setting updates with the handlers of `msf.startup`.
+
+    python benchmarks/bench_fleet.py                                   # the defaults used by benchmarks/run.py
+    python benchmarks/bench_fleet.py --nodes 500 --sensors 4 --rounds 20
+"""
+import asyncio
+import contextvars
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+import mpstore
+from broker import Broker, BrokerClient
+from msf import MQTT_DEVICES_TOPIC
+from msf.device import Device, DevicesRegistry, Setting, SettingsStore
+from msf.startup import add_device_routes
+from msf.sensor import LocalSensor, RemoteSensor
+from msf.utils.singleton import get_sniffs, swap_singletons
+from msf.utils.ticks import ticks_us, ticks_diff
+
+NODES = 50
+SENSORS = 4
+SETTINGS = 5
+ROUNDS = 10
+UPDATE_INTERVAL_MS = 10
+WRITE_DELAY_MS = 50
+
+_node = contextvars.ContextVar("node", default=None)
+
+
+class _NodeSingletons:
+    """Singleton mapping that resolves to the instances of the node the current task belongs to."""
+
+    def __init__(self, default: dict):
+        self.default = default
+
+    def _instances(self) -> dict:
+        node = _node.get()
+        return self.default if node is None else node.singletons
+
+    def get(self, cls):
+        return self._instances().get(cls)
+
+    def __setitem__(self, cls, instance):
+        self._instances()[cls] = instance
+
+
+class _TimedStore(SettingsStore):
+    """Records when each device was last written."""
+
+    def __init__(self, path: str, write_delay_ms: int, on_commit):
+        super().__init__(path, write_delay_ms=write_delay_ms, write_max_delay_ms=write_delay_ms * 4)
+        self.on_commit = on_commit
+
+    def commit(self):
+        dirty = self._dirty
+        super().commit()
+        for device_name in dirty:
+            self.on_commit(device_name)
+
+
+def _percentile(values: list, percent: float) -> float:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class _Node:
+    def __init__(self, index: int, fleet: "_Fleet"):
+        self.index = index
+        self.name = f"node_{index}"
+        self.fleet = fleet
+        self.singletons = {}
+        self.client = None
+        self.local_sensors = []
+
+    def enter(self):
+        """Make this node current for the calling task, and the tasks it creates."""
+        _node.set(self)
+
+    def setup(self, sensors: int, settings: int, neighbour: str):
+        self.enter()
+        registry = DevicesRegistry()
+        registry.store = _TimedStore(f"/{self.name}/devices.json", WRITE_DELAY_MS, self.fleet.on_persisted)
+        Device(self.name, [Setting(f"setting_{i}", 0, f"Load test setting {i}.") for i in range(settings)])
+        for setting in DevicesRegistry()[self.name].settings.values():
+            setting.on_update()(self.fleet.on_applied_callback(self.name))
+        self.local_sensors = [LocalSensor(name=f"{self.name}_sensor_{i}") for i in range(sensors)]
+        for i in range(sensors):
+            RemoteSensor(name=f"{neighbour}_sensor_{i}").on_update()(self.fleet.on_sensor_value)
+
+        sniffs = get_sniffs()
+        add_device_routes(sniffs)
+        self.client = BrokerClient(self.fleet.broker, sniffs.receive)
+        sniffs.client = self.client
+
+    async def connect(self):
+        self.enter()
+        await self.client.connect()
+        for topic_filter in get_sniffs().subscriptions():
+            await self.client.subscribe(topic_filter)
+        await DevicesRegistry().on_mqtt_connect(self.client)
+
+    async def update_sensors(self, rounds: int):
+        self.enter()
+        await asyncio.sleep(self.index % UPDATE_INTERVAL_MS / 1000)  # spread the nodes over the interval
+        for _ in range(rounds):
+            for local_sensor in self.local_sensors:
+                await local_sensor.update(ticks_us())  # the send time travels as the value
+            await asyncio.sleep(UPDATE_INTERVAL_MS / 1000)
+
+
+class _Fleet:
+    def __init__(self, nodes: int, sensors: int, settings: int):
+        self.broker = Broker()
+        self.monitor = BrokerClient(self.broker, self._on_monitored)
+        self.nodes = [_Node(index, self) for index in range(nodes)]
+        self.sensor_latencies = []
+        self.applied_latencies = []
+        self.persisted_latencies = []
+        self._setting_sent = {}  # device name -> ticks_us when its setting was published
+        self._setting_applied = {}
+        for node in self.nodes:
+            node.setup(sensors, settings, self.nodes[(node.index + 1) % nodes].name)
+        _node.set(None)
+
+    async def _on_monitored(self, topic, msg):
+        pass
+
+    async def start_monitor(self):
+        await self.monitor.connect()
+        await self.monitor.subscribe(MQTT_DEVICES_TOPIC + "/#")
+
+    def on_sensor_value(self, value):
+        self.sensor_latencies.append(ticks_diff(ticks_us(), int(value)))
+
+    def on_applied_callback(self, device_name: str):
+        def on_applied(value):
+            sent = self._setting_sent.get(device_name)
+            if sent is not None and device_name not in self._setting_applied:
+                self._setting_applied[device_name] = True
+                self.applied_latencies.append(ticks_diff(ticks_us(), sent))
+
+        return on_applied
+
+    def on_persisted(self, device_name: str):
+        sent = self._setting_sent.pop(device_name, None)
+        if sent is not None:
+            self.persisted_latencies.append(ticks_diff(ticks_us(), sent))
+
+    async def run_nodes(self, method: str, *args):
+        await asyncio.gather(*(getattr(node, method)(*args) for node in self.nodes))
+
+    async def quiesce(self):
+        """Wait until every client has delivered everything queued for it."""
+        while True:
+            await asyncio.sleep(0.001)
+            if not self.monitor._inbox and not any(node.client._inbox for node in self.nodes):
+                return
+
+    async def update_settings(self, settings: int):
+        controller = BrokerClient(self.broker, None)
+        await controller.connect()
+        for node in self.nodes:
+            self._setting_sent[node.name] = ticks_us()
+            await controller.publish(f"{MQTT_DEVICES_TOPIC}/{node.name}/setting_{node.index % settings}/value", "7")
+        while self._setting_sent:
+            await asyncio.sleep(WRITE_DELAY_MS / 1000)
+        controller.close()
+
+    async def reconnect_storm(self, broker_restart: bool) -> tuple:
+        published = self.broker.published
+        delivered = self.monitor.received
+        if broker_restart:
+            self.broker.clear_retained()
+        for node in self.nodes:
+            node.client.disconnect()
+            if broker_restart:
+                node.enter()
+                DevicesRegistry().forget_published()  # the retained metadata is gone and is published again
+        _node.set(None)
+        start = ticks_us()
+        await self.run_nodes("connect")
+        elapsed_us = ticks_diff(ticks_us(), start)
+        await self.quiesce()
+        return elapsed_us, self.broker.published - published, self.monitor.received - delivered
+
+    def close(self):
+        self.monitor.close()
+        for node in self.nodes:
+            node.client.close()
+
+
+async def _load_test(nodes: int, sensors: int, settings: int, rounds: int) -> list:
+    fleet = _Fleet(nodes, sensors, settings)
+    try:
+        await fleet.start_monitor()
+        await fleet.run_nodes("connect")
+        await fleet.quiesce()
+
+        start = ticks_us()
+        await fleet.run_nodes("update_sensors", rounds)
+        await fleet.quiesce()
+        sensor_elapsed_us = ticks_diff(ticks_us(), start)
+
+        await fleet.update_settings(settings)
+        storms = [(label, await fleet.reconnect_storm(restart)) for label, restart in (
+            ("reconnect_storm", False),
+            ("broker_restart_storm", True),
+        )]
+    finally:
+        fleet.close()
+
+    case = f"nodes={nodes}"
+    results = [
+        result("fleet", case + "/sensor_values", len(fleet.sensor_latencies), "count"),
+        result(
+            "fleet",
+            case + "/sensor_throughput",
+            len(fleet.sensor_latencies) / (sensor_elapsed_us / 1_000_000),
+            "values/s",
+            lower_is_better=False,
+        ),
+    ]
+    for label, latencies in (
+        ("sensor_latency", fleet.sensor_latencies),
+        ("setting_applied", fleet.applied_latencies),
+        ("setting_persisted", fleet.persisted_latencies),
+    ):
+        for name, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)):
+            results.append(result("fleet", f"{case}/{label}_{name}", _percentile(latencies, percent) / 1000, "ms"))
+    for label, (storm_us, storm_published, storm_delivered) in storms:
+        results.append(result("fleet", f"{case}/{label}_duration", storm_us / 1000, "ms"))
+        results.append(result("fleet", f"{case}/{label}_published", storm_published, "count"))
+        results.append(result("fleet", f"{case}/{label}_delivered", storm_delivered, "count"))
+    results.append(
+        result("fleet", case + "/max_client_backlog", max(node.client.max_backlog for node in fleet.nodes), "count")
+    )
+    return results
+
+
+def run(nodes: int = NODES, sensors: int = SENSORS, settings: int = SETTINGS, rounds: int = ROUNDS) -> list:
+    previous = swap_singletons(None)
+    swap_singletons(_NodeSingletons(previous))
+    try:
+        return asyncio.run(_load_test(nodes, sensors, settings, rounds))
+    finally:
+        swap_singletons(previous)
+        mpstore.clear()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=NODES)
+    parser.add_argument("--sensors", type=int, default=SENSORS)
+    parser.add_argument("--settings", type=int, default=SETTINGS)
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    arguments = parser.parse_args()
+    print_results(run(arguments.nodes, arguments.sensors, arguments.settings, arguments.rounds))
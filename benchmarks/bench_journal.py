@@ -0,0 +1,79 @@
+"""Cost of persisting one setting change against the total number of saved settings, on real files.
+
+`rewrite` serializes and writes the whole settings file per change, as the default JSON store does; `journal` appends
+the change to the `JournalStore` journal. Compaction is held off while timing appends, and timed on its own.
+
+    python benchmarks/bench_journal.py
+"""
+import json
+import os
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from msf.device import JournalStore
+from msf.utils.ticks import ticks_us, ticks_diff
+
+BENCH_PATH = "/tmp/msf_bench_journal.json"
+REWRITE_PATH = "/tmp/msf_bench_rewrite.json"
+SETTING_COUNTS = (10, 100, 1000)
+CHANGES = 200
+SETTINGS_PER_DEVICE = 10
+
+
+def _store(count: int) -> JournalStore:
+    for path in (BENCH_PATH, BENCH_PATH + ".journal", BENCH_PATH + ".tmp"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    store = JournalStore(BENCH_PATH, compact_after=CHANGES * 2)
+    for i in range(count):
+        device_name = f"device_{i // SETTINGS_PER_DEVICE}"
+        store.set(device_name, f"setting_{i}", {"value": str(i), "type": "int", "description": f"Setting {i}."})
+    store.compact()
+    return store
+
+
+def _change(store: JournalStore, count: int, i: int):
+    store.set_value(f"device_{(i % count) // SETTINGS_PER_DEVICE}", f"setting_{i % count}", str(i))
+
+
+def run() -> list:
+    results = []
+    try:
+        for count in SETTING_COUNTS:
+            store = _store(count)
+            start = ticks_us()
+            for i in range(CHANGES):
+                _change(store, count, i)
+                with open(REWRITE_PATH, "w") as file:  # a whole-file rewrite, like the JSON store
+                    json.dump(store._load(), file)
+            results.append(result("journal", f"rewrite/settings={count}", ticks_diff(ticks_us(), start) / CHANGES, "us"))
+
+            start = ticks_us()
+            for i in range(CHANGES):
+                _change(store, count, i)
+                store.commit()
+            results.append(result("journal", f"append/settings={count}", ticks_diff(ticks_us(), start) / CHANGES, "us"))
+
+            start = ticks_us()
+            store.reload()
+            store.get_device("device_0")
+            results.append(result("journal", f"replay/settings={count}", ticks_diff(ticks_us(), start), "us"))
+
+            start = ticks_us()
+            store.compact()
+            results.append(result("journal", f"compact/settings={count}", ticks_diff(ticks_us(), start), "us"))
+    finally:
+        for path in (BENCH_PATH, BENCH_PATH + ".journal", BENCH_PATH + ".tmp", REWRITE_PATH):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
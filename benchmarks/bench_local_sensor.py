@@ -0,0 +1,57 @@
+"""`LocalSensor.update` rate against the `mqtt_as` stand-in: every update published, with a publish policy, and
+handed to a `BackgroundPublisher` with `update_nowait` (the caller's rate; the queue is drained afterwards).
+
+    python benchmarks/bench_local_sensor.py
+"""
+import asyncio
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from mqtt_as import MQTTClient
+from msf.sensor import BackgroundPublisher, COALESCE_LATEST, LocalSensor, LocalSensorsRegistry, PublishPolicy
+from msf.utils.singleton import get_sniffs
+from msf.utils.ticks import ticks_us, ticks_diff
+
+UPDATES = 5000
+
+
+async def _updates(local_sensor: LocalSensor) -> int:
+    start = ticks_us()
+    if local_sensor.publisher is not None:
+        for i in range(UPDATES):
+            local_sensor.update_nowait(20 + (i % 10) / 100)
+        elapsed_us = ticks_diff(ticks_us(), start)
+        await local_sensor.publisher.drain()
+        return elapsed_us
+    for i in range(UPDATES):
+        await local_sensor.update(20 + (i % 10) / 100)  # jitter within a 0.1 deadband
+    return ticks_diff(ticks_us(), start)
+
+
+def run() -> list:
+    sniffs = get_sniffs()
+    client = sniffs.client
+    results = []
+    try:
+        for label, policy, publisher in (
+            ("every_update", None, None),
+            ("deadband", PublishPolicy(deadband=0.1), None),
+            ("background_coalesce", None, BackgroundPublisher(policy=COALESCE_LATEST)),
+        ):
+            LocalSensorsRegistry().reset()
+            sniffs.client = MQTTClient({})
+            local_sensor = LocalSensor(name="bench_sensor", policy=policy, publisher=publisher)
+            elapsed_us = asyncio.run(_updates(local_sensor))
+            rate = UPDATES / (elapsed_us / 1_000_000)
+            results.append(result("local_sensor", f"{label}/update_rate", rate, "updates/s", lower_is_better=False))
+            results.append(result("local_sensor", f"{label}/published", sniffs.client.published, "count"))
+    finally:
+        sniffs.client = client
+        LocalSensorsRegistry().reset()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
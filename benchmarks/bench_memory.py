@@ -0,0 +1,92 @@
+"""Heap used per `Setting`, `Settings`, `RemoteSensor` and `LocalSensor`.
+
+Measured with `gc.mem_alloc()` on MicroPython and `tracemalloc` on CPython, as the heap growth from creating
+`OBJECTS` of a type divided by `OBJECTS`. Registry entries and routes created along with each object are included.
+Only the MicroPython figures describe device memory: CPython object sizes differ, `__slots__` only has an effect there,
+and a resize of its interned-string table is counted against whichever case happens to trigger it.
+
+    python benchmarks/bench_memory.py
+"""
+import gc
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from msf.device import Setting, Settings
+from msf.sensor import LocalSensor, LocalSensorsRegistry, RemoteSensor, RemoteSensorsRegistry
+from msf.utils.singleton import get_sniffs
+
+OBJECTS = 200
+
+try:
+    from gc import mem_alloc
+except ImportError:  # CPython
+    import tracemalloc
+
+    def mem_alloc() -> int:
+        return tracemalloc.get_traced_memory()[0]
+
+    tracemalloc.start()
+
+
+def _per_object(create) -> float:
+    keep = []
+    gc.collect()
+    before = mem_alloc()
+    for i in range(OBJECTS):
+        keep.append(create(i))
+    gc.collect()
+    used = mem_alloc() - before
+    return (used - _list_overhead(len(keep))) / OBJECTS
+
+
+def _list_overhead(count: int) -> int:
+    gc.collect()
+    before = mem_alloc()
+    keep = [None] * count
+    used = mem_alloc() - before
+    del keep
+    return used
+
+
+def _remote_sensor(wildcard: bool):
+    registry = RemoteSensorsRegistry()
+
+    def create(i):
+        registry.wildcard_dispatch = wildcard
+        return RemoteSensor(name=f"sensor_{i:04d}")
+
+    return create
+
+
+def run() -> list:
+    sniffs = get_sniffs()
+    remote_registry = RemoteSensorsRegistry()
+    wildcard_dispatch = remote_registry.wildcard_dispatch
+    cases = (
+        ("Setting", lambda i: Setting(f"setting_{i:04d}", i, "Memory benchmark setting.")),
+        ("Settings", lambda i: Settings({})),
+        ("RemoteSensor/routes", _remote_sensor(False)),
+        ("RemoteSensor/wildcard", _remote_sensor(True)),
+        ("LocalSensor", lambda i: LocalSensor(name=f"sensor_{i:04d}")),
+    )
+    results = []
+    try:
+        for case, create in cases:
+            for _ in range(2):  # once to warm up, so one-time allocations (caches, lazy imports) are not counted
+                sniffs.routes = []
+                remote_registry.reset()
+                LocalSensorsRegistry().reset()
+                value = _per_object(create)
+            results.append(result("memory", case, value, "bytes/object"))
+    finally:
+        sniffs.routes = []
+        remote_registry.reset()
+        remote_registry.wildcard_dispatch = wildcard_dispatch
+        LocalSensorsRegistry().reset()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
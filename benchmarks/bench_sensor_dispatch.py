@@ -0,0 +1,80 @@
+"""RemoteSensor subscription count and per-message dispatch cost, per-sensor routes against wildcard dispatch.
+
+Connect time is modelled as one SUBSCRIBE round trip per subscription (`SUBSCRIBE_RTT_MS`); dispatch time is measured
+through the `usniffs` stand-in, which matches routes one by one like the real router. The `metrics_*` cases repeat
+the wildcard dispatch with `msf.utils.metrics` collection off and on.
+
+    python benchmarks/bench_sensor_dispatch.py
+"""
+import asyncio
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from msf import MQTT_SENSORS_TOPIC
+from msf.sensor import RemoteSensor, RemoteSensorsRegistry
+from msf.utils.metrics import metrics
+from msf.utils.singleton import get_sniffs
+from msf.utils.ticks import ticks_us, ticks_diff
+
+SENSOR_COUNTS = (1, 10, 50, 200)
+MESSAGES = 2000
+SUBSCRIBE_RTT_MS = 25
+
+
+def _setup(count: int, wildcard: bool) -> list:
+    sniffs = get_sniffs()
+    sniffs.routes = []
+    registry = RemoteSensorsRegistry()
+    registry.reset()
+    registry._subscribed = False
+    registry.wildcard_dispatch = wildcard
+    for i in range(count):
+        RemoteSensor(name=f"sensor_{i}")
+    return [f"{MQTT_SENSORS_TOPIC}/sensor_{i}/value" for i in range(count)]
+
+
+async def _dispatch(topics: list) -> float:
+    sniffs = get_sniffs()
+    start = ticks_us()
+    for i in range(MESSAGES):
+        await sniffs.receive(topics[i % len(topics)], "42")
+    return ticks_diff(ticks_us(), start) / MESSAGES
+
+
+def run() -> list:
+    results = []
+    registry = RemoteSensorsRegistry()
+    wildcard_dispatch = registry.wildcard_dispatch
+    metrics_enabled = metrics.enabled
+    try:
+        for count in SENSOR_COUNTS:
+            for wildcard in (False, True):
+                mode = "wildcard" if wildcard else "routes"
+                topics = _setup(count, wildcard)
+                subscribes = len(get_sniffs().subscriptions())
+                results.append(result("sensor_dispatch", f"{mode}_subscribes/sensors={count}", subscribes, "count"))
+                results.append(
+                    result("sensor_dispatch", f"{mode}_connect/sensors={count}", subscribes * SUBSCRIBE_RTT_MS, "ms")
+                )
+                results.append(
+                    result("sensor_dispatch", f"{mode}_dispatch/sensors={count}", asyncio.run(_dispatch(topics)), "us")
+                )
+        topics = _setup(10, True)
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            label = "on" if enabled else "off"
+            results.append(result("sensor_dispatch", f"metrics_{label}/sensors=10", asyncio.run(_dispatch(topics)), "us"))
+    finally:
+        metrics.enabled = metrics_enabled
+        metrics.reset()
+        get_sniffs().routes = []
+        registry.reset()
+        registry._subscribed = False
+        registry.wildcard_dispatch = wildcard_dispatch
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,83 @@
+"""`DevicesRegistry.update_device_setting` throughput, with immediate writes and with write-behind, and the cost of
+reconfiguring ten settings one message at a time against one bulk update.
+
+    python benchmarks/bench_settings_update.py
+"""
+import asyncio
+import json
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+import mpstore
+from msf.device import Device, DevicesRegistry, Setting, SettingsStore
+from msf.utils.ticks import ticks_us, ticks_diff
+
+BENCH_SETTINGS_PATH = "/tmp/msf_bench_devices.json"
+SETTING_COUNTS = (10, 100)
+UPDATES = 500
+RECONFIGURE_SETTINGS = 10
+
+
+def _setup(count: int, write_delay_ms: int) -> DevicesRegistry:
+    registry = DevicesRegistry()
+    registry.reset()
+    registry.store = SettingsStore(BENCH_SETTINGS_PATH, write_delay_ms=write_delay_ms, write_max_delay_ms=1000)
+    Device("bench_device", [Setting(f"setting_{i}", i, f"Benchmark setting {i}.") for i in range(count)])
+    return registry
+
+
+async def _updates(registry: DevicesRegistry, count: int) -> int:
+    start = ticks_us()
+    for i in range(UPDATES):
+        registry.update_device_setting("bench_device", f"setting_{i % count}", i)
+    registry.flush()
+    return ticks_diff(ticks_us(), start)
+
+
+def _reconfigure(registry: DevicesRegistry, bulk: bool, round_: int) -> int:
+    values = {f"setting_{i}": round_ * 100 + i for i in range(RECONFIGURE_SETTINGS)}
+    start = ticks_us()
+    if bulk:
+        registry.update_device_settings("bench_device", json.dumps(values))
+    else:
+        for setting_name, value in values.items():
+            registry.update_device_setting("bench_device", setting_name, str(value))
+    return ticks_diff(ticks_us(), start)
+
+
+def run() -> list:
+    registry = DevicesRegistry()
+    store = registry.store
+    results = []
+    try:
+        for count in SETTING_COUNTS:
+            for label, write_delay_ms in (("immediate", 0), ("write_behind", 100)):
+                mpstore.clear()
+                elapsed_us = asyncio.run(_updates(_setup(count, write_delay_ms), count))
+                results.append(
+                    result(
+                        "settings_update",
+                        f"{label}/settings={count}",
+                        UPDATES / (elapsed_us / 1_000_000),
+                        "updates/s",
+                        lower_is_better=False,
+                    )
+                )
+        for label, bulk in (("one_by_one", False), ("bulk", True)):
+            mpstore.clear()
+            registry = _setup(RECONFIGURE_SETTINGS, 0)
+            elapsed_us = min(_reconfigure(registry, bulk, round_) for round_ in range(20))
+            results.append(
+                result("settings_update", f"reconfigure_{label}/settings={RECONFIGURE_SETTINGS}", elapsed_us, "us")
+            )
+    finally:
+        registry.reset()
+        registry.store = store
+        mpstore.clear()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
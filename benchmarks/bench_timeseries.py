@@ -0,0 +1,64 @@
+"""Recording sensor samples to flash: one text line appended per sample against `TimeSeriesStore` blocks.
+
+Reported per sample: time, bytes written and file writes, on real files. The store writes every tier (raw, minute and
+hour aggregates); the line log keeps raw samples only.
+
+    python benchmarks/bench_timeseries.py
+"""
+import os
+
+from _common import print_results, result, use_fakes
+
+use_fakes()
+
+from msf.sensor import HOUR, MINUTE, RAW, TimeSeriesStore
+from msf.utils.ticks import ticks_us, ticks_diff
+
+BENCH_DIRECTORY = "/tmp/msf_bench_timeseries"
+LOG_PATH = BENCH_DIRECTORY + "/log.txt"
+SAMPLES = 5000
+START_MS = 1_700_000_000_000
+
+
+def _clear():
+    try:
+        for file_name in os.listdir(BENCH_DIRECTORY):
+            os.remove(BENCH_DIRECTORY + "/" + file_name)
+    except OSError:
+        os.mkdir(BENCH_DIRECTORY)
+
+
+def _value(i: int) -> float:
+    return 21 + (i % 40) / 20
+
+
+def run() -> list:
+    results = []
+    try:
+        _clear()
+        start = ticks_us()
+        for i in range(SAMPLES):
+            with open(LOG_PATH, "a") as file:
+                file.write(f"temperature,{START_MS + i * 1000},{_value(i)}\n")
+        elapsed_us = ticks_diff(ticks_us(), start)
+        results.append(result("timeseries", "line_per_sample/append", elapsed_us / SAMPLES, "us"))
+        results.append(result("timeseries", "line_per_sample/bytes", os.stat(LOG_PATH)[6] / SAMPLES, "bytes/sample"))
+        results.append(result("timeseries", "line_per_sample/writes", 1, "writes/sample"))
+
+        _clear()
+        store = TimeSeriesStore(BENCH_DIRECTORY + "/store", tiers=((RAW, 1024 * 1024), (MINUTE, 65536), (HOUR, 8192)))
+        start = ticks_us()
+        for i in range(SAMPLES):
+            store.append("temperature", _value(i), START_MS + i * 1000)
+        store.close()
+        elapsed_us = ticks_diff(ticks_us(), start)
+        results.append(result("timeseries", "store/append", elapsed_us / SAMPLES, "us"))
+        results.append(result("timeseries", "store/bytes", store.bytes_written / SAMPLES, "bytes/sample"))
+        results.append(result("timeseries", "store/writes", store.blocks_written / SAMPLES, "writes/sample"))
+    finally:
+        _clear()
+    return results
+
+
+if __name__ == "__main__":
+    print_results(run())
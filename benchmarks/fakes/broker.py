@@ -0,0 +1,131 @@
+"""In-process stand-in for an MQTT broker and its clients, for load tests with many simulated nodes in one process.
+
+`BrokerClient` has the `mqtt_as.MQTTClient` methods the framework uses. Each client delivers incoming messages from
+its own task, started by the first `connect()`, so handlers run in the context of the node that connected it.
+Subscriptions are kept per topic filter; filters without wildcards are looked up directly. Retained messages are
+delivered on subscribe. QoS is ignored, and a disconnect drops the client's subscriptions and undelivered messages,
+like a clean session.
+"""
+import asyncio
+from collections import deque
+
+
+def _matches(topic_filter: str, topic: str) -> bool:
+    filter_levels = topic_filter.split("/")
+    levels = topic.split("/")
+    for index, expected in enumerate(filter_levels):
+        if expected == "#":
+            return True
+        if index >= len(levels) or (expected != "+" and expected != levels[index]):
+            return False
+    return len(filter_levels) == len(levels)
+
+
+class Broker:
+    def __init__(self):
+        self.exact = {}  # topic -> [client, ...]
+        self.wildcard = {}  # topic filter -> [client, ...]
+        self.retained = {}  # last topic level -> {topic: message}, so most wildcard subscriptions scan only a few
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, client, topic_filter: str):
+        index = self.wildcard if "+" in topic_filter or "#" in topic_filter else self.exact
+        clients = index.setdefault(topic_filter, [])
+        if client not in clients:
+            clients.append(client)
+        last_level = topic_filter[topic_filter.rfind("/") + 1:]
+        if last_level in ("+", "#"):
+            candidates = [retained.items() for retained in self.retained.values()]
+        else:
+            candidates = [self.retained.get(last_level, {}).items()]
+        for items in candidates:
+            for topic, msg in items:
+                if _matches(topic_filter, topic):
+                    client.deliver(topic, msg)
+
+    def clear_retained(self):
+        self.retained = {}
+
+    def unsubscribe_all(self, client):
+        for index in (self.exact, self.wildcard):
+            for clients in index.values():
+                if client in clients:
+                    clients.remove(client)
+
+    def publish(self, topic: str, msg, retain: bool = False):
+        self.published += 1
+        if retain:
+            self.retained.setdefault(topic[topic.rfind("/") + 1:], {})[topic] = msg
+        for client in self.exact.get(topic, ()):
+            client.deliver(topic, msg)
+        for topic_filter, clients in self.wildcard.items():
+            if clients and _matches(topic_filter, topic):
+                for client in clients:
+                    client.deliver(topic, msg)
+
+
+class BrokerClient:
+    def __init__(self, broker: Broker, on_message):
+        """`on_message(topic, msg)` is awaited for every delivered message, e.g. `Sniffs.receive`."""
+        self.broker = broker
+        self.on_message = on_message
+        self.connected = False
+        self.published = 0
+        self.received = 0
+        self.max_backlog = 0
+        self._inbox = deque()
+        self._ready = asyncio.Event()
+        self._task = None
+
+    async def connect(self):
+        self.connected = True
+        if self._task is None:
+            self._task = asyncio.create_task(self._deliver())
+
+    def disconnect(self):
+        self.connected = False
+        self.broker.unsubscribe_all(self)
+        self._inbox.clear()
+
+    def isconnected(self) -> bool:
+        return self.connected
+
+    async def subscribe(self, topic: str, qos: int = 0):
+        if not self.connected:
+            raise OSError("Not connected")
+        self.broker.subscribe(self, topic)
+
+    async def publish(self, topic: str, msg, retain: bool = False, qos: int = 0):
+        if not self.connected:
+            raise OSError("Not connected")
+        await asyncio.sleep(0)  # a network write yields to the event loop
+        if isinstance(msg, (bytearray, memoryview)):
+            msg = bytes(msg)  # the sender may reuse its buffer
+        self.broker.publish(topic, msg, retain)
+        self.published += 1
+
+    def deliver(self, topic: str, msg):
+        self._inbox.append((topic, msg))
+        if len(self._inbox) > self.max_backlog:
+            self.max_backlog = len(self._inbox)
+        self._ready.set()
+
+    async def _deliver(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._inbox:
+                topic, msg = self._inbox.popleft()
+                self.received += 1
+                self.broker.delivered += 1
+                try:
+                    await self.on_message(topic, msg)
+                except Exception as exception:
+                    print(exception)
+
+    def close(self):
+        self.disconnect()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,42 @@
+"""In-memory stand-in for `mpstore`, keyed by path, with the same dotted-key semantics.
+
+Files are kept as JSON text, so every read parses and every write re-serializes the whole file, like the real store.
+"""
+import json
+
+_files = {}
+
+
+def load_store(path: str) -> dict:
+    if path not in _files:
+        raise OSError(2, "No such file")
+    return json.loads(_files[path])
+
+
+def read_store(key: str, path: str):
+    try:
+        value = load_store(path)
+    except OSError:
+        return None
+    for level in key.split("."):
+        if not isinstance(value, dict) or level not in value:
+            return None
+        value = value[level]
+    return value
+
+
+def write_store(key: str, value, path: str):
+    try:
+        root = load_store(path)
+    except OSError:
+        root = {}
+    data = root
+    levels = key.split(".")
+    for level in levels[:-1]:
+        data = data.setdefault(level, {})
+    data[levels[-1]] = value
+    _files[path] = json.dumps(root)
+
+
+def clear():
+    _files.clear()
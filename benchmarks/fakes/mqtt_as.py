@@ -0,0 +1,34 @@
+"""In-process stand-in for `mqtt_as`: a client that records what it would have sent."""
+import asyncio
+
+config = {}
+
+
+class MQTTClient:
+    def __init__(self, config: dict):
+        self.config = config
+        self.connected = False
+        self.published = 0
+        self.subscribed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.publish_delay = 0  # seconds per publish, to model a slow link
+
+    async def connect(self):
+        self.connected = True
+
+    def isconnected(self) -> bool:
+        return self.connected
+
+    async def subscribe(self, topic: str, qos: int = 0):
+        self.subscribed.append(topic)
+
+    async def publish(self, topic: str, msg, retain: bool = False, qos: int = 0):
+        self.in_flight += 1
+        if self.in_flight > self.max_in_flight:
+            self.max_in_flight = self.in_flight
+        try:
+            await asyncio.sleep(self.publish_delay)
+        finally:
+            self.in_flight -= 1
+        self.published += 1
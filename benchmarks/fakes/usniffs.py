@@ -0,0 +1,50 @@
+"""In-process stand-in for `usniffs.Sniffs`, for running the framework under CPython.
+
+Routes are matched the way the real router does it, one pattern at a time, with `<name>` matching a single topic level.
+"""
+
+
+def _to_filter(pattern: str) -> str:
+    return "/".join("+" if level.startswith("<") else level for level in pattern.split("/"))
+
+
+class Sniffs:
+    def __init__(self):
+        self.client = None
+        self.on_connect = None
+        self.routes = []  # (pattern levels, handler)
+
+    def route(self, pattern: str):
+        def decorator(func):
+            self.routes.append((pattern.split("/"), func))
+            return func
+
+        return decorator
+
+    def subscriptions(self) -> list:
+        """Topic filters subscribed on connect, one per route."""
+        return [_to_filter("/".join(levels)) for levels, _ in self.routes]
+
+    async def bind(self, client):
+        self.client = client
+
+    def match(self, topic: str):  # -> (handler, args) | None
+        levels = topic.split("/")
+        for pattern, handler in self.routes:
+            if len(pattern) != len(levels):
+                continue
+            args = []
+            for expected, level in zip(pattern, levels):
+                if expected.startswith("<"):
+                    args.append(level)
+                elif expected != level:
+                    break
+            else:
+                return handler, args
+        return None
+
+    async def receive(self, topic: str, message):
+        matched = self.match(topic)
+        if matched is not None:
+            handler, args = matched
+            await handler(*args, message)
@@ -0,0 +1,91 @@
+"""Run every benchmark under CPython and report machine-readable results.
+
+    python benchmarks/run.py                                   # JSON results on stdout
+    python benchmarks/run.py --output results.json             # ... or to a file
+    python benchmarks/run.py --compare baseline.json           # exit 1 if anything regressed beyond --threshold
+    python benchmarks/run.py --only device_boot,codec          # a subset, by module name without "bench_"
+
+Results are compared case by case. Timings vary between machines, so compare against a baseline produced on the
+same machine, e.g. from the previous release.
+"""
+import argparse
+import importlib
+import json
+import platform
+import sys
+
+from _common import use_fakes
+
+use_fakes()
+
+BENCHMARKS = (
+    "device_boot",
+    "settings_update",
+    "sensor_dispatch",
+    "local_sensor",
+    "connect_burst",
+    "codec",
+    "memory",
+    "journal",
+    "alloc",
+    "timeseries",
+    "fleet",
+)
+
+
+def run(names) -> dict:
+    results = []
+    for name in names:
+        print(f"running {name}", file=sys.stderr)
+        results.extend(importlib.import_module("bench_" + name).run())
+    return {"python": sys.version, "platform": platform.platform(), "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Cases that got worse than the baseline by more than `threshold` (a fraction)."""
+    previous = {(entry["benchmark"], entry["case"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in report["results"]:
+        old = previous.get((entry["benchmark"], entry["case"]))
+        if old is None or not old["value"]:
+            continue
+        change = (entry["value"] - old["value"]) / abs(old["value"])
+        if not entry["lower_is_better"]:
+            change = -change
+        if change > threshold:
+            regressions.append({**entry, "baseline": old["value"], "change": change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, as a fraction (0.2)")
+    parser.add_argument("--only", help="comma separated benchmarks to run")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else BENCHMARKS
+    report = run(names)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for entry in regressions:
+            print(
+                f"REGRESSION {entry['benchmark']} {entry['case']}: {entry['baseline']} -> {entry['value']} "
+                f"{entry['unit']} ({entry['change']:+.0%})",
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,66 @@
-from pathlib import Path
-from msf.settings import *  # Import default settings
+from msf.utils.boot import boot_timer
+from msf.utils.ticks import ticks_us, ticks_diff
+
+
+def _parent(path: str) -> str:
+    index = path.rfind("/")
+    if index < 0:
+        return "."
+    return path[:index] or "/"
+
+
+def _join(directory: str, name: str) -> str:
+    return directory + name if directory.endswith("/") else directory + "/" + name
+
+
+user_settings_path = _join(_parent(_parent(_parent(__file__))), "settings.py")
+default_settings_path = _join(_parent(__file__), "settings")  # without extension, may be .py or .mpy
+
+
+def _merge(module):
+    namespace = globals()
+    for setting, value in module.__dict__.items():
+        if not setting.startswith("__"):
+            if setting.endswith("_PATH") and not isinstance(value, str):
+                value = str(value)  # e.g. a pathlib path from an older settings.py; paths are used as strings
+            namespace[setting] = value
 
-user_settings_path = Path(__file__).parent.parent.parent / "settings.py"
 
 def load_user_settings():
-    if user_settings_path.exists():
-        # Dynamically import the user-defined settings
-        user_settings_module = __import__("settings", globals(), locals(), [], 0)
+    """Resolve settings: a current `msf_settings_snapshot` if there is one, else the defaults in `msf.settings`
+    overridden by the user's `settings.py`."""
+    from msf.utils.snapshot import settings_stamp
+
+    stamp = settings_stamp(user_settings_path, default_settings_path)
+    try:
+        import msf_settings_snapshot as snapshot
+    except ImportError:
+        snapshot = None
+    if snapshot is not None and snapshot._SOURCE == stamp:
+        _merge(snapshot)
+        return
 
-        # Override default settings with user-defined settings
-        for setting in dir(user_settings_module):
-            if not setting.startswith("__"):
-                globals()[setting] = getattr(user_settings_module, setting)
+    import msf.settings as default_settings  # Import default settings
+    _merge(default_settings)
+    if stamp[0] is not None:
+        # Dynamically import the user-defined settings, and override default settings with them
+        _merge(__import__("settings", globals(), locals(), [], 0))
 
 
+_start = ticks_us()
 load_user_settings()
+boot_timer.add("settings", ticks_diff(ticks_us(), _start))
+
+
+def __getattr__(name):
+    # The device subsystem (and its storage dependencies) is loaded on first use, e.g. `from msf import Device`.
+    from msf.device import _device
 
-from .device._device import *
+    try:
+        return getattr(_device, name)
+    except AttributeError:
+        raise AttributeError(f"module 'msf' has no attribute '{name}'")
 
 # TODO: Should be using these probably, update later when things are changing less
 # from .device._device import DevicesRegistry, DeviceSettingsValidationError, Device, Settings, Setting
-# __all__ = [ "DevicesRegistry", "DeviceSettingsValidationError", "Device", "Settings", "Setting"]
\ No newline at end of file
+# __all__ = [ "DevicesRegistry", "DeviceSettingsValidationError", "Device", "Settings", "Setting"]
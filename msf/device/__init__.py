@@ -1 +1,9 @@
-from ._device import *
\ No newline at end of file
+from ._device import *
+
+
+def __getattr__(name):
+    if name == "JournalStore":  # loaded on first use
+        from ._journal import JournalStore
+
+        return JournalStore
+    raise AttributeError(f"module 'msf.device' has no attribute '{name}'")
@@ -1,8 +1,22 @@
 import asyncio
-from pathlib import Path
-from msf import DEVICES_SETTINGS_PATH, MQTT_DEVICES_TOPIC
-
-from mpstore import write_store, read_store
+import json
+from msf import (
+    DEVICES_SETTINGS_PATH,
+    DEVICES_SETTINGS_BACKEND,
+    DEVICES_SETTINGS_COMPACT_AFTER,
+    DEVICES_SETTINGS_WRITE_DELAY_MS,
+    DEVICES_SETTINGS_WRITE_MAX_DELAY_MS,
+    MQTT_CONNECT_PUBLISH_CONCURRENCY,
+    MQTT_DEVICES_TOPIC,
+)
+
+from msf.device._store import SettingsStore
+from msf.utils.codec import TEXT
+from msf.utils.events import Subscribers
+from msf.utils.publisher import publish_bounded
+from msf.utils.boot import boot_timer
+from msf.utils.metrics import metrics
+from msf.utils.ticks import ticks_us, ticks_diff
 from msf.utils.singleton import singleton
 
 
@@ -27,6 +41,7 @@ class DuplicateDeviceSettingNameException(Exception):
 
 
 class Setting:
+    __slots__ = ("name", "codec", "_description", "_type", "_value", "_file_path", "_subscribers")
     supported_types = (str, int, float)
 
     @property
@@ -43,7 +58,7 @@ class Setting:
             return f"Description for {self.name} with value of type {self.type.__name__}."
 
     @property
-    def file_path(self) -> Path:
+    def file_path(self) -> str:
         return self._file_path
 
     def __init__(
@@ -51,52 +66,93 @@ class Setting:
         name: str,
         value: any,
         description: str,
+        codec=None,
     ):
+        """`codec` (see `msf.utils.codec`) sets the wire format of the setting value over MQTT; the saved state is
+        always text."""
         if not type(value) in self.supported_types:
             raise DeviceSettingsValidationError(f"Setting '{name} required to be in: {self.supported_types}'")
+        codec_type = getattr(codec, "type", None)
+        if codec_type is not None and codec_type is not type(value):
+            raise DeviceSettingsValidationError(
+                f"Setting '{name}' of type '{type(value).__name__}' cannot use codec '{codec.name}'."
+            )
 
         self.name = name
+        self.codec = codec or TEXT
 
         self._description = description
         self._type = type(value)
         self._value = value
         self._file_path = None
+        self._subscribers = None
 
-    def set_path(self, file_path: Path):
+    def set_path(self, file_path: str):
         self._file_path = file_path
 
-    def update(self, value):
-        if not isinstance(value, self.type):
-            try:
-                value = self.type(value)
-            except Exception:
+    def convert(self, value):
+        """`value` as the setting type, or `DeviceSettingsValidationError` if it cannot be converted."""
+        if isinstance(value, self.type):
+            return value
+        try:
+            return self.type(value)
+        except Exception:
+            raise DeviceSettingsValidationError(
+                f"Was given setting value '{value}', but was not of expected type '{self.type.__name__}'."
+            )
+
+    def convert_json(self, value):
+        """`value` decoded from a JSON payload as the setting type, held to the same rules as a text value: booleans,
+        floats with a fraction for `int` settings, and anything but numbers and strings are rejected."""
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise DeviceSettingsValidationError(
+                f"Was given setting value '{value}', but was not of expected type '{self.type.__name__}'."
+            )
+        if isinstance(value, float) and self.type is int:
+            if value % 1:  # also true for nan and inf
                 raise DeviceSettingsValidationError(
-                    f"Was given setting value '{value}', but was not of expected type '{self.type.__name__}'."
+                    f"Was given setting value '{value}', but was not of expected type 'int'."
                 )
+            value = int(value)
+        return self.convert(str(value))
 
+    def update(self, value):
+        value = self.convert(value)
         if self._value != value:
             self._value = value
             self._on_update()
 
+    @property
+    def subscribers(self) -> Subscribers:
+        if self._subscribers is None:
+            self._subscribers = Subscribers()
+        return self._subscribers
+
     def _on_update(self):
-        pass
+        if self._subscribers is not None:
+            self._subscribers.notify(self._value)
 
     def on_update(self):
+        """Decorator: call the function with the new value on every update. Any number of functions can subscribe;
+        coroutine functions are scheduled as background tasks instead of running inline."""
         def decorator(func):
-            def wrapper(*args, **kwargs):
-                return func(self.value)
-
-            self._on_update = wrapper
-            return wrapper
+            self.subscribers.add(func)
+            return func
 
         return decorator
 
+    def remove_on_update(self, func):
+        if self._subscribers is not None:
+            self._subscribers.remove(func)
+
 
     def __repr__(self):
         return f"Setting(name={self.name}, value={self._value})"
 
 
 class Settings:
+    __slots__ = ("_dict",)
+
     def __init__(self, settings_dict: dict[str, Setting]):
         self._dict = settings_dict
 
@@ -129,30 +185,33 @@ class Settings:
 
 
 class Device:
+    __slots__ = ("name", "settings")
     name: str
     settings: Settings
 
     def __init__(self, device_name: str, settings: list[Setting]):
+        start = ticks_us()
         if "." in device_name:
             raise InvalidDeviceNameException(f"Attempted to create a new device with name {device_name}, but character '.' is not allowed in device name.")
         if DevicesRegistry().get(device_name):
             raise DuplicateDeviceNameException(f"Attempted to create a new device with name {device_name}, but a device with that name already exists.")
         self.name = device_name
 
+        store = DevicesRegistry().store
         settings_map: dict[str, Setting] = {}
         for setting in settings:
             if settings_map.get(setting.name):
                 raise DuplicateDeviceSettingNameException(f"Attempted to create a new device setting with name {setting.name}, but a device setting with that name already exists.")
 
-            _store_setting = read_store(f"{device_name}.{setting.name}", str(DEVICES_SETTINGS_PATH))
+            _store_setting = store.get(device_name, setting.name)
             if not _store_setting:
-                # If it does not exist, we want to write an initial setting
+                # If it does not exist, we want to stage an initial setting, written below with the others
                 setting_dict = {
                     "value": str(setting.value),
                     "type": setting.type.__name__,
                     "description": setting.description
                 }
-                write_store(f"{device_name}.{setting.name}", setting_dict, str(DEVICES_SETTINGS_PATH))
+                store.set(device_name, setting.name, setting_dict)
             else:
                 # If it does exist, we want to update the setting object's value from the current JSON setting
                 _value = _store_setting["value"]
@@ -165,9 +224,12 @@ class Device:
 
             settings_map[setting.name] = setting
 
+        store.commit()  # all first-time defaults for this device in a single write
+
         self.settings = Settings(settings_map)
 
         DevicesRegistry()[device_name] = self
+        boot_timer.add("devices", ticks_diff(ticks_us(), start))
 
     def _list_settings(self) -> list[Setting]:
         return [_setting for _setting in self.settings.values()]
@@ -176,11 +238,32 @@ class Device:
         return f"Device(name={self.name}, settings={self._list_settings()})"
 
 
+def _settings_store() -> SettingsStore:
+    """The store selected with `DEVICES_SETTINGS_BACKEND`."""
+    if DEVICES_SETTINGS_BACKEND == "journal":
+        from msf.device._journal import JournalStore  # loaded only when selected
+
+        return JournalStore(
+            DEVICES_SETTINGS_PATH,
+            write_delay_ms=DEVICES_SETTINGS_WRITE_DELAY_MS,
+            write_max_delay_ms=DEVICES_SETTINGS_WRITE_MAX_DELAY_MS,
+            compact_after=DEVICES_SETTINGS_COMPACT_AFTER,
+        )
+    if DEVICES_SETTINGS_BACKEND != "json":
+        raise ValueError(f"Unknown DEVICES_SETTINGS_BACKEND '{DEVICES_SETTINGS_BACKEND}'.")
+    return SettingsStore(
+        DEVICES_SETTINGS_PATH,
+        write_delay_ms=DEVICES_SETTINGS_WRITE_DELAY_MS,
+        write_max_delay_ms=DEVICES_SETTINGS_WRITE_MAX_DELAY_MS,
+    )
+
+
 @singleton
 class DevicesRegistry:
     devices: dict[str, Device]
     devices_loaded: bool
-    device_settings_path: Path = DEVICES_SETTINGS_PATH  # For ease of access
+    store: SettingsStore
+    device_settings_path: str = DEVICES_SETTINGS_PATH  # For ease of access
 
     def __getitem__(self, key: str) -> Device:
         return self.devices[key]
@@ -202,10 +285,14 @@ class DevicesRegistry:
     def __init__(self):
         self.devices = {}
         self.devices_loaded = False
+        self._published = {}  # topic -> payload of the retained metadata last published successfully
+        self.store = _settings_store()
 
     def reset(self):
         self.devices = {}
         self.devices_loaded = False
+        self._published = {}
+        self.store.reload()
 
     def update_device_setting(
         self, device_name: str, setting_name: str, setting_value: any
@@ -220,14 +307,89 @@ class DevicesRegistry:
             )
 
         setting = device.settings[setting_name]
+        if metrics.enabled:
+            metrics.count_received(device_name + "/" + setting_name)
+        if isinstance(setting_value, (bytes, bytearray)):
+            try:
+                setting_value = setting.codec.decode(setting_value)
+            except ValueError:
+                raise DeviceSettingsValidationError(
+                    f"Cannot decode setting value '{setting_value}' with codec '{setting.codec.name}'."
+                )
         setting.update(setting_value)
-        write_store(f"{device_name}.{setting.name}.value", str(setting.value), str(DEVICES_SETTINGS_PATH))
+        self.store.set_value(device_name, setting.name, str(setting.value))
+        self.store.commit_later()
 
-    async def on_mqtt_connect(self, client):
-        to_be_published = []
+    def update_device_settings(self, device_name: str, message):
+        """Apply a bulk update, a JSON object of setting names to values, to one device.
+
+        Every value is validated before any is applied, so an invalid payload changes nothing. Then each setting is
+        updated in payload order, firing its callbacks, and the device is written to storage once.
+        """
+        if device_name not in self.devices:
+            raise KeyError(f"Device '{device_name}' not found.")
+
+        device = self.devices[device_name]
+        if metrics.enabled:
+            metrics.count_received(device_name + "/_bulk")
+        try:
+            values = json.loads(message)
+        except ValueError:
+            raise DeviceSettingsValidationError(f"Bulk update for device '{device_name}' is not valid JSON.")
+        if not isinstance(values, dict):
+            raise DeviceSettingsValidationError(f"Bulk update for device '{device_name}' must be a JSON object.")
+
+        updates = []
+        for setting_name, setting_value in values.items():
+            setting = device.settings.get(setting_name)
+            if setting is None:
+                raise DeviceSettingsValidationError(
+                    f"Setting '{setting_name}' not found for device '{device_name}'."
+                )
+            updates.append((setting, setting.convert_json(setting_value)))
+
+        for setting, setting_value in updates:
+            setting.update(setting_value)
+            self.store.set_value(device_name, setting.name, str(setting.value))
+        self.store.commit_later()
+
+    def reported_state(self, device_name: str) -> str:
+        """Every setting value of a device as one JSON object, as published on `<device>/_bulk/reported`."""
+        device = self.devices[device_name]
+        return json.dumps({setting.name: setting.value for setting in device.settings})
+
+    async def publish_reported_state(self, client, device_name: str):
+        topic = f"{MQTT_DEVICES_TOPIC}/{device_name}/_bulk/reported"
+        await client.publish(topic, self.reported_state(device_name), retain=True)
+
+    def flush(self):
+        """Write pending setting changes to storage now, e.g. before `machine.reset()`."""
+        self.store.flush()
+
+    def _metadata_messages(self):
+        """Retained description, type and reported value of every setting that differs from what was last published."""
+        published = self._published
         for device in self.devices.values():
             for setting in device.settings:
-                to_be_published.append(client.publish(f"{MQTT_DEVICES_TOPIC}/{device.name}/{setting.name}/description", str(setting.description), retain=True))
-                to_be_published.append(client.publish(f"{MQTT_DEVICES_TOPIC}/{device.name}/{setting.name}/type", str(setting.type.__name__), retain=True))
-                to_be_published.append(client.publish(f"{MQTT_DEVICES_TOPIC}/{device.name}/{setting.name}/value/reported", str(setting.value), retain=True))
-        await asyncio.gather(*to_be_published)
\ No newline at end of file
+                base = f"{MQTT_DEVICES_TOPIC}/{device.name}/{setting.name}"
+                for topic, payload in (
+                    (base + "/description", str(setting.description)),
+                    (base + "/type", str(setting.type.__name__)),
+                    (base + "/value/reported", setting.codec.encode(setting.value)),
+                ):
+                    if published.get(topic) != payload:
+                        yield topic, payload, True
+
+    def _on_published(self, topic: str, payload):
+        self._published[topic] = payload
+        if metrics.enabled and topic.endswith("/value/reported"):
+            metrics.count_published(topic[len(MQTT_DEVICES_TOPIC) + 1:-len("/value/reported")])  # device/setting
+
+    def forget_published(self):
+        """Publish all metadata again on the next connect, e.g. after the broker lost its retained messages."""
+        self._published = {}
+
+    async def on_mqtt_connect(self, client):
+        await publish_bounded(
+            client, self._metadata_messages(), MQTT_CONNECT_PUBLISH_CONCURRENCY, on_published=self._on_published
+        )
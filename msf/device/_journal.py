@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+
+from msf.device._store import SettingsStore
+from msf.utils.ticks import ticks_us, ticks_diff
+from msf.utils.metrics import metrics
+from msf.utils.loop_monitor import loop_monitor
+
+
+def _parent(path: str) -> str:
+    index = path.rfind("/")
+    return path[:index] if index > 0 else ""
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class JournalStore(SettingsStore):
+    """`SettingsStore` that appends each change to a journal instead of rewriting the settings file.
+
+    The settings file at `path` is the snapshot, in the same JSON format as the default store; changes since the last
+    snapshot are lines of `[device, setting, setting_dict]` in `path + ".journal"`. A commit appends one line per
+    changed setting, so its cost does not depend on how many settings there are. Loading reads the snapshot and
+    replays the journal; a line torn by a power loss is ignored.
+
+    Once the journal has `compact_after` lines, the store compacts: the whole state is written to a temporary file that
+    then replaces the snapshot, and the journal is emptied. With `background` set, as by `msf.startup`, this runs in a
+    task after the triggering update has been handled; otherwise it runs inline. A compaction interrupted at any point leaves a
+    snapshot plus journal that replay to the same state. Call `compact()` before switching back to the default store.
+    """
+
+    def __init__(self, path: str, write_delay_ms: int = 0, write_max_delay_ms: int = 0, compact_after: int = 64):
+        super().__init__(path, write_delay_ms, write_max_delay_ms)
+        self.journal_path = path + ".journal"
+        self.temporary_path = path + ".tmp"
+        self.compact_after = compact_after
+        self.journal_lines = 0
+        self.compactions = 0
+        self._changes = set()  # (device name, setting name) staged since the last commit
+        self._torn = False  # the journal ends in a partial line
+        self._compact_task = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            self._data = self._read_snapshot(self.path)
+            if self._data is None:  # none yet, or lost mid-compaction
+                self._data = self._read_snapshot(self.temporary_path) or {}
+            self.journal_lines = self._replay(self._data)
+        return self._data
+
+    def _read_snapshot(self, path: str):  # -> dict | None
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _replay(self, data: dict) -> int:
+        lines = 0
+        self._torn = False
+        try:
+            with open(self.journal_path) as file:
+                for line in file:
+                    self._torn = not line.endswith("\n")
+                    try:
+                        device_name, setting_name, setting_dict = json.loads(line)
+                    except ValueError:
+                        continue  # torn write
+                    if device_name not in data:
+                        data[device_name] = {}
+                    data[device_name][setting_name] = setting_dict
+                    lines += 1
+        except OSError:
+            pass  # no journal
+        return lines
+
+    def set(self, device_name: str, setting_name: str, setting_dict: dict):
+        super().set(device_name, setting_name, setting_dict)
+        self._changes.add((device_name, setting_name))
+
+    def set_value(self, device_name: str, setting_name: str, value: str):
+        super().set_value(device_name, setting_name, value)
+        self._changes.add((device_name, setting_name))
+
+    def commit(self):
+        """Append every staged setting change to the journal, in one write."""
+        if self._changes:
+            start = ticks_us()
+            lines = [
+                json.dumps([device_name, setting_name, self._data[device_name][setting_name]]) + "\n"
+                for device_name, setting_name in self._changes
+            ]
+            try:
+                file = open(self.journal_path, "a")
+            except OSError:
+                os.mkdir(_parent(self.journal_path))  # first write on this board
+                file = open(self.journal_path, "a")
+            with file:
+                if self._torn:
+                    file.write("\n")  # end the partial line, or the next change is appended to it
+                    self._torn = False
+                file.write("".join(lines))
+            self.journal_lines += len(lines)
+            elapsed = ticks_diff(ticks_us(), start)
+            if metrics.enabled:
+                metrics.increment("store_writes")
+                metrics.observe("store_write_us", elapsed)
+            if loop_monitor.enabled:
+                loop_monitor.section("store_write", elapsed)
+        self._changes = set()
+        self._dirty = set()
+        if self.journal_lines >= self.compact_after:
+            self._compact_later()
+
+    def _compact_later(self):
+        if not self.background:  # e.g. a script without an event loop, where a task might never run
+            self.compact()
+        elif self._compact_task is None:
+            self._compact_task = asyncio.create_task(self._compact_in_background())
+
+    async def _compact_in_background(self):
+        await asyncio.sleep(0)  # after the update that triggered it has been handled
+        self._compact_task = None
+        self.compact()
+
+    def compact(self):
+        """Write the whole state, staged changes included, as the new snapshot and empty the journal."""
+        start = ticks_us()
+        data = self._load()
+        with open(self.temporary_path, "w") as file:
+            json.dump(data, file)
+        try:
+            os.rename(self.temporary_path, self.path)
+        except OSError:  # filesystems where rename does not replace; _load falls back to the temporary file
+            _remove(self.path)
+            os.rename(self.temporary_path, self.path)
+        _remove(self.journal_path)
+        self.journal_lines = 0
+        self._torn = False
+        self.compactions += 1
+        self._changes = set()
+        self._dirty = set()
+        if loop_monitor.enabled:
+            loop_monitor.section("store_compact", ticks_diff(ticks_us(), start))
+
+    def reload(self):
+        super().reload()
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            self._compact_task = None
+        self._changes = set()
+        self.journal_lines = 0
@@ -0,0 +1,119 @@
+import asyncio
+from mpstore import load_store, write_store
+from msf.utils.ticks import ticks_ms, ticks_us, ticks_diff, ticks_add
+from msf.utils.metrics import metrics
+from msf.utils.loop_monitor import loop_monitor
+
+
+class SettingsStore:
+    """In-memory view of the devices settings file.
+
+    The file is read once, on first access, and every device is served from memory afterwards. Changes are staged
+    per device and written with `commit()`, so all of a device's first-time defaults cost a single write.
+
+    `commit_later()` is the write-behind variant: with a non-zero `write_delay_ms`, staged changes are merged into one
+    write once no change arrived for `write_delay_ms`, or at the latest `write_max_delay_ms` after the first one.
+
+    `background` is set by `msf.startup`, which runs inside the event loop; until then stores do all their work inline.
+    """
+
+    def __init__(self, path: str, write_delay_ms: int = 0, write_max_delay_ms: int = 0):
+        self.path = path
+        self.write_delay_ms = write_delay_ms
+        self.write_max_delay_ms = write_max_delay_ms
+        self._data = None
+        self._dirty = set()
+        self._flush_task = None
+        self._deadline = 0
+        self._max_deadline = 0
+        self.background = False
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                self._data = load_store(self.path) or {}
+            except (OSError, ValueError):
+                # No settings file yet (first boot) or an unreadable one; start from an empty state.
+                self._data = {}
+        return self._data
+
+    def get_device(self, device_name: str) -> dict:
+        return self._load().get(device_name) or {}
+
+    def get(self, device_name: str, setting_name: str):  # -> dict | None
+        return self.get_device(device_name).get(setting_name)
+
+    def set(self, device_name: str, setting_name: str, setting_dict: dict):
+        data = self._load()
+        if device_name not in data:
+            data[device_name] = {}
+        data[device_name][setting_name] = setting_dict
+        self._dirty.add(device_name)
+
+    def set_value(self, device_name: str, setting_name: str, value: str):
+        setting_dict = self.get(device_name, setting_name)
+        if setting_dict is None:
+            setting_dict = {}
+            self.set(device_name, setting_name, setting_dict)
+        setting_dict["value"] = value
+        self._dirty.add(device_name)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def commit(self):
+        """Write every device with staged changes, one write per device."""
+        for device_name in self._dirty:
+            start = ticks_us()
+            write_store(device_name, self._data[device_name], self.path)
+            elapsed = ticks_diff(ticks_us(), start)
+            if metrics.enabled:
+                metrics.increment("store_writes")
+                metrics.observe("store_write_us", elapsed)
+            if loop_monitor.enabled:
+                loop_monitor.section("store_write", elapsed)
+        self._dirty = set()
+
+    def commit_later(self):
+        """Commit after the write-behind delay, or right away if no delay is configured."""
+        if self.write_delay_ms <= 0:
+            self.commit()
+            return
+
+        now = ticks_ms()
+        if self._flush_task is None:
+            self._max_deadline = ticks_add(now, self.write_max_delay_ms)
+            self._flush_task = asyncio.create_task(self._write_behind())
+        deadline = ticks_add(now, self.write_delay_ms)
+        if ticks_diff(deadline, self._max_deadline) > 0:
+            deadline = self._max_deadline
+        self._deadline = deadline
+
+    async def _write_behind(self):
+        remaining = ticks_diff(self._deadline, ticks_ms())
+        while remaining > 0:
+            await asyncio.sleep(remaining / 1000)
+            remaining = ticks_diff(self._deadline, ticks_ms())
+        self._flush_task = None
+        self.commit()
+
+    @property
+    def pending(self) -> bool:
+        return self._flush_task is not None
+
+    def flush(self):
+        """Write any pending changes now. Call this before a reset so write-behind changes are not lost."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._dirty:
+            self.commit()
+
+    def reload(self):
+        """Drop the in-memory state; the file is read again on next access. Staged changes are discarded."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._data = None
+        self._dirty = set()
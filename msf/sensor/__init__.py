@@ -1 +1,41 @@
-from ._sensor import *
\ No newline at end of file
+from ._sensor import *
+from ._policy import *
+
+# Optional subsystems, loaded on first use.
+_LAZY = {
+    "BATCH_TOPIC": "_batch",
+    "BatchPublisher": "_batch",
+    "encode_frame": "_batch",
+    "decode_frame": "_batch",
+    "History": "_history",
+    "OfflineQueue": "_offline",
+    "DROP_OLDEST": "_offline",
+    "COALESCE_LATEST": "_offline",
+    "drain_offline_queues": "_offline",
+    "PollScheduler": "_scheduler",
+    "Poll": "_scheduler",
+    "DerivedSensor": "_derived",
+    "Sum": "_derived",
+    "Mean": "_derived",
+    "BackgroundPublisher": "_publisher",
+    "BLOCK": "_publisher",
+    "TimeSeriesStore": "_timeseries",
+    "HISTORY_TOPIC": "_timeseries",
+    "RAW": "_timeseries",
+    "MINUTE": "_timeseries",
+    "HOUR": "_timeseries",
+    "encode_chunk": "_timeseries",
+    "decode_chunk": "_timeseries",
+    "Window": "_window",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'msf.sensor' has no attribute '{name}'")
+    import sys
+
+    module_name = "msf.sensor." + module_name
+    __import__(module_name)
+    return getattr(sys.modules[module_name], name)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from msf.utils.singleton import get_sniffs
+from msf.utils.ticks import ticks_ms, ticks_diff
+from msf.utils.ntp import wall_clock
+from msf import MQTT_SENSORS_TOPIC
+
+BATCH_TOPIC = MQTT_SENSORS_TOPIC + "/_batch"
+
+
+def encode_frame(samples: list, now_ticks: int, now_ms: int) -> str:
+    """Encode `(name, value, ticks)` samples as `{"t": <epoch ms>, "s": [[name, value, <ms before t>], ...]}`.
+
+    Only one wall-clock read is needed per frame; sample times are offsets from it, taken from `ticks_ms()`.
+    """
+    encoded = []
+    for name, value, ticks in samples:
+        if not isinstance(value, (int, float, str)):
+            value = str(value)
+        encoded.append([name, value, ticks_diff(ticks, now_ticks)])
+    return json.dumps({"t": now_ms, "s": encoded})
+
+
+def decode_frame(message) -> list:
+    """Inverse of `encode_frame`: a list of `(name, value, epoch ms)`."""
+    frame = json.loads(message)
+    timestamp = frame["t"]
+    return [(name, value, timestamp + offset) for name, value, offset in frame["s"]]
+
+
+class BatchPublisher:
+    """Collects updates from many `LocalSensor`s and publishes them as one frame on `BATCH_TOPIC/<name>`.
+
+    A frame goes out once `max_samples` are collected, or `max_delay_ms` after the first sample of the frame.
+    Pass the publisher to `LocalSensor(..., batch=publisher)` to route that sensor's updates through it.
+    """
+
+    def __init__(self, name: str, max_samples: int = 32, max_delay_ms: int = 1000):
+        self.name = name
+        self.topic = BATCH_TOPIC + "/" + name
+        self.max_samples = max_samples
+        self.max_delay_ms = max_delay_ms
+        self.frames_published = 0
+        self.samples_published = 0
+        self._samples = []
+        self._flush_task = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    async def add(self, name: str, value):
+        self._samples.append((name, value, ticks_ms()))
+        if len(self._samples) >= self.max_samples:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay_ms / 1000)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self._samples:
+            return
+        samples, self._samples = self._samples, []
+        now_ticks = ticks_ms()
+        frame = encode_frame(samples, now_ticks, wall_clock.time_ms(now_ticks))
+        await get_sniffs().client.publish(self.topic, frame)
+        self.frames_published += 1
+        self.samples_published += len(samples)
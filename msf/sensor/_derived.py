@@ -0,0 +1,205 @@
+import asyncio
+
+from msf.utils.events import Subscribers
+from msf.utils.ticks import ticks_ms, ticks_diff
+from msf.sensor._sensor import InvalidSensorConstructorArgs, RemoteSensorsRegistry
+
+RESUM_EVERY = 1024  # input updates between exact recomputations of a running sum, against float error build-up
+
+
+def _number(value):  # -> float | None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Sum:
+    """Running sum of the numeric inputs of a `DerivedSensor`, updated in O(1) per input update. Inputs without a
+    value, or with a non-numeric one, are left out."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def reset(self, values):
+        self.total = 0.0
+        self.count = 0
+        for value in values:
+            self.replace(None, value)
+
+    def replace(self, old, new):
+        old = _number(old)
+        new = _number(new)
+        if old is not None:
+            self.total -= old
+            self.count -= 1
+        if new is not None:
+            self.total += new
+            self.count += 1
+
+    @property
+    def value(self):
+        return self.total if self.count else None
+
+
+class Mean(Sum):
+    """Running mean of the numeric inputs of a `DerivedSensor`, see `Sum`."""
+
+    @property
+    def value(self):
+        return self.total / self.count if self.count else None
+
+
+def _input_sensor(sensor):
+    if isinstance(sensor, str):
+        return RemoteSensorsRegistry()[sensor]  # KeyError for a sensor that is not defined (yet)
+    return sensor
+
+
+class DerivedSensor:
+    """A value computed from other sensors, recomputed only when one of them changes.
+
+    `inputs` are `RemoteSensor` names or sensor objects (including other `DerivedSensor`s). The value comes from
+    either:
+
+    - `compute(*values)`, called with the input values in order, once every input has a value. Values are passed
+      as received, e.g. text for `RemoteSensor`s without a codec.
+    - `aggregate`, an object such as `Sum()` or `Mean()` that is told which input value was replaced, so a fan-in over
+      many inputs costs O(1) per update regardless of the number of inputs.
+
+    Options:
+
+    - `min_interval_ms`: recompute at most this often; changes arriving sooner are folded into one recomputation at
+      the end of the interval. Needs a running event loop.
+    - `lazy`: do not recompute on input changes, only when `value` is read. Lazy sensors do not notify subscribers.
+    - `publish`: a `LocalSensor` the value is published through on every change, as an async subscriber.
+    """
+
+    @property
+    def value(self):
+        if self._dirty and self.lazy:
+            self._value = self._compute()
+            self._dirty = False
+        return self._value
+
+    def __init__(
+        self,
+        name: str,
+        inputs,
+        compute=None,
+        aggregate=None,
+        min_interval_ms: int = 0,
+        lazy: bool = False,
+        publish: "LocalSensor" = None,
+    ):
+        if (compute is None) == (aggregate is None):
+            raise InvalidSensorConstructorArgs(f"DerivedSensor '{name}' needs either compute or aggregate.")
+        if lazy and (min_interval_ms or publish is not None):
+            raise InvalidSensorConstructorArgs(f"Lazy DerivedSensor '{name}' cannot be rate-limited or published.")
+
+        self.name = name
+        self.compute = compute
+        self.aggregate = aggregate
+        self.min_interval_ms = min_interval_ms
+        self.lazy = lazy
+        self.recomputes = 0
+        self._inputs = [_input_sensor(sensor) for sensor in inputs]
+        self._values = [sensor.value for sensor in self._inputs]
+        self._value = None
+        self._dirty = True
+        self._updates = 0
+        self._computed_ticks = None
+        self._pending = None  # trailing recomputation, when rate-limited
+        self._subscribers = None
+
+        if aggregate is not None:
+            aggregate.reset(self._values)
+        for index, sensor in enumerate(self._inputs):
+            sensor.on_update()(self._input_callback(index))
+        if publish is not None:
+            self.subscribers.add(publish.update)
+        if not lazy:
+            self._refresh()
+            self._computed_ticks = None  # the first input update is not held back by the rate limit
+
+    def _input_callback(self, index: int):
+        def on_input_update(value):
+            self._input_changed(index, value)
+
+        return on_input_update
+
+    def _input_changed(self, index: int, value):
+        old = self._values[index]
+        self._values[index] = value
+        if self.aggregate is not None:
+            self._updates += 1
+            if self._updates % RESUM_EVERY:
+                self.aggregate.replace(old, value)
+            else:
+                self.aggregate.reset(self._values)
+        self._dirty = True
+        if self.lazy or self._pending is not None:
+            return
+        if self.min_interval_ms and self._computed_ticks is not None:
+            wait_ms = self.min_interval_ms - ticks_diff(ticks_ms(), self._computed_ticks)
+            if wait_ms > 0:
+                self._pending = asyncio.create_task(self._refresh_later(wait_ms))
+                return
+        self._refresh()
+
+    async def _refresh_later(self, wait_ms: int):
+        await asyncio.sleep(wait_ms / 1000)
+        self._pending = None
+        self._refresh()
+
+    def _compute(self):
+        self.recomputes += 1
+        if self.aggregate is not None:
+            return self.aggregate.value
+        for value in self._values:
+            if value is None:
+                return None
+        try:
+            return self.compute(*self._values)
+        except Exception as exception:
+            print(exception)  # keep the last value
+            return self._value
+
+    def _refresh(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._computed_ticks = ticks_ms()
+        value = self._compute()
+        if value != self._value:
+            self._value = value
+            self._on_update()
+
+    @property
+    def subscribers(self) -> Subscribers:
+        if self._subscribers is None:
+            self._subscribers = Subscribers()
+        return self._subscribers
+
+    def _on_update(self):
+        if self._subscribers is not None:
+            self._subscribers.notify(self._value)
+
+    def on_update(self):
+        """Decorator: call the function with the new value on every change. Any number of functions can subscribe;
+        coroutine functions are scheduled as background tasks instead of running inline."""
+        def decorator(func):
+            self.subscribers.add(func)
+            return func
+
+        return decorator
+
+    def remove_on_update(self, func):
+        if self._subscribers is not None:
+            self._subscribers.remove(func)
+
+    def __repr__(self):
+        return f"DerivedSensor(name={self.name}, value={self._value})"
@@ -0,0 +1,122 @@
+from array import array
+
+from msf.utils.ticks import ticks_ms
+
+
+class History:
+    """Fixed-capacity ring buffer of the most recent values and their `ticks_ms()` times.
+
+    Storage is preallocated `array`s, and min, max, mean and variance over the buffered window are kept up to date in
+    O(1) per sample (amortized for min/max), so reading them never allocates. Values are stored with `typecode`
+    precision ("f" by default); statistics are computed from the stored values.
+    """
+
+    def __init__(self, capacity: int, typecode: str = "f"):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1.")
+        self.capacity = capacity
+        self._values = array(typecode, [0] * capacity)
+        self._ticks = array("l", [0] * capacity)
+        self._count = 0  # samples ever appended; the window is the last min(_count, capacity)
+        self._mean = 0.0
+        self._m2 = 0.0  # sum of squared deviations from the mean, over the window
+        # Monotonic queues of absolute sample numbers, for the window min and max. Head/tail are absolute positions.
+        self._min_queue = array("l", [0] * capacity)
+        self._min_head = 0
+        self._min_tail = 0
+        self._max_queue = array("l", [0] * capacity)
+        self._max_head = 0
+        self._max_tail = 0
+
+    def __len__(self) -> int:
+        return self._count if self._count < self.capacity else self.capacity
+
+    def append(self, value, ticks: int = None):
+        capacity = self.capacity
+        position = self._count % capacity
+        full = self._count >= capacity
+        evicted = self._values[position]
+        self._values[position] = value
+        self._ticks[position] = ticks_ms() if ticks is None else ticks
+        value = self._values[position]  # as stored, so evicting it later subtracts exactly what was added
+        number = self._count
+        self._count += 1
+
+        if full:
+            # Sliding-window Welford: replace the evicted value in place.
+            mean = self._mean + (value - evicted) / capacity
+            self._m2 += (value - evicted) * (value - mean + evicted - self._mean)
+            self._mean = mean
+        else:
+            delta = value - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (value - self._mean)
+
+        # Expire the sample that just left the window (it can only be at the head) before pushing the new one,
+        # since it shares its ring position with the new value.
+        oldest = number - capacity
+        values = self._values
+        queue = self._min_queue
+        if self._min_tail > self._min_head and queue[self._min_head % capacity] <= oldest:
+            self._min_head += 1
+        while self._min_tail > self._min_head and values[queue[(self._min_tail - 1) % capacity] % capacity] >= value:
+            self._min_tail -= 1
+        queue[self._min_tail % capacity] = number
+        self._min_tail += 1
+
+        queue = self._max_queue
+        if self._max_tail > self._max_head and queue[self._max_head % capacity] <= oldest:
+            self._max_head += 1
+        while self._max_tail > self._max_head and values[queue[(self._max_tail - 1) % capacity] % capacity] <= value:
+            self._max_tail -= 1
+        queue[self._max_tail % capacity] = number
+        self._max_tail += 1
+
+    @property
+    def latest(self):
+        if not self._count:
+            return None
+        return self._values[(self._count - 1) % self.capacity]
+
+    @property
+    def min(self):
+        if not self._count:
+            return None
+        return self._values[self._min_queue[self._min_head % self.capacity] % self.capacity]
+
+    @property
+    def max(self):
+        if not self._count:
+            return None
+        return self._values[self._max_queue[self._max_head % self.capacity] % self.capacity]
+
+    @property
+    def mean(self):
+        if not self._count:
+            return None
+        return self._mean
+
+    @property
+    def variance(self):
+        """Population variance over the window."""
+        if not self._count:
+            return None
+        variance = self._m2 / len(self)
+        return variance if variance > 0 else 0.0
+
+    def items(self):
+        """`(ticks, value)` pairs, oldest first."""
+        capacity = self.capacity
+        for number in range(self._count - len(self), self._count):
+            position = number % capacity
+            yield self._ticks[position], self._values[position]
+
+    def clear(self):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min_head = self._min_tail = 0
+        self._max_head = self._max_tail = 0
+
+    def __repr__(self):
+        return f"History(capacity={self.capacity}, len={len(self)}, min={self.min}, max={self.max}, mean={self.mean})"
@@ -0,0 +1,181 @@
+import asyncio
+import os
+from binascii import hexlify, unhexlify
+from collections import deque
+
+from msf.utils.ticks import ticks_ms, ticks_diff
+
+DROP_OLDEST = "drop_oldest"
+COALESCE_LATEST = "coalesce_latest"
+
+_offline_queues = []
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path) as file:
+            return sum(1 for _ in file)
+    except OSError:
+        return 0
+
+
+class OfflineQueue:
+    """Holds `LocalSensor` publishes while the MQTT client is disconnected, and drains them on reconnect.
+
+    - `size`: messages kept in RAM.
+    - `policy`: `DROP_OLDEST` keeps the last `size` messages; `COALESCE_LATEST` keeps one (the latest) message per
+      topic, in the order topics were first queued.
+    - `spill_path`/`spill_max`: when RAM is full, up to `spill_max` more messages are appended to this file instead of
+      being dropped. Spilled messages are older than the ones in RAM and drain first. Messages spilled before a reset
+      are picked up, and so is a drain that a reset interrupted (`spill_path + ".drain"`), which then starts over.
+    - `drain_interval_ms`: pause between publishes while draining, to keep the reconnect from bursting.
+
+    Several sensors can share one queue. Queues drain when `drain_offline_queues` is called, which `msf.startup` does
+    on every connect. A message leaves the queue only once its publish returned, so a drain cut short by a lost
+    connection resumes with that message on the next one.
+    """
+
+    def __init__(
+        self,
+        size: int = 64,
+        policy: str = DROP_OLDEST,
+        spill_path: str = "",
+        spill_max: int = 0,
+        drain_interval_ms: int = 20,
+    ):
+        if policy not in (DROP_OLDEST, COALESCE_LATEST):
+            raise ValueError(f"Unknown offline queue policy '{policy}'.")
+        self.size = size
+        self.policy = policy
+        self.spill_path = spill_path
+        self.spill_max = spill_max
+        self.drain_interval_ms = drain_interval_ms
+        self._queue = deque((), size)  # (topic, payload), or topics only when coalescing
+        self._latest = {}  # topic -> payload, when coalescing
+        self._spilled = 0
+        self._draining = 0  # lines of the drain file not yet published
+        self._drained_lines = 0  # lines of the drain file already published
+        self._in_flight = None  # (topic, payload) taken from RAM and being published
+        self.draining = False
+        self.dropped = 0
+        self.coalesced = 0
+        self.spilled = 0
+        self.drained = 0
+        self.max_depth = 0
+        self.last_drain_ms = 0
+        if spill_path:
+            self._spilled = _count_lines(spill_path)  # left over from before a reset
+            self._draining = _count_lines(spill_path + ".drain")
+        _offline_queues.append(self)
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue) + self._spilled + self._draining + (self._in_flight is not None)
+
+    def __len__(self) -> int:
+        return self.depth
+
+    def put(self, topic: str, payload):
+        if self.policy == COALESCE_LATEST:
+            if topic in self._latest:
+                self._latest[topic] = payload
+                self.coalesced += 1
+                return
+            if len(self._queue) >= self.size:
+                oldest = self._queue.popleft()
+                self._overflow(oldest, self._latest.pop(oldest))
+            self._queue.append(topic)
+            self._latest[topic] = payload
+        else:
+            if len(self._queue) >= self.size:
+                self._overflow(*self._queue.popleft())
+            self._queue.append((topic, payload))
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    def _overflow(self, topic: str, payload):
+        """Spill the message pushed out of RAM to flash, if there is room, or drop it."""
+        if not self.spill_path or self._spilled >= self.spill_max:
+            self.dropped += 1
+            return
+        if isinstance(payload, (bytes, bytearray)):
+            line = "x\t" + topic + "\t" + hexlify(payload).decode() + "\n"
+        else:
+            line = "s\t" + topic + "\t" + str(payload).replace("\n", " ") + "\n"
+        with open(self.spill_path, "a") as file:
+            file.write(line)
+        self._spilled += 1
+        self.spilled += 1
+
+    def _take_spill(self) -> str:  # -> path of the spill file to drain, or ""
+        path = self.spill_path + ".drain"
+        if self._draining:
+            return path  # left by an interrupted drain
+        if not self._spilled:
+            return ""
+        try:
+            os.remove(path)  # an empty one, if any
+        except OSError:
+            pass
+        os.rename(self.spill_path, path)  # new spills go to a fresh file while this one drains
+        self._draining = self._spilled
+        self._drained_lines = 0
+        self._spilled = 0
+        return path
+
+    def _pop(self):
+        if self.policy == COALESCE_LATEST:
+            topic = self._queue.popleft()
+            return topic, self._latest.pop(topic)
+        return self._queue.popleft()
+
+    async def drain(self, client):
+        """Publish everything queued, oldest first, `drain_interval_ms` apart."""
+        if self.draining or not self.depth:
+            return
+        self.draining = True
+        start = ticks_ms()
+        interval = self.drain_interval_ms / 1000
+        try:
+            path = self._take_spill()
+            while path:
+                with open(path) as file:
+                    for number, line in enumerate(file):
+                        if number < self._drained_lines:
+                            continue  # published before the connection was lost
+                        kind, topic, payload = line.rstrip("\n").split("\t", 2)
+                        await client.publish(topic, unhexlify(payload) if kind == "x" else payload)
+                        self._drained_lines += 1
+                        self._draining -= 1
+                        self.drained += 1
+                        await asyncio.sleep(interval)
+                os.remove(path)
+                self._draining = 0
+                path = self._take_spill()  # spilled while this file drained
+            while self._in_flight is not None or self._queue:
+                if self._in_flight is None:
+                    self._in_flight = self._pop()
+                await client.publish(*self._in_flight)
+                self._in_flight = None
+                self.drained += 1
+                await asyncio.sleep(interval)
+        finally:
+            self.draining = False
+            self.last_drain_ms = ticks_diff(ticks_ms(), start)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "spilled": self.spilled,
+            "drained": self.drained,
+            "last_drain_ms": self.last_drain_ms,
+        }
+
+
+async def drain_offline_queues(client):
+    """Drain every `OfflineQueue`, one after the other."""
+    for queue in _offline_queues:
+        await queue.drain(client)
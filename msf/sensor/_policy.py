@@ -0,0 +1,50 @@
+from msf.utils.ticks import ticks_diff
+
+
+class PublishPolicy:
+    """Decides whether a `LocalSensor.update` goes out to the broker.
+
+    A policy only holds configuration, the last published value and time are kept by each sensor, so one policy can be
+    shared between sensors.
+
+    - `deadband`/`deadband_percent`: numeric values must move more than this (absolute, or percent of the last
+      published value) to be published. Non-numeric values are published when they change.
+    - `change_only`: suppress values equal to the last published one. Implied by a deadband.
+    - `min_interval_ms`: never publish more often than this.
+    - `max_interval_ms`: heartbeat; the next update after this long is published even if suppressed otherwise.
+    """
+
+    def __init__(
+        self,
+        deadband: float = 0,
+        deadband_percent: float = 0,
+        min_interval_ms: int = 0,
+        max_interval_ms: int = 0,
+        change_only: bool = True,
+    ):
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.change_only = change_only or bool(deadband) or bool(deadband_percent)
+
+    def changed(self, last_value, value) -> bool:
+        if not (isinstance(value, (int, float)) and isinstance(last_value, (int, float))):
+            return value != last_value
+        delta = abs(value - last_value)
+        if self.deadband and delta <= self.deadband:
+            return False
+        if self.deadband_percent and delta <= abs(last_value) * self.deadband_percent / 100:
+            return False
+        return delta > 0
+
+    def should_publish(self, last_value, last_ticks, value, now: int) -> bool:
+        """`last_ticks` is None if the sensor never published."""
+        if last_ticks is None:
+            return True
+        elapsed = ticks_diff(now, last_ticks)
+        if self.max_interval_ms and elapsed >= self.max_interval_ms:
+            return True
+        if self.min_interval_ms and elapsed < self.min_interval_ms:
+            return False
+        return not self.change_only or self.changed(last_value, value)
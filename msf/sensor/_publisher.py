@@ -0,0 +1,134 @@
+import asyncio
+from collections import deque
+
+from msf.utils.singleton import get_sniffs
+from msf.utils.ticks import ticks_us, ticks_diff
+from msf.utils.metrics import metrics
+from msf.sensor._offline import DROP_OLDEST, COALESCE_LATEST
+
+BLOCK = "block"
+
+
+class BackgroundPublisher:
+    """Publishes `LocalSensor` updates from a background task, so `update` does not wait for the network.
+
+    Pass it to `LocalSensor(..., publisher=publisher)`; several sensors can share one. Updates are queued, at most
+    `size` at a time, and published in order by one task. When the queue is full:
+
+    - `DROP_OLDEST`: the oldest queued update is dropped.
+    - `COALESCE_LATEST`: the queue holds one (the latest) payload per topic; only a new topic can overflow it, and
+      then the oldest topic is dropped.
+    - `BLOCK`: `await sensor.update(...)` waits for room; `update_nowait` rejects the update instead.
+
+    `latency_*` is the time updates spent queued before their publish started.
+    """
+
+    def __init__(self, size: int = 32, policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, COALESCE_LATEST, BLOCK):
+            raise ValueError(f"Unknown publisher policy '{policy}'.")
+        self.size = size
+        self.policy = policy
+        self._queue = deque((), size)  # (topic, payload, ticks_us), or topics only when coalescing
+        self._latest = {}  # topic -> (payload, ticks_us), when coalescing
+        self._task = None
+        self._busy = False
+        self._room = None  # Event set when a BLOCK waiter can retry
+        self.queued = 0
+        self.published = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latency_total_us = 0
+        self.latency_max_us = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put_nowait(self, topic, payload) -> bool:
+        """Queue a publish. Returns False if it was rejected because the queue is full (`BLOCK` policy only)."""
+        now = ticks_us()
+        if self.policy == COALESCE_LATEST:
+            if topic in self._latest:
+                self._latest[topic] = (payload, now)
+                self.coalesced += 1
+                return True
+            if len(self._queue) >= self.size:
+                self._latest.pop(self._queue.popleft())
+                self.dropped += 1
+            self._queue.append(topic)
+            self._latest[topic] = (payload, now)
+        else:
+            if len(self._queue) >= self.size:
+                if self.policy == BLOCK:
+                    self.rejected += 1
+                    return False
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((topic, payload, now))
+        self.queued += 1
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return True
+
+    async def put(self, topic, payload):
+        """Queue a publish, waiting for room first under the `BLOCK` policy."""
+        while not self.put_nowait(topic, payload):
+            if self._room is None:
+                self._room = asyncio.Event()
+            await self._room.wait()
+
+    def _pop(self):
+        if self.policy == COALESCE_LATEST:
+            topic = self._queue.popleft()
+            payload, queued_us = self._latest.pop(topic)
+            return topic, payload, queued_us
+        return self._queue.popleft()
+
+    async def _run(self):
+        try:
+            while self._queue:
+                topic, payload, queued_us = self._pop()
+                if self._room is not None:
+                    self._room.set()
+                    self._room = None
+                latency = ticks_diff(ticks_us(), queued_us)
+                self.latency_total_us += latency
+                if latency > self.latency_max_us:
+                    self.latency_max_us = latency
+                if metrics.enabled:
+                    metrics.observe("publish_queue_us", latency)
+                self._busy = True
+                try:
+                    await get_sniffs().client.publish(topic, payload)
+                    self.published += 1
+                except Exception as exception:
+                    self.errors += 1
+                    print(exception)  # keep publishing the rest
+                finally:
+                    self._busy = False
+        finally:
+            self._task = None
+
+    async def drain(self):
+        """Wait until everything queued has been published."""
+        while self._queue or self._busy:
+            await asyncio.sleep(0)
+
+    def stats(self) -> dict:
+        started = self.published + self.errors
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "queued": self.queued,
+            "published": self.published,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "latency_mean_us": self.latency_total_us / started if started else 0,
+            "latency_max_us": self.latency_max_us,
+        }
@@ -0,0 +1,162 @@
+import asyncio
+
+from msf.utils.singleton import singleton
+from msf.utils.ticks import ticks_ms, ticks_diff, ticks_add
+
+
+class Poll:
+    """One `LocalSensor` on the `PollScheduler`: its read function, current interval and timing statistics."""
+
+    __slots__ = (
+        "sensor", "read", "interval_ms", "min_interval_ms", "max_interval_ms", "threshold", "due", "last_value",
+        "runs", "missed", "errors", "jitter_total_ms", "jitter_max_ms",
+    )
+
+    def __init__(self, sensor, read, interval_ms: int, max_interval_ms: int, threshold: float, due: int):
+        self.sensor = sensor
+        self.read = read
+        self.interval_ms = interval_ms
+        self.min_interval_ms = interval_ms
+        self.max_interval_ms = max_interval_ms if max_interval_ms > interval_ms else interval_ms
+        self.threshold = threshold
+        self.due = due
+        self.last_value = None
+        self.runs = 0
+        self.missed = 0  # deadlines skipped because an earlier read was still running
+        self.errors = 0
+        self.jitter_total_ms = 0
+        self.jitter_max_ms = 0
+
+    def adapt(self, value):
+        """Back off towards `max_interval_ms` while the value holds within `threshold`, return to the fastest
+        interval as soon as it moves."""
+        if self.max_interval_ms == self.min_interval_ms:
+            return
+        last_value, self.last_value = self.last_value, value
+        try:
+            moved = last_value is None or abs(value - last_value) > self.threshold
+        except TypeError:  # non-numeric
+            moved = value != last_value
+        if moved:
+            self.interval_ms = self.min_interval_ms
+        elif self.interval_ms < self.max_interval_ms:
+            self.interval_ms = min(self.interval_ms * 2, self.max_interval_ms)
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": self.interval_ms,
+            "runs": self.runs,
+            "missed": self.missed,
+            "errors": self.errors,
+            "jitter_mean_ms": self.jitter_total_ms / self.runs if self.runs else 0,
+            "jitter_max_ms": self.jitter_max_ms,
+        }
+
+
+@singleton
+class PollScheduler:
+    """Reads `LocalSensor`s at their sampling intervals from a single task, and publishes through `sensor.update`.
+
+    Sensors that fall due within `group_window_ms` of each other are read in the same tick, one after the other, so
+    the node wakes up once for all of them. Reads run to completion in order; a read that overruns delays the others
+    in its tick, and deadlines that pass in the meantime are counted as missed and skipped, not caught up.
+    """
+
+    def __init__(self, group_window_ms: int = 10):
+        self.group_window_ms = group_window_ms
+        self.polls = {}  # sensor name -> Poll
+        self.ticks = 0
+        self._started = False
+        self._task = None
+        self._sleeping = False
+        self._wake_at = 0
+
+    def add(self, sensor, read, interval_ms: int, max_interval_ms: int = 0, threshold: float = 0) -> Poll:
+        """Read `sensor` every `interval_ms` with `read()`, a function or coroutine function returning the value.
+
+        With `max_interval_ms`, the interval adapts: it doubles after every reading within `threshold` of the
+        previous one, up to `max_interval_ms`, and drops back to `interval_ms` when the value moves further.
+        """
+        if interval_ms <= 0:
+            raise ValueError("Polling interval must be positive.")
+        due = ticks_ms()
+        poll = Poll(sensor, read, interval_ms, max_interval_ms, threshold, due)
+        self.polls[sensor.name] = poll
+        if self._task is not None and self._sleeping and ticks_diff(due, self._wake_at) < 0:
+            self._task.cancel()  # sleeping past the new sensor's first reading
+            self._task = asyncio.create_task(self._run())
+        elif self._started and self._task is None:
+            self._task = asyncio.create_task(self._run())  # stopped when the last sensor was removed
+        return poll
+
+    def remove(self, sensor):
+        self.polls.pop(sensor.name, None)
+
+    def reset(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._started = False
+        self.polls = {}
+        self.ticks = 0
+
+    def start(self):
+        """Run the timer task. `msf.startup` calls this once connected, if any sensor was scheduled."""
+        self._started = True
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.polls:
+            now = ticks_ms()
+            wake_at = None
+            for poll in self.polls.values():
+                if wake_at is None or ticks_diff(poll.due, wake_at) < 0:
+                    wake_at = poll.due
+            delay = ticks_diff(wake_at, now)
+            if delay > 0:
+                self._wake_at = wake_at
+                self._sleeping = True
+                try:
+                    await asyncio.sleep(delay / 1000)
+                finally:
+                    self._sleeping = False
+            await self.tick()
+        self._task = None
+
+    async def tick(self):
+        """Read every sensor due within `group_window_ms` from now."""
+        self.ticks += 1
+        horizon = ticks_add(ticks_ms(), self.group_window_ms)
+        due = [poll for poll in self.polls.values() if ticks_diff(poll.due, horizon) <= 0]
+        for poll in due:
+            await self._read(poll)
+
+    async def _read(self, poll: Poll):
+        start = ticks_ms()
+        jitter = ticks_diff(start, poll.due)
+        if jitter < 0:
+            jitter = -jitter  # read early, as part of a grouped tick
+        poll.runs += 1
+        poll.jitter_total_ms += jitter
+        if jitter > poll.jitter_max_ms:
+            poll.jitter_max_ms = jitter
+        try:
+            value = poll.read()
+            if hasattr(value, "send"):  # a coroutine
+                value = await value
+            await poll.sensor.update(value)
+            poll.adapt(value)
+        except Exception as exception:
+            poll.errors += 1
+            print(exception)  # keep polling the other sensors
+        due = ticks_add(poll.due, poll.interval_ms)
+        now = ticks_ms()
+        while ticks_diff(due, now) <= 0:
+            due = ticks_add(due, poll.interval_ms)
+            poll.missed += 1
+        poll.due = due
+
+    def stats(self) -> dict:
+        """Per-sensor timing statistics, by sensor name."""
+        return {name: poll.stats() for name, poll in self.polls.items()}
@@ -1,52 +1,131 @@
 from msf.utils.singleton import get_sniffs, singleton
-from msf import MQTT_SENSORS_TOPIC
+from msf.utils.ticks import ticks_ms, ticks_us, ticks_diff
+from msf.utils.codec import SUMMARY, get_topic_codec
+from msf.utils.events import Subscribers
+from msf.utils.intern import intern
+from msf.utils.metrics import metrics
+from msf.utils.loop_monitor import loop_monitor
+from msf.sensor._policy import PublishPolicy
+from msf import MQTT_SENSORS_TOPIC, MQTT_SENSORS_WILDCARD_DISPATCH, MQTT_SENSORS_BATCH_RECEIVE
 
 
 class InvalidSensorConstructorArgs(Exception):
     ...
 
 
+_SKIP = object()  # LocalSensor._accept: nothing to publish
+
+
+def _history(capacity: int):  # -> History | None
+    if not capacity:
+        return None
+    from msf.sensor._history import History  # loaded only when a sensor keeps history
+
+    return History(capacity)
+
+
+def _topic(name: str, topic_override: str) -> str:
+    return intern(topic_override or MQTT_SENSORS_TOPIC + "/" + name + "/value")
+
+
+def _record(history, value):
+    """Append a numeric (or numeric text) value to a sensor history; other values are not recorded."""
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+    history.append(value)
+
+
 class RemoteSensor:
     """Use this when defining a sensor foreign to the device."""
+    __slots__ = ("name", "topic", "codec", "history", "_value", "_subscribers", "timestamp")
+
     @property
     def value(self):
         return self._value
 
-    def __init__(self, name: str, topic_override: str = ""):
-        """If topic_override is provided, will override the default MQTT_SENSORS_TOPIC/sensor_name/value topic."""
-        if topic_override:
-            self.topic = topic_override
-        else:
-            self.topic = MQTT_SENSORS_TOPIC + "/" + name + "/value"
+    def __init__(self, name: str, topic_override: str = "", codec=None, history: int = 0):
+        """If topic_override is provided, will override the default MQTT_SENSORS_TOPIC/sensor_name/value topic.
 
-        sniffs = get_sniffs()
-        @sniffs.route(self.topic)
-        async def update_func(message):
-            self._value = message
-            self._on_update()
+        `codec` (see `msf.utils.codec`) decodes received messages; it defaults to the codec set for the topic, which
+        is the text format unless changed with `set_topic_codec`. With `history`, the last `history` numeric values
+        are kept in `self.history` (see `History`) with rolling statistics.
+        """
+        self.name = name
+        self.topic = _topic(name, topic_override)
 
+        self.codec = codec or get_topic_codec(self.topic)
+        self.history = _history(history)
         self._value = None
-
-        RemoteSensorsRegistry()[name] = self
+        self._subscribers = None
+        self.timestamp = None  # epoch ms of the last value, when it arrived in a batched frame
+
+        registry = RemoteSensorsRegistry()
+        if registry.batch_receive:
+            registry.subscribe_batches()
+        if topic_override or not registry.wildcard_dispatch:
+            # a bound method, not a closure per sensor, unless the loop monitor wraps it
+            get_sniffs().route(self.topic)(loop_monitor.watch(self.topic)(self._route_message))
+        else:
+            registry.add_dispatched(name, self)
+
+        registry[name] = self
+
+    async def _route_message(self, message):
+        self._receive(message)
+
+    def _receive(self, message, timestamp: int = None):
+        measure = metrics.enabled
+        if measure:
+            start = ticks_us()
+            metrics.count_received(self.name)
+        try:
+            value = self.codec.decode(message)
+        except ValueError as exception:
+            print(exception)  # malformed payload, keep the last value
+            if measure:
+                metrics.increment("decode_errors")
+            return
+        self._value = value
+        self.timestamp = timestamp
+        if self.history is not None:
+            _record(self.history, value)
+        self._on_update()
+        if measure:
+            metrics.observe("dispatch_us", ticks_diff(ticks_us(), start))
 
     def update(self, value):
         if self._value != value:
             self._value = value
+            if self.history is not None:
+                _record(self.history, value)
             self._on_update()
 
+    @property
+    def subscribers(self) -> Subscribers:
+        if self._subscribers is None:
+            self._subscribers = Subscribers()
+        return self._subscribers
+
     def _on_update(self):
-        pass
+        if self._subscribers is not None:
+            self._subscribers.notify(self._value)
 
     def on_update(self):
+        """Decorator: call the function with the new value on every update. Any number of functions can subscribe;
+        coroutine functions are scheduled as background tasks instead of running inline."""
         def decorator(func):
-            def wrapper(*args, **kwargs):
-                return func(self.value)
-
-            self._on_update = wrapper
-            return wrapper
+            self.subscribers.add(func)
+            return func
 
         return decorator
 
+    def remove_on_update(self, func):
+        if self._subscribers is not None:
+            self._subscribers.remove(func)
+
 
 @singleton
 class RemoteSensorsRegistry:
@@ -70,9 +149,61 @@ class RemoteSensorsRegistry:
 
     def __init__(self):
         self.remote_sensors = {}
+        self.wildcard_dispatch = MQTT_SENSORS_WILDCARD_DISPATCH
+        self._dispatch_sensors = {}  # sensor name -> RemoteSensor, for sensors on the default topic
+        self._subscribed = False
+        self.batch_receive = MQTT_SENSORS_BATCH_RECEIVE
+        self._batches_subscribed = False
 
     def reset(self):
         self.remote_sensors = {}
+        self._dispatch_sensors = {}
+
+    def add_dispatched(self, sensor_name: str, remote_sensor: RemoteSensor):
+        """Receive values for `remote_sensor` through the shared wildcard route."""
+        self._dispatch_sensors[sensor_name] = remote_sensor
+        if not self._subscribed:
+            self._subscribe()
+
+    def _subscribe(self):
+        """Register the single MQTT_SENSORS_TOPIC/+/value route; routes cannot be removed, so this happens once."""
+        sniffs = get_sniffs()
+        @sniffs.route(MQTT_SENSORS_TOPIC + "/<sensor>/value")
+        @loop_monitor.watch("sensor_dispatch")
+        async def dispatch_func(sensor, message):
+            self.dispatch(sensor, message)
+
+        self._subscribed = True
+
+    def dispatch(self, sensor_name: str, message):
+        """Hand a message received on the wildcard route to its sensor; values for unknown sensors are dropped."""
+        remote_sensor = self._dispatch_sensors.get(sensor_name)
+        if remote_sensor is not None:
+            remote_sensor._receive(message)
+
+    def subscribe_batches(self):
+        """Register the MQTT_SENSORS_TOPIC/_batch/+ route for batched frames, once."""
+        if self._batches_subscribed:
+            return
+        from msf.sensor._batch import BATCH_TOPIC
+
+        sniffs = get_sniffs()
+        @sniffs.route(BATCH_TOPIC + "/<publisher>")
+        @loop_monitor.watch("sensor_batch")
+        async def receive_batch_func(publisher, message):
+            self.receive_batch(message)
+
+        self._batches_subscribed = True
+
+    def receive_batch(self, message):
+        """Unpack a batched frame and hand each value to its sensor, in order, as the string it would have been sent
+        as on its own topic. Values for sensors not defined on this node are dropped."""
+        from msf.sensor._batch import decode_frame
+
+        for sensor_name, value, timestamp in decode_frame(message):
+            remote_sensor = self.remote_sensors.get(sensor_name)
+            if remote_sensor is not None:
+                remote_sensor._receive(str(value), timestamp)
 
     def update_remote_sensor(self, sensor_name: str, sensor_value: any):
         if sensor_name not in self.remote_sensors:
@@ -84,25 +215,144 @@ class RemoteSensorsRegistry:
 
 class LocalSensor:
     """Use this when defining a sensor local to the device."""
+    __slots__ = (
+        "name", "topic", "codec", "history", "_value", "policy", "batch", "offline",
+        "published_count", "suppressed_count", "_published_value", "_published_ticks", "_preallocated",
+        "publisher", "timeseries", "window",
+    )
+
     @property
     def value(self):
         return self._value
 
-    def __init__(self, name: str, topic_override: str = ""):
-        """If topic_override is provided, will override the default MQTT_SENSORS_TOPIC/sensor_name/value topic."""
-        if topic_override:
-            self.topic = topic_override
-        else:
-            self.topic = MQTT_SENSORS_TOPIC + "/" + name + "/value"
+    def __init__(
+        self,
+        name: str,
+        topic_override: str = "",
+        policy: PublishPolicy = None,
+        batch: "BatchPublisher" = None,
+        codec=None,
+        history: int = 0,
+        offline: "OfflineQueue" = None,
+        preallocate: bool = False,
+        publisher: "BackgroundPublisher" = None,
+        timeseries: "TimeSeriesStore" = None,
+        window: "Window" = None,
+    ):
+        """If topic_override is provided, will override the default MQTT_SENSORS_TOPIC/sensor_name/value topic.
+
+        Without a `policy`, every update is published. With a `batch` publisher, updates go out in its frames
+        instead of on the sensor's own topic. `codec` encodes published values and `history` keeps recent values,
+        as for `RemoteSensor`; every update is recorded, published or not. With an `offline` queue, updates made while
+        the client is disconnected are queued and published on reconnect instead of waiting for the connection.
+
+        With `preallocate`, the topic is encoded to bytes once and payloads are encoded into a buffer kept by the
+        sensor, so publishing an int (text or `struct` codec) or a float (`struct` codec) allocates nothing for the
+        topic or payload. The published payload is then that reused buffer, valid until the next update.
+
+        With a `publisher`, `update` returns once the update is queued and the `BackgroundPublisher` publishes it
+        from its own task; `update_nowait` does the same without awaiting. With a `timeseries` store, every numeric
+        update is also recorded to flash under the sensor's name.
+
+        With a `window`, samples are aggregated and one `Summary` is published per window instead, in the `SUMMARY`
+        format that a `RemoteSensor(..., codec=SUMMARY)` decodes. `value`, `history` and `timeseries` still see
+        every sample; a `policy` applies to the summaries. A window cannot be combined with a `batch`.
+        """
+        if publisher is not None and (batch is not None or preallocate):
+            raise InvalidSensorConstructorArgs(
+                f"LocalSensor '{name}' cannot combine a background publisher with a batch or preallocate."
+            )
+        self.name = name
+        self.topic = _topic(name, topic_override)
+
+        if window is not None:
+            if codec not in (None, SUMMARY) or preallocate:
+                raise InvalidSensorConstructorArgs(f"LocalSensor '{name}' publishes window summaries as SUMMARY.")
+            if batch is not None:  # batch frames carry plain values, not summaries
+                raise InvalidSensorConstructorArgs(f"LocalSensor '{name}' cannot combine a window with a batch.")
+            codec = SUMMARY
+        self.codec = codec or get_topic_codec(self.topic)
+        self.history = _history(history)
 
         self._value = None
+        self.window = window
+        self.policy = policy
+        self.batch = batch
+        self.offline = offline
+        self.publisher = publisher
+        self.timeseries = timeseries
+        self.published_count = 0
+        self.suppressed_count = 0
+        self._published_value = None
+        self._published_ticks = None
+        self._preallocated = None  # (topic bytes, encoder)
+        if preallocate:
+            encoder = self.codec.encoder() if hasattr(self.codec, "encoder") else self.codec
+            self._preallocated = (self.topic.encode(), encoder)
 
         LocalSensorsRegistry()[name] = self
 
-    async def update(self, new_value):
+    def _accept(self, new_value):
+        """Record `new_value` and return the value to publish, or `_SKIP`."""
         self._value = new_value
+        if self.history is not None:
+            _record(self.history, new_value)
+        if self.timeseries is not None:
+            self.timeseries.append(self.name, new_value)
+        if self.window is not None:
+            new_value = self.window.add(new_value)
+            if new_value is None:
+                return _SKIP
+        if self.policy is not None:
+            now = ticks_ms()
+            if not self.policy.should_publish(self._published_value, self._published_ticks, new_value, now):
+                self.suppressed_count += 1
+                return _SKIP
+            self._published_value = new_value
+            self._published_ticks = now
+        self.published_count += 1
+        if metrics.enabled:
+            metrics.count_published(self.name)
+        return new_value
+
+    def _queue_offline(self, sniffs, new_value) -> bool:
+        offline = self.offline
+        if offline is not None and (offline.depth or offline.draining or not sniffs.client.isconnected()):
+            offline.put(self.topic, self.codec.encode(new_value))  # behind anything already queued, not a reused buffer
+            return True
+        return False
+
+    async def update(self, new_value):
+        new_value = self._accept(new_value)
+        if new_value is _SKIP:
+            return
+        if self.batch is not None:
+            await self.batch.add(self.name, new_value)
+            return
         sniffs = get_sniffs()
-        await sniffs.client.publish(f"{self.topic}", str(new_value))
+        if self._queue_offline(sniffs, new_value):
+            return
+        if self.publisher is not None:
+            await self.publisher.put(self.topic, self.codec.encode(new_value))
+            return
+        preallocated = self._preallocated
+        if preallocated is not None:
+            topic, encoder = preallocated
+            await sniffs.client.publish(topic, encoder.encode(new_value))
+            return
+        await sniffs.client.publish(self.topic, self.codec.encode(new_value))
+
+    def update_nowait(self, new_value) -> bool:
+        """Non-blocking `update` for sensors with a `publisher`, callable from synchronous code. Returns False if the
+        update was not queued because the publisher's queue is full under its `BLOCK` policy."""
+        if self.publisher is None:
+            raise RuntimeError(f"LocalSensor '{self.name}' has no background publisher.")
+        new_value = self._accept(new_value)
+        if new_value is _SKIP:
+            return True
+        if self._queue_offline(get_sniffs(), new_value):
+            return True
+        return self.publisher.put_nowait(self.topic, self.codec.encode(new_value))
 
 @singleton
 class LocalSensorsRegistry:
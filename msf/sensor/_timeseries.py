@@ -0,0 +1,408 @@
+import asyncio
+import json
+import os
+
+from msf.utils.singleton import get_sniffs
+from msf.utils.ticks import ticks_ms, ticks_diff
+from msf.utils.ntp import wall_clock
+from msf import MQTT_SENSORS_TOPIC
+
+HISTORY_TOPIC = MQTT_SENSORS_TOPIC + "/_history"
+
+RAW = 0
+MINUTE = 60 * 1000
+HOUR = 60 * 60 * 1000
+
+SEGMENTS_PER_TIER = 4  # a tier's budget is split into this many files; the oldest is deleted to make room
+
+
+def _put_varint(buffer: bytearray, value: int):
+    while value > 0x7F:
+        buffer.append(0x80 | (value & 0x7F))
+        value >>= 7
+    buffer.append(value)
+
+
+def _put_signed(buffer: bytearray, value: int):
+    _put_varint(buffer, value << 1 if value >= 0 else (-value << 1) - 1)  # zigzag: small magnitudes, few bytes
+
+
+def _get_varint(data, position: int):  # -> (value, position); IndexError when truncated
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _get_signed(data, position: int):
+    value, position = _get_varint(data, position)
+    return (-((value + 1) >> 1) if value & 1 else value >> 1), position
+
+
+def _parent(path: str) -> str:
+    index = path.rfind("/")
+    return path[:index] if index > 0 else ""
+
+
+def _open_append(path: str):
+    try:
+        return open(path, "ab")
+    except OSError:
+        os.mkdir(_parent(path))  # first write on this board
+        return open(path, "ab")
+
+
+def _read_blocks(path: str, size: int):
+    """Block payloads of a segment file, up to `size` bytes into it. A block torn by a power loss ends the file."""
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return  # deleted to make room meanwhile
+    with file:
+        position = 0
+        while position < size:
+            length = 0
+            shift = 0
+            while True:
+                byte = file.read(1)
+                if not byte:
+                    return
+                position += 1
+                length |= (byte[0] & 0x7F) << shift
+                if byte[0] < 0x80:
+                    break
+                shift += 7
+            block = file.read(length)
+            position += length
+            if len(block) < length or position > size:
+                return
+            yield block
+
+
+class _Tier:
+    """One resolution of a `TimeSeriesStore`: raw samples (`period_ms` 0) or per-period aggregates."""
+
+    def __init__(self, path: str, index: int, period_ms: int, budget: int, block_size: int):
+        self.period_ms = period_ms
+        self.budget = budget
+        self.prefix = f"{path}.{index}."
+        self.segment_bytes = max(budget // SEGMENTS_PER_TIER, block_size)
+        self.max_segments = max(budget // self.segment_bytes, 1)
+        self.buffer = bytearray()
+        self.buckets = {}  # series id -> [start ms, count, sum, min, max] of the open aggregate, quantized
+        self._previous = {}  # series id -> (time, value) of its last record in the buffered block
+        self.segments = self._find_segments(path)  # [[number, size], ...], oldest first
+
+    def _find_segments(self, path: str) -> list:
+        index = path.rfind("/")
+        directory = path[:index] or "/" if index >= 0 else "."  # "/store" lives in "/", "store" in the cwd
+        name = self.prefix[index + 1:]
+        segments = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return segments
+        for file_name in names:
+            if file_name.startswith(name):
+                try:
+                    number = int(file_name[len(name):])
+                except ValueError:
+                    continue
+                segments.append([number, os.stat(self.prefix + str(number))[6]])
+        segments.sort()
+        return segments
+
+    @property
+    def stored_bytes(self) -> int:
+        return sum(size for _, size in self.segments)
+
+    def add(self, series: int, time_ms: int, value: int):
+        if not self.period_ms:
+            self._encode(series, time_ms, value)
+            return
+        start = time_ms - time_ms % self.period_ms
+        bucket = self.buckets.get(series)
+        if bucket is not None and bucket[0] != start:
+            self._encode_bucket(series, bucket)
+            bucket = None
+        if bucket is None:
+            self.buckets[series] = [start, 1, value, value, value]
+            return
+        bucket[1] += 1
+        bucket[2] += value
+        if value < bucket[3]:
+            bucket[3] = value
+        if value > bucket[4]:
+            bucket[4] = value
+
+    def _encode(self, series: int, time_ms: int, value: int):
+        """Raw record: series, time and value deltas from the series' previous record in the block."""
+        previous_time, previous_value = self._previous.get(series, (0, 0))
+        buffer = self.buffer
+        _put_varint(buffer, series)
+        _put_signed(buffer, time_ms - previous_time)
+        _put_signed(buffer, value - previous_value)
+        self._previous[series] = (time_ms, value)
+
+    def _encode_bucket(self, series: int, bucket: list):
+        """Aggregate record: series, start and mean deltas, count, then min and max relative to the mean."""
+        start, count, total, low, high = bucket
+        mean = (total + count // 2) // count
+        previous_start, previous_mean = self._previous.get(series, (0, 0))
+        buffer = self.buffer
+        _put_varint(buffer, series)
+        _put_signed(buffer, start - previous_start)
+        _put_varint(buffer, count)
+        _put_signed(buffer, mean - previous_mean)
+        _put_signed(buffer, low - mean)
+        _put_signed(buffer, high - mean)
+        self._previous[series] = (start, mean)
+
+    def close_buckets(self):
+        for series, bucket in self.buckets.items():
+            self._encode_bucket(series, bucket)
+        self.buckets = {}
+
+    def flush(self) -> int:
+        """Write the buffered block in one write; returns the bytes written."""
+        if not self.buffer:
+            return 0
+        frame = bytearray()
+        _put_varint(frame, len(self.buffer))
+        frame += self.buffer
+        if not self.segments or self.segments[-1][1] + len(frame) > self.segment_bytes:
+            self.segments.append([self.segments[-1][0] + 1 if self.segments else 0, 0])
+            # a frame can run past `segment_bytes` by up to one record, so the byte budget is checked as well
+            while len(self.segments) > self.max_segments or (
+                len(self.segments) > 1 and self.stored_bytes + len(frame) > self.budget
+            ):
+                number, _ = self.segments.pop(0)
+                try:
+                    os.remove(self.prefix + str(number))
+                except OSError:
+                    pass
+        with _open_append(self.prefix + str(self.segments[-1][0])) as file:
+            file.write(frame)
+        self.segments[-1][1] += len(frame)
+        self.buffer = bytearray()
+        self._previous = {}  # blocks decode on their own, so any of them can be deleted
+        return len(frame)
+
+    def records(self, series: int):
+        """Decoded records of `series`, oldest first, from the segments as they are now and the buffered block."""
+        blocks = [(self.prefix + str(number), size) for number, size in self.segments]
+        buffered = bytes(self.buffer)
+        open_bucket = self.buckets.get(series)
+        open_bucket = list(open_bucket) if open_bucket is not None else None
+        for path, size in blocks:
+            for block in _read_blocks(path, size):
+                yield from self._decode(block, series)
+        yield from self._decode(buffered, series)
+        if open_bucket is not None:
+            start, count, total, low, high = open_bucket
+            yield start, count, total / count, low, high
+
+    def _decode(self, block, series: int):
+        previous = {}
+        position = 0
+        try:
+            while position < len(block):
+                record_series, position = _get_varint(block, position)
+                previous_time, previous_value = previous.get(record_series, (0, 0))
+                delta_time, position = _get_signed(block, position)
+                time_ms = previous_time + delta_time
+                if not self.period_ms:
+                    delta_value, position = _get_signed(block, position)
+                    value = previous_value + delta_value
+                    previous[record_series] = (time_ms, value)
+                    if record_series == series:
+                        yield time_ms, value
+                    continue
+                count, position = _get_varint(block, position)
+                delta_mean, position = _get_signed(block, position)
+                mean = previous_value + delta_mean
+                low, position = _get_signed(block, position)
+                high, position = _get_signed(block, position)
+                previous[record_series] = (time_ms, mean)
+                if record_series == series:
+                    yield time_ms, count, mean, mean + low, mean + high
+        except IndexError:
+            return  # corrupt block
+
+
+def encode_chunk(name: str, period_ms: int, sequence: int, rows: list, last: bool) -> str:
+    """One upload chunk: `{"sensor": name, "period": period_ms, "seq": n, "rows": [...], "last": bool}`.
+
+    Rows are `[time ms, value]` for raw samples and `[start ms, count, mean, min, max]` for aggregates.
+    """
+    return json.dumps({"sensor": name, "period": period_ms, "seq": sequence, "rows": rows, "last": last})
+
+
+def decode_chunk(message) -> dict:
+    return json.loads(message)
+
+
+class TimeSeriesStore:
+    """Rolling on-flash history of `LocalSensor` values, kept at several resolutions within a fixed flash budget.
+
+    Pass the store to `LocalSensor(..., timeseries=store)` to record every update of that sensor (numeric values
+    only), or call `append` directly. Timestamps are `wall_clock` epoch milliseconds.
+
+    - `tiers`: `(period_ms, budget_bytes)` pairs. Period `RAW` (0) keeps every sample; others keep one aggregate
+      (count, mean, min, max) per period, e.g. `MINUTE` and `HOUR`. Each tier is a few segment files under
+      `path + ".<tier index>.<n>"`; once a tier would exceed its budget, its oldest segment is deleted.
+    - `block_size`: samples are delta-encoded into a RAM buffer per tier, and written with one append once it holds
+      this many bytes, or `flush_after_ms` after the first buffered sample (checked on `append`). Buffered samples,
+      and the open aggregate of each period, are lost on a reset; call `close()` before a planned one.
+    - `decimals`: values are stored as integers with this many decimals.
+
+    Stored ranges are read back with `query` and sent over MQTT in chunks with `upload`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        tiers=((RAW, 32 * 1024), (MINUTE, 16 * 1024), (HOUR, 8 * 1024)),
+        block_size: int = 512,
+        decimals: int = 2,
+        flush_after_ms: int = 60 * 1000,
+    ):
+        self.path = path
+        self.block_size = block_size
+        self.scale = 10 ** decimals
+        self.flush_after_ms = flush_after_ms
+        self.tiers = [
+            _Tier(path, index, period_ms, budget, block_size) for index, (period_ms, budget) in enumerate(tiers)
+        ]
+        self.series = self._load_series()
+        self._ids = {name: index for index, name in enumerate(self.series)}
+        self._buffered_ticks = None
+        self.samples = 0
+        self.skipped = 0
+        self.blocks_written = 0
+        self.bytes_written = 0
+
+    def _load_series(self) -> list:
+        try:
+            with open(self.path + ".series") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def _series_id(self, name: str) -> int:
+        series = self._ids.get(name)
+        if series is None:
+            series = len(self.series)
+            self.series.append(name)
+            self._ids[name] = series
+            try:
+                file = open(self.path + ".series", "w")
+            except OSError:
+                os.mkdir(_parent(self.path))
+                file = open(self.path + ".series", "w")
+            with file:
+                json.dump(self.series, file)
+        return series
+
+    def append(self, name: str, value, time_ms: int = None):
+        try:
+            value = round(float(value) * self.scale)
+        except (TypeError, ValueError, OverflowError):
+            self.skipped += 1  # not numeric
+            return
+        if time_ms is None:
+            time_ms = wall_clock.time_ms()
+        series = self._series_id(name)
+        for tier in self.tiers:
+            tier.add(series, time_ms, value)
+            if len(tier.buffer) >= self.block_size:
+                self._flush_tier(tier)
+        self.samples += 1
+        if self._buffered_ticks is None:
+            self._buffered_ticks = ticks_ms()
+        elif self.flush_after_ms and ticks_diff(ticks_ms(), self._buffered_ticks) >= self.flush_after_ms:
+            self.flush()
+
+    def _flush_tier(self, tier: _Tier):
+        written = tier.flush()
+        if written:
+            self.blocks_written += 1
+            self.bytes_written += written
+
+    def flush(self):
+        """Write every tier's buffered block."""
+        for tier in self.tiers:
+            self._flush_tier(tier)
+        self._buffered_ticks = None
+
+    def close(self):
+        """Write the open aggregates too, ending their periods early."""
+        for tier in self.tiers:
+            tier.close_buckets()
+        self.flush()
+
+    def _tier(self, period_ms: int) -> _Tier:
+        for tier in self.tiers:
+            if tier.period_ms == period_ms:
+                return tier
+        raise ValueError(f"No tier with a period of {period_ms} ms.")
+
+    def query(self, name: str, start_ms: int = None, end_ms: int = None, period_ms: int = RAW):
+        """Stored records of sensor `name` with `start_ms <= time < end_ms`, oldest first: `(time ms, value)` for
+        `RAW`, `(start ms, count, mean, min, max)` for aggregates. The open aggregate of each period is included."""
+        tier = self._tier(period_ms)
+        series = self._ids.get(name)
+        if series is None:
+            return
+        scale = self.scale
+        for record in tier.records(series):
+            time_ms = record[0]
+            if (start_ms is not None and time_ms < start_ms) or (end_ms is not None and time_ms >= end_ms):
+                continue
+            if period_ms == RAW:
+                yield time_ms, record[1] / scale
+            else:
+                yield time_ms, record[1], record[2] / scale, record[3] / scale, record[4] / scale
+
+    async def upload(
+        self,
+        name: str,
+        start_ms: int = None,
+        end_ms: int = None,
+        period_ms: int = RAW,
+        chunk_size: int = 64,
+        interval_ms: int = 20,
+        topic: str = "",
+    ) -> int:
+        """Publish a stored range (see `query`) as `encode_chunk` messages of up to `chunk_size` rows on
+        `HISTORY_TOPIC/<name>`, pausing `interval_ms` between chunks. The last chunk has `"last": true`, and is sent
+        even when the range is empty. Returns the number of rows sent."""
+        topic = topic or HISTORY_TOPIC + "/" + name
+        client = get_sniffs().client
+        rows = []
+        sequence = 0
+        sent = 0
+        for record in self.query(name, start_ms, end_ms, period_ms):
+            rows.append(list(record))
+            if len(rows) >= chunk_size:
+                await client.publish(topic, encode_chunk(name, period_ms, sequence, rows, False))
+                sent += len(rows)
+                sequence += 1
+                rows = []
+                await asyncio.sleep(interval_ms / 1000)
+        await client.publish(topic, encode_chunk(name, period_ms, sequence, rows, True))
+        return sent + len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "skipped": self.skipped,
+            "blocks_written": self.blocks_written,
+            "bytes_written": self.bytes_written,
+            "stored_bytes": {tier.period_ms: tier.stored_bytes for tier in self.tiers},
+        }
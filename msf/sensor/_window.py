@@ -0,0 +1,101 @@
+from msf.utils.codec import Summary
+from msf.utils.ticks import ticks_ms, ticks_add, ticks_diff
+
+
+class Window:
+    """Publish-side aggregation for a `LocalSensor`: one `Summary` (count, mean, min, max, last) per window instead
+    of every sample.
+
+    With only `window_ms`, windows are tumbling: back to back, each sample in exactly one. With `slide_ms`, a window
+    of the last `window_ms` is summarized every `slide_ms`; `window_ms` must be a multiple of it. The window is kept as
+    `window_ms // slide_ms` per-slide partial aggregates, so memory does not depend on the sample rate.
+
+    Summaries are produced by the first sample after a window ends, at most one per sample; gaps without samples
+    produce none. Non-numeric samples are left out.
+    """
+
+    def __init__(self, window_ms: int, slide_ms: int = 0):
+        slide_ms = slide_ms or window_ms
+        if window_ms <= 0 or slide_ms <= 0 or window_ms % slide_ms:
+            raise ValueError("A window must be a positive multiple of its slide.")
+        self.window_ms = window_ms
+        self.slide_ms = slide_ms
+        panes = window_ms // slide_ms
+        self._counts = [0] * panes
+        self._sums = [0.0] * panes
+        self._mins = [0.0] * panes
+        self._maxes = [0.0] * panes
+        self._lasts = [None] * panes
+        self._position = 0  # pane of the current slide; the ones after it, wrapping around, are older
+        self._pane_ticks = None  # when the current slide started
+        self.summaries = 0
+
+    def add(self, value, now_ticks: int = None):  # -> Summary | None
+        """Add a sample; returns the summary of the window that ended before it, if any."""
+        if not isinstance(value, (int, float)):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+        if now_ticks is None:
+            now_ticks = ticks_ms()
+        summary = None
+        if self._pane_ticks is None:
+            self._pane_ticks = now_ticks
+        else:
+            slides = ticks_diff(now_ticks, self._pane_ticks) // self.slide_ms
+            if slides > 0:
+                summary = self.summary()
+                if summary is not None:
+                    self.summaries += 1
+                self._advance(slides)
+                self._pane_ticks = ticks_add(self._pane_ticks, slides * self.slide_ms)
+        position = self._position
+        if self._counts[position]:
+            self._sums[position] += value
+            if value < self._mins[position]:
+                self._mins[position] = value
+            if value > self._maxes[position]:
+                self._maxes[position] = value
+        else:
+            self._sums[position] = value
+            self._mins[position] = value
+            self._maxes[position] = value
+        self._counts[position] += 1
+        self._lasts[position] = value
+        return summary
+
+    def _advance(self, slides: int):
+        panes = len(self._counts)
+        for _ in range(min(slides, panes)):
+            self._position = (self._position + 1) % panes
+            self._counts[self._position] = 0
+            self._lasts[self._position] = None
+
+    def summary(self):  # -> Summary | None
+        """Summary of the current window so far, or None if it has no samples."""
+        panes = len(self._counts)
+        count = 0
+        total = 0.0
+        low = high = last = None
+        for offset in range(1, panes + 1):  # oldest pane first
+            position = (self._position + offset) % panes
+            pane_count = self._counts[position]
+            if not pane_count:
+                continue
+            count += pane_count
+            total += self._sums[position]
+            if low is None or self._mins[position] < low:
+                low = self._mins[position]
+            if high is None or self._maxes[position] > high:
+                high = self._maxes[position]
+            last = self._lasts[position]
+        if not count:
+            return None
+        return Summary(count, total / count, low, high, last)
+
+    def reset(self):
+        for position in range(len(self._counts)):
+            self._counts[position] = 0
+            self._lasts[position] = None
+        self._pane_ticks = None
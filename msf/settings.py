@@ -1,13 +1,64 @@
 # settings.py
 # Similar to the new project directory, settings.py is used for identifying locations of
 # different modules and files.
-from pathlib import Path
+# Plain strings rather than pathlib paths: settings are resolved on every boot, and pathlib costs an import.
 
 
-DEVICES_SETTINGS_PATH = Path("/.settings") / "devices.json"
+DEVICES_SETTINGS_PATH = "/.settings/devices.json"
 
-MQTT_AS_CONFIG_PATH = Path("/.config") / "mqtt_as.json"
+# Write-behind for setting updates received over MQTT. With a delay of 0 every update is written immediately,
+# otherwise updates are merged into one write once none arrived for DEVICES_SETTINGS_WRITE_DELAY_MS, or at the
+# latest DEVICES_SETTINGS_WRITE_MAX_DELAY_MS after the first pending update.
+DEVICES_SETTINGS_WRITE_DELAY_MS = 0
+DEVICES_SETTINGS_WRITE_MAX_DELAY_MS = 5000
+
+# How setting changes are persisted. "json" rewrites DEVICES_SETTINGS_PATH on every write. "journal" appends each
+# change to DEVICES_SETTINGS_PATH + ".journal" and folds the journal back into DEVICES_SETTINGS_PATH, in the same
+# format, in the background once it has DEVICES_SETTINGS_COMPACT_AFTER lines (see msf.device.JournalStore).
+DEVICES_SETTINGS_BACKEND = "json"
+DEVICES_SETTINGS_COMPACT_AFTER = 64
+
+# Async on_update callbacks run as background tasks, at most CALLBACK_CONCURRENCY at a time and one at a time per
+# subscriber. At most CALLBACK_QUEUE_SIZE can wait to start before the oldest waiting one is dropped.
+CALLBACK_QUEUE_SIZE = 16
+CALLBACK_CONCURRENCY = 4
+
+MQTT_AS_CONFIG_PATH = "/.config/mqtt_as.json"
+
+# Wall-clock time from NTP (see msf.utils.ntp). startup() syncs in the background: servers are tried in order, failed
+# rounds are retried after 1 s, doubling up to NTP_RETRY_MAX_MS, and the time is resynced every
+# NTP_RESYNC_INTERVAL_MS. The RTC is set to UTC plus NTP_OFFSET_S (-4 h, as previously hard-coded); timestamps from
+# msf.utils.ntp.wall_clock, such as those in batched sensor frames, are UTC.
+NTP_SERVERS = ("pool.ntp.org",)
+NTP_OFFSET_S = -4 * 60 * 60
+NTP_TIMEOUT_MS = 1000
+NTP_RESYNC_INTERVAL_MS = 60 * 60 * 1000
+NTP_RETRY_MAX_MS = 5 * 60 * 1000
+
+# Opt-in: every LOOP_MONITOR_INTERVAL_MS, measure how late the event loop wakes a ticker task (see
+# msf.utils.loop_monitor). Lags of LOOP_MONITOR_STALL_MS or more are printed as stalls, naming the route handler,
+# on_update callback or settings write that ran. 0 disables monitoring.
+LOOP_MONITOR_INTERVAL_MS = 0
+LOOP_MONITOR_STALL_MS = 50
+
+# Retained device metadata is re-published on every connect with at most this many publishes in flight.
+MQTT_CONNECT_PUBLISH_CONCURRENCY = 4
 
 # IMPORTANT: DO NOT start mqtt topic's with a "/"
 MQTT_DEVICES_TOPIC = "test/devices"
-MQTT_SENSORS_TOPIC = "test/sensors"
\ No newline at end of file
+MQTT_SENSORS_TOPIC = "test/sensors"
+
+# Opt-in: route every default-topic RemoteSensor through one MQTT_SENSORS_TOPIC/+/value subscription and a dict
+# lookup, instead of one subscription per sensor. The node then receives every sensor value published under
+# MQTT_SENSORS_TOPIC; values for sensors it does not define are dropped. Sensors with a topic_override keep their own.
+MQTT_SENSORS_WILDCARD_DISPATCH = False
+
+# Opt-in: subscribe to batched sensor frames (see msf.sensor.BatchPublisher) on MQTT_SENSORS_TOPIC/_batch/+ and
+# update each RemoteSensor in the frame as if its value had arrived on its own topic.
+MQTT_SENSORS_BATCH_RECEIVE = False
+
+# Opt-in: every METRICS_INTERVAL_MS, publish message counts, latency histograms and free heap as JSON to
+# MQTT_DEVICES_TOPIC/_metrics/<node> (see msf.utils.metrics). 0 disables collection entirely. The node defaults to
+# the hex machine.unique_id() when METRICS_NODE_NAME is empty.
+METRICS_INTERVAL_MS = 0
+METRICS_NODE_NAME = ""
@@ -1,18 +1,24 @@
+import asyncio
+import sys
+
 from msf.sensor import RemoteSensorsRegistry
 
 if __name__ == "__main__":
-    import sys
     import os
 
     sys.path.append(os.getcwd())
 
 
-from msf.utils.rtc import set_rtc
+from msf.utils.ntp import ntp_client
 from msf.device import DevicesRegistry
 from msf import MQTT_DEVICES_TOPIC, MQTT_AS_CONFIG_PATH
 
 from mpstore import load_store
-from msf.utils.singleton import SniffsSingleton
+from msf.utils.singleton import SniffsSingleton, get_sniffs
+from msf.utils.boot import boot_timer
+from msf.utils.metrics import metrics
+from msf.utils.loop_monitor import loop_monitor
+from msf.utils.ticks import ticks_us, ticks_diff
 from mqtt_as import config, MQTTClient
 
 sniffs = SniffsSingleton()
@@ -20,26 +26,86 @@ devices = DevicesRegistry()
 remote_sensors = RemoteSensorsRegistry()
 
 
-@sniffs.route(MQTT_DEVICES_TOPIC + "/<device>/<setting>/value")
+# The route handlers look the registry and Sniffs up on every call rather than using the globals above, so a load test
+# that gives each simulated node its own singletons (see msf.utils.singleton.swap_singletons) runs them per node.
+@loop_monitor.watch("update_devices")
 async def update_devices(device, setting, message):
     try:
-        devices.update_device_setting(device, setting, message)
+        DevicesRegistry().update_device_setting(device, setting, message)
     except KeyError:
         pass  # TODO: Remove this when dynamic routing is available.
     except Exception as exception:
         # don't allow crashes from the update_devices call, just log it
         print(exception)  # TODO: Create/find a better logging solution.
-        pass
+        if metrics.enabled:
+            metrics.increment("errors")
+
+
+@loop_monitor.watch("update_devices_bulk")
+async def update_devices_bulk(device, message):
+    registry = DevicesRegistry()
+    try:
+        registry.update_device_settings(device, message)
+    except KeyError:
+        return  # a device on another node
+    except Exception as exception:
+        print(exception)  # nothing was applied
+        if metrics.enabled:
+            metrics.increment("errors")
+        return
+    try:
+        await registry.publish_reported_state(get_sniffs().client, device)
+    except Exception as exception:
+        print(exception)  # the settings were applied and saved; only the report is lost
+        if metrics.enabled:
+            metrics.increment("errors")
+
+
+def add_device_routes(sniffs: SniffsSingleton):
+    """Route setting updates, single and bulk, to the devices of the registry. Done on import for this node."""
+    sniffs.route(MQTT_DEVICES_TOPIC + "/<device>/<setting>/value")(update_devices)
+    sniffs.route(MQTT_DEVICES_TOPIC + "/<device>/_bulk")(update_devices_bulk)
+
+
+add_device_routes(sniffs)
+
+
+async def _drain_offline_queues(client):
+    offline = sys.modules.get("msf.sensor._offline")  # only loaded if an OfflineQueue was created
+    if offline is not None:
+        await offline.drain_offline_queues(client)
+
+
+def _start_poll_scheduler():
+    scheduler = sys.modules.get("msf.sensor._scheduler")  # only loaded if a sensor was scheduled
+    if scheduler is not None:
+        scheduler.PollScheduler().start()
 
 
 async def startup():
+    boot_timer.add("import", boot_timer.since_start() - sum(boot_timer.phases.values()))
+    start = ticks_us()
     mqtt_as_config = load_store(str(MQTT_AS_CONFIG_PATH))
     for key, val in mqtt_as_config.items():
         config[key] = val
     mqtt_client = MQTTClient(config)
     async def _on_connect():  # don't want to think about async lambda syntax atm
         await devices.on_mqtt_connect(mqtt_client)
+        asyncio.create_task(_drain_offline_queues(mqtt_client))
     sniffs.on_connect = _on_connect
+    devices.store.background = True  # the journal store compacts in a task from now on
     await sniffs.bind(mqtt_client)
     await sniffs.client.connect()
-    set_rtc()
+    boot_timer.add("mqtt_connect", ticks_diff(ticks_us(), start))
+    metrics.start(mqtt_client)
+    loop_monitor.start()
+    ntp_client.start()  # in the background; the RTC is set once the first reply arrives
+    _start_poll_scheduler()
+
+
+def reset():
+    """Flush pending setting writes, then reset the board."""
+    from machine import reset as machine_reset
+
+    devices.flush()
+    machine_reset()
@@ -0,0 +1,36 @@
+from msf.utils.ticks import ticks_us, ticks_diff
+
+PHASES = ("import", "settings", "devices", "mqtt_connect")
+
+
+class BootTimer:
+    """Time spent in each boot phase, from the moment `msf` is first imported.
+
+    - `import`: everything before `startup()` that is not one of the phases below (module imports, user code).
+    - `settings`: resolving default and user settings.
+    - `devices`: constructing every `Device`, including loading their saved state.
+    - `mqtt_connect`: connecting in `msf.startup.startup()`. The NTP sync that follows runs in the background.
+    """
+
+    def __init__(self):
+        self.start = ticks_us()
+        self.phases = {}  # phase -> microseconds
+
+    def since_start(self) -> int:
+        return ticks_diff(ticks_us(), self.start)
+
+    def add(self, phase: str, elapsed_us: int):
+        self.phases[phase] = self.phases.get(phase, 0) + elapsed_us
+
+    def report(self) -> list:
+        """`(phase, milliseconds)` in boot order, followed by `("total", milliseconds)`."""
+        report = [(phase, self.phases[phase] / 1000) for phase in PHASES if phase in self.phases]
+        report.append(("total", sum(self.phases.values()) / 1000))
+        return report
+
+    def print_report(self):
+        for phase, elapsed_ms in self.report():
+            print(f"{phase:>12}: {elapsed_ms:9.1f} ms")
+
+
+boot_timer = BootTimer()
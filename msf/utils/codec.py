@@ -0,0 +1,162 @@
+import json
+import struct
+
+_TEXT_WIDTH = 12  # an 11-digit int and its sign
+_TEXT_INT_LIMIT = 10 ** (_TEXT_WIDTH - 1)
+
+
+class TextEncoder:
+    """Reusable payload buffer for the text format, for one sensor.
+
+    Ints are formatted digit by digit into a preallocated buffer and returned as one of a set of precomputed
+    memoryviews of it, so encoding them allocates nothing. Other values fall back to `str(value)`.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray(_TEXT_WIDTH)
+        view = memoryview(self.buffer)
+        self._views = [view[_TEXT_WIDTH - length:] for length in range(_TEXT_WIDTH + 1)]
+
+    def encode(self, value):
+        if type(value) is not int or not -_TEXT_INT_LIMIT < value < _TEXT_INT_LIMIT:
+            return str(value)
+        buffer = self.buffer
+        position = _TEXT_WIDTH
+        negative = value < 0
+        if negative:
+            value = -value
+        while True:
+            position -= 1
+            buffer[position] = 48 + value % 10  # ASCII digit
+            value //= 10
+            if not value:
+                break
+        if negative:
+            position -= 1
+            buffer[position] = 45  # "-"
+        return self._views[_TEXT_WIDTH - position]
+
+
+class TextCodec:
+    """The default wire format: `str(value)` out, the received message as-is in."""
+    name = "text"
+
+    def encode(self, value):
+        return str(value)
+
+    def decode(self, message):
+        return message
+
+    def encoder(self) -> TextEncoder:
+        return TextEncoder()
+
+
+class StructEncoder:
+    """Reusable payload buffer for a `StructCodec`, for one sensor: values are packed into it in place."""
+
+    def __init__(self, codec):
+        self.fmt = codec.fmt
+        self.buffer = bytearray(codec.size)
+
+    def encode(self, value) -> bytearray:
+        struct.pack_into(self.fmt, self.buffer, 0, value)
+        return self.buffer
+
+
+class StructCodec:
+    """Fixed-size little-endian binary encoding of a single int or float, built on `struct`.
+
+    Binary payloads need the receiving `Sniffs` to deliver the raw message bytes. Messages that arrive as `str` are
+    read as text and converted with `type`, so a value set from the CLI in the text format is still understood.
+    """
+
+    def __init__(self, name: str, fmt: str, value_type: type):
+        self.name = name
+        self.fmt = "<" + fmt
+        self.size = struct.calcsize(self.fmt)
+        self.type = value_type
+        self._sign_bit = 1 << (8 * self.size - 1) if fmt in "bhiq" else 0
+
+    def encode(self, value) -> bytes:
+        return struct.pack(self.fmt, value)
+
+    def encoder(self) -> StructEncoder:
+        return StructEncoder(self)
+
+    def decode(self, message):  # -> int | float
+        if isinstance(message, str):
+            return self.type(message)
+        if len(message) != self.size:
+            raise ValueError(f"Expected {self.size} bytes for {self.name}, got {len(message)}.")
+        if self.type is int:  # read in place, without the tuple struct.unpack returns
+            value = int.from_bytes(message, "little")
+            if value & self._sign_bit:
+                value -= self._sign_bit << 1
+            return value
+        return struct.unpack(self.fmt, message)[0]
+
+
+class Summary:
+    """Statistics of the samples in one window of a `LocalSensor` (see `msf.sensor.Window`).
+
+    `float(summary)` is the mean, so a summary can stand in for a number, e.g. in a sensor's `history`.
+    """
+    __slots__ = ("count", "mean", "min", "max", "last")
+
+    def __init__(self, count: int, mean: float, min, max, last):
+        self.count = count
+        self.mean = mean
+        self.min = min
+        self.max = max
+        self.last = last
+
+    def __float__(self) -> float:
+        return float(self.mean)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Summary) and (self.count, self.mean, self.min, self.max, self.last) == (
+            other.count, other.mean, other.min, other.max, other.last
+        )
+
+    def __repr__(self):
+        return f"Summary(count={self.count}, mean={self.mean}, min={self.min}, max={self.max}, last={self.last})"
+
+
+class SummaryCodec:
+    """`Summary` values as JSON text: `{"count": ..., "mean": ..., "min": ..., "max": ..., "last": ...}`."""
+    name = "summary"
+
+    def encode(self, summary: Summary) -> str:
+        return json.dumps(
+            {"count": summary.count, "mean": summary.mean, "min": summary.min, "max": summary.max, "last": summary.last}
+        )
+
+    def decode(self, message) -> Summary:
+        fields = json.loads(message)  # ValueError when malformed
+        try:
+            return Summary(fields["count"], fields["mean"], fields["min"], fields["max"], fields["last"])
+        except (KeyError, TypeError):
+            raise ValueError(f"Not a summary: {message}")
+
+
+TEXT = TextCodec()
+SUMMARY = SummaryCodec()
+INT8 = StructCodec("int8", "b", int)
+UINT8 = StructCodec("uint8", "B", int)
+INT16 = StructCodec("int16", "h", int)
+UINT16 = StructCodec("uint16", "H", int)
+INT32 = StructCodec("int32", "i", int)
+UINT32 = StructCodec("uint32", "I", int)
+FLOAT32 = StructCodec("float32", "f", float)
+FLOAT64 = StructCodec("float64", "d", float)
+
+_topic_codecs = {}
+
+
+def set_topic_codec(topic: str, codec):
+    """Use `codec` for every sensor on `topic` that is created afterwards without an explicit codec."""
+    _topic_codecs[topic] = codec
+
+
+def get_topic_codec(topic: str):
+    return _topic_codecs.get(topic, TEXT)
@@ -0,0 +1,132 @@
+import asyncio
+
+from msf.utils.singleton import singleton
+from msf.utils.ticks import ticks_us, ticks_diff
+from msf.utils.metrics import metrics
+from msf.utils.loop_monitor import loop_monitor
+from msf import CALLBACK_QUEUE_SIZE, CALLBACK_CONCURRENCY
+
+
+class CallbackStats:
+    """Call count and runtime of one subscriber. Async runtimes are wall time, including time spent suspended."""
+
+    def __init__(self, func):
+        self.func = func
+        self.name = getattr(func, "__name__", "callback")
+        self.calls = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.active = False  # a call is running in the CallbackQueue
+
+    def record(self, elapsed_us: int):
+        self.calls += 1
+        self.total_us += elapsed_us
+        if elapsed_us > self.max_us:
+            self.max_us = elapsed_us
+        if metrics.enabled:
+            metrics.observe("callback_us", elapsed_us)
+
+    @property
+    def mean_us(self) -> float:
+        return self.total_us / self.calls if self.calls else 0
+
+    def __repr__(self):
+        return f"CallbackStats(name={self.name}, calls={self.calls}, mean_us={self.mean_us}, max_us={self.max_us})"
+
+
+class Subscribers:
+    """The `on_update` callbacks of one setting or sensor.
+
+    Plain functions run inline, in subscription order. Coroutine functions are handed to the `CallbackQueue` and run
+    as background tasks, so a slow handler cannot hold up the MQTT receive path or other subscribers.
+    """
+
+    def __init__(self):
+        self._stats = []
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def add(self, func):
+        self._stats.append(CallbackStats(func))
+
+    def remove(self, func):
+        self._stats = [stats for stats in self._stats if stats.func is not func]
+
+    def notify(self, value):
+        for stats in self._stats:
+            start = ticks_us()
+            result = stats.func(value)
+            if hasattr(result, "send"):  # a coroutine, timed by the queue when it runs
+                CallbackQueue().put(result, stats)
+            else:
+                elapsed = ticks_diff(ticks_us(), start)
+                stats.record(elapsed)
+                if loop_monitor.enabled:
+                    loop_monitor.section(stats.name, elapsed)
+
+    def stats(self) -> list:
+        return list(self._stats)
+
+
+@singleton
+class CallbackQueue:
+    """Runs async callbacks as background tasks, at most `concurrency` at a time.
+
+    Each callback gets its own task, so a slow one holds up only later calls of the same subscriber, which wait for it
+    to keep that subscriber's calls in order. Callbacks that cannot start yet wait in a queue of `size`; when it is
+    full the oldest waiting callback is dropped, and counted in `dropped`.
+    """
+
+    def __init__(self, size: int = CALLBACK_QUEUE_SIZE, concurrency: int = CALLBACK_CONCURRENCY):
+        self.size = size
+        self.concurrency = concurrency
+        self.dropped = 0
+        self.errors = 0
+        self.running = 0
+        self._pending = []  # (coro, stats), oldest first
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, coro, stats: CallbackStats):
+        if len(self._pending) >= self.size:
+            dropped, _ = self._pending.pop(0)
+            dropped.close()
+            self.dropped += 1
+        self._pending.append((coro, stats))
+        self._start_ready()
+
+    def _start_ready(self):
+        index = 0
+        while index < len(self._pending) and self.running < self.concurrency:
+            coro, stats = self._pending[index]
+            if stats.active:  # the subscriber's previous call is still running
+                index += 1
+                continue
+            del self._pending[index]
+            stats.active = True
+            self.running += 1
+            asyncio.create_task(self._run(coro, stats))
+
+    async def _run(self, coro, stats: CallbackStats):
+        if loop_monitor.enabled:
+            loop_monitor.running = stats.name
+        start = ticks_us()
+        try:
+            await coro
+        except Exception as exception:
+            self.errors += 1
+            print(exception)  # don't let one callback stop the others
+        finally:
+            if loop_monitor.running == stats.name:
+                loop_monitor.running = None
+            stats.active = False
+            self.running -= 1
+            stats.record(ticks_diff(ticks_us(), start))
+            self._start_ready()
+
+    async def drain(self):
+        """Wait until every queued callback has run."""
+        while self._pending or self.running:
+            await asyncio.sleep(0)
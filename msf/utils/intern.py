@@ -0,0 +1,9 @@
+try:
+    from sys import intern
+except ImportError:
+    # MicroPython only interns identifiers and literals; built strings get a table of their own.
+    _interned = {}
+
+    def intern(string: str) -> str:
+        """The one shared instance of `string`, so equal topics built in different places are stored once."""
+        return _interned.setdefault(string, string)
@@ -0,0 +1,118 @@
+import asyncio
+
+from msf.utils.ticks import ticks_us, ticks_diff
+from msf.utils.metrics import Histogram, metrics
+from msf import LOOP_MONITOR_INTERVAL_MS, LOOP_MONITOR_STALL_MS
+
+
+class LoopMonitor:
+    """Measures event-loop lag and names the code that stalled the loop.
+
+    A ticker task sleeps `interval_ms` at a time; how late it wakes up is the lag, the time the loop spent running
+    something else without yielding. Lags of at least `stall_ms` are stalls: they are counted, printed, and attributed
+    to the first instrumented section that ran at least `stall_ms` since the previous tick (the innermost one, when
+    sections nest), or else to the section still running when the ticker woke up. Sections are route handlers,
+    `on_update` callbacks and settings file writes; a stall nothing instrumented accounts for is `"unknown"`.
+
+    Off unless `LOOP_MONITOR_INTERVAL_MS` is set; instrumented code checks `loop_monitor.enabled` first. With metrics
+    on, lags go to the `loop_lag_us` histogram and stalls to the `loop_stalls` counter.
+    """
+
+    def __init__(self, interval_ms: int = LOOP_MONITOR_INTERVAL_MS, stall_ms: int = LOOP_MONITOR_STALL_MS):
+        self.interval_ms = interval_ms
+        self.stall_us = stall_ms * 1000
+        self.enabled = interval_ms > 0
+        self.running = None  # name of the instrumented section in progress, if any
+        self._task = None
+        self.reset()
+
+    def reset(self):
+        self.lag = Histogram()
+        self.stalls = 0
+        self.culprits = {}  # name -> [stalls, worst lag in us]
+        self.last_stall = None  # (name, lag in us)
+        self._suspect = None  # first section since the last tick that ran for at least stall_us
+
+    def section(self, name: str, elapsed_us: int):
+        """Report that section `name` ran for `elapsed_us` without yielding."""
+        if elapsed_us >= self.stall_us and self._suspect is None:
+            self._suspect = name
+
+    def watch(self, name: str):
+        """Decorator for async route handlers: mark the handler as running while it runs, and report its duration.
+
+        Handlers decorated while the monitor is off are returned as they are, so they cost nothing. The duration is
+        wall time, so only handlers that do not await in between are measured exactly.
+        """
+        def decorator(handler):
+            if not self.enabled:
+                return handler
+
+            async def watched(*args):
+                previous = self.running
+                self.running = name
+                start = ticks_us()
+                try:
+                    return await handler(*args)
+                finally:
+                    self.running = previous
+                    self.section(name, ticks_diff(ticks_us(), start))
+
+            return watched
+
+        return decorator
+
+    def tick(self, lag_us: int):
+        """Record one measured lag, attributing it if it is a stall."""
+        if lag_us < 0:
+            lag_us = 0
+        self.lag.observe(lag_us)
+        if metrics.enabled:
+            metrics.observe("loop_lag_us", lag_us)
+        if lag_us >= self.stall_us:
+            name = self._suspect or self.running or "unknown"
+            self.stalls += 1
+            culprit = self.culprits.get(name)
+            if culprit is None:
+                culprit = self.culprits[name] = [0, 0]
+            culprit[0] += 1
+            if lag_us > culprit[1]:
+                culprit[1] = lag_us
+            self.last_stall = (name, lag_us)
+            if metrics.enabled:
+                metrics.increment("loop_stalls")
+            print(f"Event loop stalled for {lag_us // 1000} ms by {name}.")
+        self._suspect = None
+
+    def start(self):
+        """Run the ticker while enabled. `msf.startup` calls this."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        interval_us = self.interval_ms * 1000
+        try:
+            while self.enabled:
+                start = ticks_us()
+                await asyncio.sleep(self.interval_ms / 1000)
+                self.tick(ticks_diff(ticks_us(), start) - interval_us)
+        finally:
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "ticks": self.lag.count,
+            "mean_lag_us": self.lag.total_us // self.lag.count if self.lag.count else 0,
+            "max_lag_us": self.lag.max_us,
+            "p50_lag_us": self.lag.percentile(50),
+            "p95_lag_us": self.lag.percentile(95),
+            "p99_lag_us": self.lag.percentile(99),
+            "stalls": self.stalls,
+            "culprits": {
+                name: {"stalls": stalls, "max_lag_us": worst} for name, (stalls, worst) in self.culprits.items()
+            },
+            "last_stall": self.last_stall,
+        }
+
+
+loop_monitor = LoopMonitor()
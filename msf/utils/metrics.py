@@ -0,0 +1,143 @@
+import asyncio
+import gc
+import json
+
+from msf.utils.ticks import ticks_ms, ticks_diff
+from msf import METRICS_INTERVAL_MS, METRICS_NODE_NAME, MQTT_DEVICES_TOPIC
+
+LATENCY_BUCKETS_US = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+
+class Histogram:
+    """Counts of observed microsecond latencies per `LATENCY_BUCKETS_US` bucket, plus one bucket for anything slower."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def observe(self, elapsed_us: int):
+        index = 0
+        for bound in LATENCY_BUCKETS_US:
+            if elapsed_us <= bound:
+                break
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_us += elapsed_us
+        if elapsed_us > self.max_us:
+            self.max_us = elapsed_us
+
+    def percentile(self, percent: float) -> int:
+        """Upper bound of the bucket holding the `percent`th percentile; `max_us` when that is the overflow bucket."""
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bound in enumerate(LATENCY_BUCKETS_US):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(bound, self.max_us)
+        return self.max_us
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_us": self.total_us // self.count if self.count else 0,
+            "max_us": self.max_us,
+            "p95_us": self.percentile(95),
+            "p99_us": self.percentile(99),
+            "buckets": self.buckets,
+        }
+
+
+def _node_name() -> str:
+    if METRICS_NODE_NAME:
+        return METRICS_NODE_NAME
+    try:
+        from binascii import hexlify
+        from machine import unique_id
+
+        return hexlify(unique_id()).decode()
+    except ImportError:
+        return "node"
+
+
+class Metrics:
+    """Counters and latency histograms of one node, published as JSON to `MQTT_DEVICES_TOPIC/_metrics/<node>`.
+
+    - `received`/`published`: messages per sensor name, or per `device/setting`.
+    - `counters`: other counts, e.g. `store_writes` and `errors`.
+    - `histograms`: `dispatch_us` (handling a received sensor value, inline callbacks included), `callback_us` (each
+      `on_update` callback) and `store_write_us` (each settings file write).
+
+    Collection is off unless `METRICS_INTERVAL_MS` is set; instrumented code checks `metrics.enabled` first, so the
+    disabled cost is an attribute lookup. Values are cumulative since boot.
+    """
+
+    def __init__(self, interval_ms: int = METRICS_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self.enabled = interval_ms > 0
+        self.started_ms = ticks_ms()
+        self.published_count = 0
+        self._task = None
+        self.reset()
+
+    def reset(self):
+        self.received = {}
+        self.published = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def count_received(self, name: str):
+        self.received[name] = self.received.get(name, 0) + 1
+
+    def count_published(self, name: str):
+        self.published[name] = self.published.get(name, 0) + 1
+
+    def increment(self, counter: str, amount: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def observe(self, histogram: str, elapsed_us: int):
+        if histogram not in self.histograms:
+            self.histograms[histogram] = Histogram()
+        self.histograms[histogram].observe(elapsed_us)
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            "uptime_ms": ticks_diff(ticks_ms(), self.started_ms),
+            "received": self.received,
+            "published": self.published,
+            "counters": self.counters,
+            "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            "buckets_us": LATENCY_BUCKETS_US,
+        }
+        if hasattr(gc, "mem_free"):  # MicroPython
+            gc.collect()
+            snapshot["mem_free"] = gc.mem_free()
+            snapshot["mem_alloc"] = gc.mem_alloc()
+        return snapshot
+
+    @property
+    def topic(self) -> str:
+        return MQTT_DEVICES_TOPIC + "/_metrics/" + _node_name()
+
+    def start(self, client):
+        """Publish a snapshot every `interval_ms` while enabled. `msf.startup` calls this once connected."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._publish_every_interval(client))
+
+    async def _publish_every_interval(self, client):
+        topic = self.topic
+        try:
+            while self.enabled:
+                await asyncio.sleep(self.interval_ms / 1000)
+                if client.isconnected():
+                    await client.publish(topic, json.dumps(self.snapshot()))
+                    self.published_count += 1
+        finally:
+            self._task = None
+
+
+metrics = Metrics()
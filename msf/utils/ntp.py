@@ -0,0 +1,244 @@
+import asyncio
+import socket
+import struct
+
+from msf.utils.ticks import ticks_ms, ticks_diff, time_ms as rtc_time_ms
+from msf.utils.metrics import metrics
+from msf import NTP_SERVERS, NTP_OFFSET_S, NTP_TIMEOUT_MS, NTP_RESYNC_INTERVAL_MS, NTP_RETRY_MAX_MS
+
+NTP_PORT = 123
+NTP_UNIX_DELTA_S = 2208988800  # 1900-01-01 to 1970-01-01
+MICROPYTHON_EPOCH_S = 946684800  # 1970-01-01 to 2000-01-01, the epoch of some MicroPython ports
+RETRY_MIN_MS = 1000
+POLL_INTERVAL_MS = 10  # how often a pending reply is checked for
+DRIFT_MIN_INTERVAL_MS = 60 * 1000  # shorter intervals are dominated by network jitter
+DRIFT_MAX_PPM = 500
+
+
+class NtpError(Exception):
+    ...
+
+
+def ntp_request(transmit: int) -> bytearray:
+    """An SNTP v3 client request. `transmit` goes in the transmit timestamp, which the server echoes back."""
+    request = bytearray(48)
+    request[0] = 0x1B  # LI 0, version 3, mode 3 (client)
+    struct.pack_into("!II", request, 40, transmit >> 32, transmit & 0xFFFFFFFF)
+    return request
+
+
+def parse_ntp_reply(reply, transmit: int) -> tuple:
+    """`(receive, transmit)` server timestamps of a reply to `ntp_request(transmit)`, as Unix epoch milliseconds."""
+    if len(reply) < 48:
+        raise NtpError("Short NTP reply.")
+    if reply[0] & 0x07 != 4:
+        raise NtpError("Not an NTP server reply.")
+    if reply[1] == 0:
+        raise NtpError("NTP server sent a kiss-of-death reply.")
+    originate_s, originate_f = struct.unpack_from("!II", reply, 24)
+    if (originate_s << 32 | originate_f) != transmit:
+        raise NtpError("NTP reply does not match the request.")
+    receive_s, receive_f, transmit_s, transmit_f = struct.unpack_from("!IIII", reply, 32)
+    if not transmit_s:
+        raise NtpError("NTP reply has no transmit timestamp.")
+    return _unix_ms(receive_s, receive_f), _unix_ms(transmit_s, transmit_f)
+
+
+def _unix_ms(seconds: int, fraction: int) -> int:
+    return (seconds - NTP_UNIX_DELTA_S) * 1000 + (fraction * 1000 >> 32)
+
+
+def _resolve(host: str, port: int):
+    addresses = socket.getaddrinfo(host, port)
+    for address in addresses:
+        if address[0] == socket.AF_INET:
+            return address[-1]
+    return addresses[0][-1]
+
+
+class WallClock:
+    """Wall-clock (Unix epoch) milliseconds from `ticks_ms()` and the last NTP sync.
+
+    Reading the time is an addition and a multiplication. Between syncs the time advances with `ticks_ms()`, corrected
+    by `drift_ppm`, the rate error of the local clock measured across syncs. Until the first sync it falls back to the
+    RTC, converted to UTC Unix time on the assumption that it is kept at UTC plus `rtc_offset_s`, as `NtpClient` sets
+    it (see `rtc_unix_ms`); `rtc` replaces that fallback. An RTC that was never set reads as early 2000 (or 1970), so
+    times before the first sync are only as good as the RTC; check `synced` where that matters.
+    """
+
+    def __init__(self, rtc_offset_s: int = NTP_OFFSET_S, rtc=None):
+        self.rtc_offset_s = rtc_offset_s
+        self.rtc = rtc  # () -> UTC Unix ms, or None for rtc_unix_ms
+        self.synced = False
+        self.drift_ppm = 0.0
+        self.last_error_ms = 0  # how far off the clock was at the last sync
+        self._base_ticks = 0
+        self._base_ms = 0
+        self._rate = 1.0
+
+    def time_ms(self, now_ticks: int = None) -> int:
+        if not self.synced:
+            return self.rtc() if self.rtc is not None else rtc_unix_ms(self.rtc_offset_s)
+        if now_ticks is None:
+            now_ticks = ticks_ms()
+        return self._base_ms + int(ticks_diff(now_ticks, self._base_ticks) * self._rate)
+
+    def set(self, wall_ms: int, at_ticks: int):
+        """Record that it was `wall_ms` at `at_ticks`, and update the drift estimate from the previous sync."""
+        if self.synced:
+            self.last_error_ms = wall_ms - self.time_ms(at_ticks)
+            elapsed = ticks_diff(at_ticks, self._base_ticks)
+            if elapsed >= DRIFT_MIN_INTERVAL_MS:
+                drift_ppm = self.drift_ppm + self.last_error_ms * 1_000_000 / elapsed
+                self.drift_ppm = max(-DRIFT_MAX_PPM, min(DRIFT_MAX_PPM, drift_ppm))
+                self._rate = 1 + self.drift_ppm / 1_000_000
+        self._base_ms = wall_ms
+        self._base_ticks = at_ticks
+        self.synced = True
+
+
+class NtpClient:
+    """Keeps a `WallClock` (and the RTC) in sync with NTP, without blocking the event loop.
+
+    `start()` runs `sync()` in a background task: servers are tried in order, a failed round is retried after
+    1 s, doubling up to `retry_max_ms`, and a successful one is repeated every `resync_interval_ms`. Replies are
+    awaited on a non-blocking socket. Server names are resolved once and cached, since `getaddrinfo` blocks; use IP
+    addresses to avoid the DNS lookup altogether.
+
+    With `update_rtc`, the RTC is set to UTC plus `offset_s` after every sync; `clock` always keeps UTC.
+    """
+
+    def __init__(
+        self,
+        servers=NTP_SERVERS,
+        offset_s: int = NTP_OFFSET_S,
+        timeout_ms: int = NTP_TIMEOUT_MS,
+        resync_interval_ms: int = NTP_RESYNC_INTERVAL_MS,
+        retry_max_ms: int = NTP_RETRY_MAX_MS,
+        port: int = NTP_PORT,
+        clock: WallClock = None,
+        update_rtc: bool = True,
+    ):
+        self.servers = servers
+        self.offset_s = offset_s
+        self.timeout_ms = timeout_ms
+        self.resync_interval_ms = resync_interval_ms
+        self.retry_max_ms = retry_max_ms
+        self.port = port
+        self.clock = clock or WallClock()
+        self.update_rtc = update_rtc
+        self.syncs = 0
+        self.failures = 0
+        self.last_delay_ms = 0  # network round trip of the last sync
+        self._addresses = {}
+        self._task = None
+
+    async def query(self, server: str) -> tuple:
+        """One NTP exchange with `server`: `(wall ms, ticks)` of the moment the reply arrived."""
+        address = self._addresses.get(server)
+        if address is None:
+            address = self._addresses[server] = _resolve(server, self.port)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sent_ticks = ticks_ms()
+            transmit = sent_ticks & 0xFFFFFFFF  # any value the server will echo; need not be a time
+            sock.sendto(ntp_request(transmit), address)
+            while True:
+                try:
+                    reply = sock.recv(48)
+                    break
+                except OSError:  # nothing received yet
+                    if ticks_diff(ticks_ms(), sent_ticks) >= self.timeout_ms:
+                        raise NtpError(f"No NTP reply from {server} within {self.timeout_ms} ms.")
+                    await asyncio.sleep(POLL_INTERVAL_MS / 1000)
+            received_ticks = ticks_ms()
+        finally:
+            sock.close()
+
+        server_receive_ms, server_transmit_ms = parse_ntp_reply(reply, transmit)
+        delay_ms = ticks_diff(received_ticks, sent_ticks) - (server_transmit_ms - server_receive_ms)
+        self.last_delay_ms = max(0, delay_ms)
+        return server_transmit_ms + self.last_delay_ms // 2, received_ticks
+
+    async def sync(self) -> bool:
+        """Sync from the first server that answers. Failures are printed and counted, not raised."""
+        for server in self.servers:
+            try:
+                wall_ms, at_ticks = await self.query(server)
+            except (OSError, NtpError) as exception:
+                print(exception)
+                self._addresses.pop(server, None)  # resolve again next time, in case the address changed
+                continue
+            self.clock.set(wall_ms, at_ticks)
+            self.syncs += 1
+            if self.update_rtc:
+                set_rtc_from_unix_ms(self.clock.time_ms() + self.offset_s * 1000)
+            return True
+        self.failures += 1
+        if metrics.enabled:
+            metrics.increment("ntp_failures")
+        return False
+
+    def start(self):
+        """Sync in the background from now on. `msf.startup` calls this once connected."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        retry_ms = RETRY_MIN_MS
+        try:
+            while True:
+                if await self.sync():
+                    retry_ms = RETRY_MIN_MS
+                    await asyncio.sleep(self.resync_interval_ms / 1000)
+                else:
+                    await asyncio.sleep(retry_ms / 1000)
+                    retry_ms = min(retry_ms * 2, self.retry_max_ms)
+        finally:
+            self._task = None
+
+
+def _has_rtc() -> bool:
+    try:
+        import machine
+    except ImportError:  # CPython
+        return False
+    return hasattr(machine, "RTC")  # not on the unix port
+
+
+def set_rtc_from_unix_ms(unix_ms: int):
+    """Set the RTC, if there is one, to a Unix epoch time in milliseconds."""
+    if not _has_rtc():
+        return
+    import time
+    from machine import RTC
+
+    seconds = unix_ms // 1000
+    if time.gmtime(0)[0] == 2000:  # ports with the MicroPython epoch
+        seconds -= MICROPYTHON_EPOCH_S
+    tm = time.gmtime(seconds)
+    RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+
+def rtc_to_unix_ms(rtc_ms: int, offset_s: int, epoch_year: int) -> int:
+    """UTC Unix epoch milliseconds from a `time.time()` reading in ms of an RTC kept at UTC plus `offset_s`, on a port
+    whose epoch starts in `epoch_year`: the inverse of `set_rtc_from_unix_ms(unix_ms + offset_s * 1000)`."""
+    unix_ms = rtc_ms - offset_s * 1000
+    if epoch_year == 2000:  # ports with the MicroPython epoch
+        unix_ms += MICROPYTHON_EPOCH_S * 1000
+    return unix_ms
+
+
+def rtc_unix_ms(offset_s: int = NTP_OFFSET_S) -> int:
+    """The RTC as UTC Unix epoch milliseconds. Without a `machine.RTC` (CPython, the unix port) the system clock is
+    UTC already and is returned as it is."""
+    import time
+
+    if not _has_rtc():
+        return rtc_time_ms()
+    return rtc_to_unix_ms(rtc_time_ms(), offset_s, time.gmtime(0)[0])
+
+
+wall_clock = WallClock()
+ntp_client = NtpClient(clock=wall_clock)
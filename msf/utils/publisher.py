@@ -0,0 +1,18 @@
+import asyncio
+
+
+async def publish_bounded(client, messages, concurrency: int, on_published=None):
+    """Publish `(topic, payload, retain)` messages with at most `concurrency` publishes in flight.
+
+    `messages` may be a generator; it is consumed as publishes complete, so only `concurrency` coroutines and
+    payloads exist at a time. `on_published(topic, payload)` is called after each successful publish.
+    """
+    iterator = iter(messages)
+
+    async def worker():
+        for topic, payload, retain in iterator:
+            await client.publish(topic, payload, retain=retain)
+            if on_published is not None:
+                on_published(topic, payload)
+
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
@@ -1,23 +1,29 @@
-from machine import RTC
-import time
 import socket
-import struct
+
+from msf.utils.ticks import ticks_us, ticks_diff
+from msf.utils.loop_monitor import loop_monitor
+from msf.utils.ntp import NTP_PORT, ntp_request, parse_ntp_reply, set_rtc_from_unix_ms, _resolve
+from msf import NTP_SERVERS, NTP_OFFSET_S, NTP_TIMEOUT_MS
+
 
 def set_rtc():
-    host = "pool.ntp.org"
-    ntp_delta = 2208988800 + 4 * 60 * 60
-    ntp_query = bytearray(48)
-    ntp_query[0] = 0x1B
-    addr = socket.getaddrinfo(host, 123)[0][-1]
+    """Set the RTC from the first of `NTP_SERVERS`, blocking until the reply arrives or `NTP_TIMEOUT_MS` passes.
+
+    Kept for scripts without an event loop; `msf.startup` uses `msf.utils.ntp.ntp_client` instead, which does not
+    block and retries on failure.
+    """
+    start = ticks_us()
+    address = _resolve(NTP_SERVERS[0], NTP_PORT)
+    transmit = 1  # echoed back by the server
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        s.settimeout(1)
-        res = s.sendto(ntp_query, addr)
+        s.settimeout(NTP_TIMEOUT_MS / 1000)
+        s.sendto(ntp_request(transmit), address)
         msg = s.recv(48)
     finally:
         s.close()
+        if loop_monitor.enabled:
+            loop_monitor.section("set_rtc", ticks_diff(ticks_us(), start))
 
-    val = struct.unpack("!I", msg[40:44])[0]
-    t = val - ntp_delta
-    tm = time.gmtime(t)
-    RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
\ No newline at end of file
+    _, server_transmit_ms = parse_ntp_reply(msg, transmit)
+    set_rtc_from_unix_ms(server_transmit_ms + NTP_OFFSET_S * 1000)
@@ -5,23 +5,37 @@ class SingletonDNEError(Exception):
     ...
 
 
+_instances = {}  # class -> its instance, for every @singleton class
+
+
 def singleton(cls):
     """Singleton decorator for classes. Use this instead of globals where possible."""
-    instance = None
 
     def getinstance(*args, **kwargs):
-        nonlocal instance
+        instance = _instances.get(cls)
         if instance is None:
-            instance = cls(*args, **kwargs)
+            instance = _instances[cls] = cls(*args, **kwargs)
         return instance
 
     return getinstance
 
 
+def swap_singletons(instances):
+    """Replace the mapping of classes to singleton instances and return the previous one.
+
+    Anything with `get` and item assignment will do. Instances missing from the new mapping are created on first use,
+    so a load test can give each simulated node its own registries and `Sniffs` by swapping in a mapping per node.
+    """
+    global _instances
+    previous = _instances
+    _instances = instances
+    return previous
+
+
 @singleton
 class SniffsSingleton(Sniffs):
     ...
 
 
 def get_sniffs() -> SniffsSingleton:
-    return SniffsSingleton()
\ No newline at end of file
+    return SniffsSingleton()
@@ -0,0 +1,49 @@
+import os
+
+import msf
+
+SNAPSHOT_MODULE = "msf_settings_snapshot"
+
+_LITERAL_TYPES = (str, int, float, bool, type(None), tuple, list, dict)
+
+
+def source_stamp(path: str):  # -> (size, mtime) | None
+    """Identifies a version of a settings file, so a stale snapshot is not used."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat[6], stat[8]
+
+
+def settings_stamp(user_settings_path: str, defaults_path: str) -> tuple:
+    """Stamps of the user's `settings.py` and of `msf/settings.py` (or its compiled `.mpy`), which a snapshot must
+    match: changing either file, e.g. upgrading msf, makes the snapshot stale."""
+    defaults = source_stamp(defaults_path + ".py") or source_stamp(defaults_path + ".mpy")
+    return source_stamp(user_settings_path), defaults
+
+
+def write_settings_snapshot(path: str = ""):
+    """Write the current, merged settings (defaults plus user overrides) as a module of literals.
+
+    On the next boot `msf` imports it instead of merging `msf.settings` with the user's `settings.py`, as long as
+    neither has changed since. It is written next to `settings.py` unless `path` is given; it can be compiled
+    with `mpy-cross` like any other module.
+    """
+    if not path:
+        path = msf.user_settings_path[: -len("settings.py")] + SNAPSHOT_MODULE + ".py"
+    lines = [
+        "# Generated by msf.utils.snapshot.write_settings_snapshot(). Regenerate it after changing settings.py.",
+        "_SOURCE = " + repr(settings_stamp(msf.user_settings_path, msf.default_settings_path)),
+    ]
+    settings = msf.__dict__
+    for name in sorted(settings):
+        if not name.isupper():
+            continue
+        value = settings[name]
+        if not isinstance(value, _LITERAL_TYPES):
+            value = str(value)  # e.g. pathlib paths; msf only uses settings paths as strings
+        lines.append(name + " = " + repr(value))
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    return path
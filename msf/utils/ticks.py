@@ -0,0 +1,24 @@
+try:
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add
+except ImportError:
+    # CPython (benchmarks, load tests): monotonic clocks without wraparound.
+    from time import monotonic_ns
+
+    def ticks_ms() -> int:
+        return monotonic_ns() // 1_000_000
+
+    def ticks_us() -> int:
+        return monotonic_ns() // 1_000
+
+    def ticks_diff(ticks1: int, ticks2: int) -> int:
+        return ticks1 - ticks2
+
+    def ticks_add(ticks: int, delta: int) -> int:
+        return ticks + delta
+
+
+def time_ms() -> int:
+    """Wall-clock milliseconds since the epoch, as accurate as the RTC."""
+    from time import time
+
+    return int(time() * 1000)
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import unittest
 import sys
 import os
@@ -6,7 +8,7 @@ sys.path.append(os.getcwd())
 
 from mpstore import load_store, write_store
 
-from msf import DEVICES_SETTINGS_PATH
+from msf import DEVICES_SETTINGS_PATH, MQTT_CONNECT_PUBLISH_CONCURRENCY, MQTT_DEVICES_TOPIC
 from msf.device import (
     DevicesRegistry,
     DeviceSettingsValidationError,
@@ -15,7 +17,23 @@ from msf.device import (
     InvalidDeviceNameException,
     DuplicateDeviceNameException,
     DuplicateDeviceSettingNameException,
+    SettingsStore,
 )
+from msf.utils.codec import FLOAT64, INT16
+
+
+class RecordingClient:
+    def __init__(self):
+        self.published = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        self.published.append((topic, msg, retain))
 
 
 class DeviceTests(unittest.TestCase):
@@ -190,6 +208,21 @@ class DeviceTests(unittest.TestCase):
 
         assert value_updated == 2.25, f"Expected: 2.25, Actual: {value_updated}"
 
+    def test_on_update_decorator__multiple_subscribers(self):
+        values = []
+
+        @self.duty_cycle.on_update()
+        def first(value):
+            values.append(value)
+
+        @self.duty_cycle.on_update()
+        def second(value):
+            values.append(value * 2)
+
+        self.registry.update_device_setting("water_pump", "duty_cycle", 1.5)
+
+        assert values == [1.5, 3.0], f"Expected: [1.5, 3.0], Actual: {values}"
+
     def test_saved_state_overrides_setting_value(self):
         # create the saved state manually
         write_store("unique_device", {
@@ -199,11 +232,264 @@ class DeviceTests(unittest.TestCase):
                 "description": "Another setting."
             }
         }, str(DEVICES_SETTINGS_PATH))
+        self.registry.store.reload()  # the settings file is only read once per boot
 
         another_setting = Setting("another_setting", 5, "Another setting.")
         assert another_setting.value == 5
         Device("unique_device", [another_setting])
         assert another_setting.value == 6
 
+    def test_store_loaded_once(self):
+        store = self.registry.store
+        data = store._data
+        Device("other_device", [Setting("other_setting", 1, "Other setting.")])
+        assert store._data is data  # served from memory, not re-read
+
+    def test_new_settings_written_in_one_commit(self):
+        write_store("batched_device", {}, str(DEVICES_SETTINGS_PATH))  # start from no saved state
+        writes = []
+        store = self.registry.store
+        store.reload()
+        _commit = store.commit
+
+        def commit():
+            writes.append(sorted(store._dirty))
+            _commit()
+
+        store.commit = commit
+        try:
+            Device("batched_device", [Setting(f"setting_{i}", i, "Batched setting.") for i in range(10)])
+        finally:
+            del store.commit
+        assert writes == [["batched_device"]], f"Expected: [['batched_device']], Actual: {writes}"
+        assert len(load_store(str(DEVICES_SETTINGS_PATH))["batched_device"]) == 10
+
+    def test_update_device_setting__write_behind(self):
+        commits = 0
+        store = self.registry.store
+        _commit = store.commit
+
+        def commit():
+            nonlocal commits
+            commits += 1
+            _commit()
+
+        async def burst():
+            for value in range(1, 6):
+                self.registry.update_device_setting("water_pump", "foo_setting", value)
+                assert self.foo_setting.value == value  # in-memory value is updated right away
+            assert commits == 0 and store.pending
+            await asyncio.sleep(0.1)
+
+        store.commit = commit
+        store.write_delay_ms = 20
+        try:
+            asyncio.run(burst())
+        finally:
+            del store.commit
+            store.write_delay_ms = 0
+        assert commits == 1, f"Expected: 1, Actual: {commits}"
+        assert load_store(str(DEVICES_SETTINGS_PATH))["water_pump"]["foo_setting"]["value"] == "5"
+
+    def test_flush__writes_pending_updates(self):
+        store = self.registry.store
+        store.write_delay_ms = 1000
+
+        async def update_and_flush():
+            self.registry.update_device_setting("water_pump", "foo_setting", 7)
+            assert store.pending
+            self.registry.flush()
+            assert not store.pending
+
+        try:
+            asyncio.run(update_and_flush())
+        finally:
+            store.write_delay_ms = 0
+        assert load_store(str(DEVICES_SETTINGS_PATH))["water_pump"]["foo_setting"]["value"] == "7"
+
+    def test_setting_codec__decodes_binary_update(self):
+        binary_setting = Setting("binary_setting", 1.5, "Binary setting.", codec=FLOAT64)
+        Device("binary_device", [binary_setting])
+        self.registry.update_device_setting("binary_device", "binary_setting", FLOAT64.encode(2.75))
+        assert binary_setting.value == 2.75, f"Expected: 2.75, Actual: {binary_setting.value}"
+        self.registry.update_device_setting("binary_device", "binary_setting", "3.5")
+        assert binary_setting.value == 3.5, f"Expected: 3.5, Actual: {binary_setting.value}"
+
+    def test_setting_codec__type_mismatch(self):
+        with self.assertRaises(DeviceSettingsValidationError):
+            Setting("binary_setting", 1.5, "Binary setting.", codec=INT16)
+
+    def test_on_mqtt_connect__bounded_and_incremental(self):
+        client = RecordingClient()
+        asyncio.run(self.registry.on_mqtt_connect(client))
+        assert len(client.published) == 9, f"Expected: 9, Actual: {len(client.published)}"
+        assert client.max_in_flight <= MQTT_CONNECT_PUBLISH_CONCURRENCY, f"Actual: {client.max_in_flight}"
+
+        client = RecordingClient()
+        asyncio.run(self.registry.on_mqtt_connect(client))
+        assert client.published == [], f"Expected: [], Actual: {client.published}"
+
+        self.registry.update_device_setting("water_pump", "foo_setting", self.foo_setting.value + 1)
+        asyncio.run(self.registry.on_mqtt_connect(client))
+        assert client.published == [
+            (f"{MQTT_DEVICES_TOPIC}/water_pump/foo_setting/value/reported", str(self.foo_setting.value), True)
+        ], f"Actual: {client.published}"
+
+    def test_device_construction_in_boot_report(self):
+        from msf.utils.boot import boot_timer
+
+        before = boot_timer.phases.get("devices", 0)
+        Device("timed_device", [Setting("timed_setting", 1, "Timed setting.")])
+        assert boot_timer.phases["devices"] > before
+        assert "devices" in dict(boot_timer.report())
+
+    def test_metrics__setting_updates_and_store_writes(self):
+        from msf.utils.metrics import metrics
+
+        metrics.enabled = True
+        try:
+            self.registry.update_device_setting("water_pump", "foo_setting", 7)
+            self.registry.update_device_setting("water_pump", "foo_setting", 8)
+            snapshot = metrics.snapshot()
+        finally:
+            metrics.enabled = False
+            metrics.reset()
+        assert snapshot["received"] == {"water_pump/foo_setting": 2}, f"Actual: {snapshot['received']}"
+        assert snapshot["counters"]["store_writes"] == 2, f"Actual: {snapshot['counters']}"
+        assert snapshot["histograms"]["store_write_us"]["count"] == 2
+
+    def test_update_device_settings__bulk_one_write(self):
+        commits = 0
+        store = self.registry.store
+        _commit = store.commit
+
+        def commit():
+            nonlocal commits
+            commits += 1
+            _commit()
+
+        updated = []
+        self.foo_setting.on_update()(updated.append)
+        self.duty_cycle.on_update()(updated.append)
+        store.commit = commit
+        try:
+            self.registry.update_device_settings("water_pump", b'{"foo_setting": 9, "duty_cycle": "0.5"}')
+        finally:
+            del store.commit
+        assert commits == 1, f"Expected: 1, Actual: {commits}"
+        assert updated == [9, 0.5], f"Actual: {updated}"
+        saved = load_store(str(DEVICES_SETTINGS_PATH))["water_pump"]
+        assert saved["foo_setting"]["value"] == "9" and saved["duty_cycle"]["value"] == "0.5", f"Actual: {saved}"
+
+        client = RecordingClient()
+        asyncio.run(self.registry.publish_reported_state(client, "water_pump"))
+        topic, payload, retain = client.published[0]
+        assert topic == f"{MQTT_DEVICES_TOPIC}/water_pump/_bulk/reported" and retain
+        assert json.loads(payload) == {"duty_cycle": 0.5, "foo_setting": 9, "bar_setting": "bar string"}
+
+    def test_update_device_settings__bulk_invalid_changes_nothing(self):
+        for message in ('{"foo_setting": 9, "duty_cycle": "not a number"}', '{"foo_setting": 9, "unknown": 1}', "[1]", "{"):
+            with self.assertRaises(DeviceSettingsValidationError):
+                self.registry.update_device_settings("water_pump", message)
+        assert self.foo_setting.value == 5
+        with self.assertRaises(KeyError):
+            self.registry.update_device_settings("unknown_device", "{}")
+
+    def test_update_device_settings__bulk_rejects_bool_and_fractions(self):
+        before = (self.foo_setting.value, self.duty_cycle.value)
+        for message in ('{"duty_cycle": 0.5, "foo_setting": true}', '{"duty_cycle": 0.5, "foo_setting": 2.7}',
+                        '{"bar_setting": false}', '{"bar_setting": {"a": 1}}'):
+            with self.assertRaises(DeviceSettingsValidationError):
+                self.registry.update_device_settings("water_pump", message)
+        self.registry.store.commit()
+        assert (self.foo_setting.value, self.duty_cycle.value) == before
+        saved = load_store(str(DEVICES_SETTINGS_PATH))["water_pump"]
+        assert (int(saved["foo_setting"]["value"]), float(saved["duty_cycle"]["value"])) == before, f"Actual: {saved}"
+
+        self.registry.update_device_settings("water_pump", '{"foo_setting": 2.0, "duty_cycle": 1}')
+        assert (self.foo_setting.value, self.duty_cycle.value) == (2, 1.0)
+
+    def test_merge_settings__path_settings_become_strings(self):
+        import msf
+
+        class Path:  # stands in for pathlib.Path, which is not installed with msf
+            def __init__(self, path):
+                self.path = path
+
+            def __str__(self):
+                return self.path
+
+        class UserSettings:  # a module as far as _merge is concerned
+            def __init__(self):
+                self.EXAMPLE_SETTINGS_PATH = Path("/.settings/example.json")
+
+        try:
+            msf._merge(UserSettings())
+            assert msf.EXAMPLE_SETTINGS_PATH == "/.settings/example.json", f"Actual: {msf.EXAMPLE_SETTINGS_PATH!r}"
+        finally:
+            del msf.EXAMPLE_SETTINGS_PATH
+
+    def test_journal_store__append_replay_compact(self):
+        from msf.device import JournalStore
+
+        path = "/tmp/msf_test_journal.json"
+        for leftover in (path, path + ".journal", path + ".tmp"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        store = JournalStore(path, compact_after=5)
+        store.set("pump", "speed", {"value": "1", "type": "int", "description": "Speed."})
+        store.set("pump", "mode", {"value": "auto", "type": "str", "description": "Mode."})
+        store.commit()
+        store.set_value("pump", "speed", "2")
+        store.commit()
+        assert store.journal_lines == 3 and store.compactions == 0
+        with open(path + ".journal", "a") as file:
+            file.write('["pump", "speed", {"val')  # torn by a power loss
+
+        store.reload()
+        assert store.get("pump", "speed")["value"] == "2" and store.get("pump", "mode")["value"] == "auto"
+        store.set_value("pump", "speed", "3")
+        store.commit()
+        store.reload()
+        assert store.get("pump", "speed")["value"] == "3" and store.journal_lines == 4
+        store.set_value("pump", "mode", "manual")
+        store.commit()  # fifth line: compacts inline, since background is off
+        assert store.compactions == 1 and store.journal_lines == 0
+        with open(path) as file:
+            snapshot = json.load(file)  # the same format as the default store
+        assert snapshot["pump"]["speed"]["value"] == "3", f"Actual: {snapshot}"
+        store.reload()
+        assert store.get("pump", "speed")["value"] == "3"
+
+        async def in_background():
+            for value in range(5):
+                store.set_value("pump", "speed", str(value))
+                store.commit()
+            assert store.compactions == 1 and store.journal_lines == 5  # scheduled, not yet run
+            await asyncio.sleep(0.01)
+
+        store.background = True
+        asyncio.run(in_background())
+        assert store.compactions == 2 and store.journal_lines == 0, f"Actual: {store.compactions}"
+
+    def test_swap_singletons__separate_registries(self):
+        from msf.utils.singleton import get_sniffs, swap_singletons
+
+        registry = DevicesRegistry()
+        sniffs = get_sniffs()
+        previous = swap_singletons({})
+        try:
+            node_registry = DevicesRegistry()
+            node_registry.store = SettingsStore("/tmp/msf_test_node_devices.json")
+            Device("foo", [Setting("bar", 1, "Bar.")])
+            assert node_registry is not registry and get_sniffs() is not sniffs
+            assert DevicesRegistry() is node_registry and "foo" in node_registry
+        finally:
+            swap_singletons(previous)
+        assert DevicesRegistry() is registry and get_sniffs() is sniffs
+        assert "foo" not in registry
+
 
 unittest.main()
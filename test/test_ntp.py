@@ -0,0 +1,113 @@
+import asyncio
+import socket
+import struct
+import unittest
+import sys
+import os
+
+sys.path.append(os.getcwd())
+
+from msf.utils.ntp import (
+    MICROPYTHON_EPOCH_S,
+    NTP_UNIX_DELTA_S,
+    NtpClient,
+    NtpError,
+    WallClock,
+    ntp_request,
+    parse_ntp_reply,
+    rtc_to_unix_ms,
+)
+
+SERVER_PORT = 12323
+SERVER_TIME_MS = 1_700_000_000_250  # what the stand-in server reports, in Unix epoch ms
+
+
+def ntp_timestamp(unix_ms: int) -> tuple:
+    seconds, ms = divmod(unix_ms, 1000)
+    return seconds + NTP_UNIX_DELTA_S, (ms << 32) // 1000
+
+
+def ntp_reply(request, unix_ms: int, stratum: int = 2) -> bytearray:
+    reply = bytearray(48)
+    reply[0] = 0x1C  # LI 0, version 3, mode 4 (server)
+    reply[1] = stratum
+    reply[24:32] = request[40:48]  # originate: the client's transmit timestamp
+    struct.pack_into("!IIII", reply, 32, *(ntp_timestamp(unix_ms) + ntp_timestamp(unix_ms)))
+    return reply
+
+
+async def serve(sock, count: int):
+    """Local UDP stand-in for an NTP server: answer `count` requests with `SERVER_TIME_MS`."""
+    while count:
+        try:
+            request, address = sock.recvfrom(48)
+        except OSError:
+            await asyncio.sleep(0.005)
+            continue
+        sock.sendto(ntp_reply(request, SERVER_TIME_MS), address)
+        count -= 1
+
+
+class NtpTests(unittest.TestCase):
+    def test_sync__against_local_server(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(socket.getaddrinfo("127.0.0.1", SERVER_PORT)[0][-1])
+        server.setblocking(False)
+        client = NtpClient(servers=("127.0.0.1",), port=SERVER_PORT, timeout_ms=1000, update_rtc=False)
+
+        async def exchange():
+            server_task = asyncio.create_task(serve(server, 1))
+            synced = await client.sync()
+            await server_task
+            return synced
+
+        try:
+            synced = asyncio.run(exchange())
+        finally:
+            server.close()
+        assert synced and client.clock.synced and client.syncs == 1
+        now_ms = client.clock.time_ms()
+        assert SERVER_TIME_MS <= now_ms < SERVER_TIME_MS + 1000, f"Actual: {now_ms}"
+
+    def test_sync__no_reply(self):
+        client = NtpClient(servers=("127.0.0.1",), port=SERVER_PORT + 1, timeout_ms=50, update_rtc=False)
+        assert not asyncio.run(client.sync())
+        assert client.failures == 1 and not client.clock.synced
+
+    def test_parse_reply__rejected(self):
+        request = ntp_request(1234)
+        assert parse_ntp_reply(ntp_reply(request, SERVER_TIME_MS), 1234) == (SERVER_TIME_MS, SERVER_TIME_MS)
+        for reply, transmit in (
+            (ntp_reply(request, SERVER_TIME_MS), 4321),  # not the reply to our request
+            (ntp_reply(request, SERVER_TIME_MS, stratum=0), 1234),  # kiss-of-death
+            (ntp_reply(request, SERVER_TIME_MS)[:40], 1234),
+        ):
+            try:
+                parse_ntp_reply(reply, transmit)
+            except NtpError:
+                continue
+            raise AssertionError("Expected NtpError")
+
+    def test_wall_clock__drift(self):
+        clock = WallClock()
+        clock.set(1_000_000, 0)
+        assert clock.time_ms(60_000) == 1_060_000
+        clock.set(1_060_006, 60_000)  # the local clock ran 100 ppm slow
+        assert clock.last_error_ms == 6
+        assert abs(clock.drift_ppm - 100) < 0.01, f"Actual: {clock.drift_ppm}"
+        assert clock.time_ms(120_000) == 1_120_012, f"Actual: {clock.time_ms(120_000)}"
+
+    def test_wall_clock__unsynced_rtc_is_utc(self):
+        offset_s = -4 * 60 * 60
+        utc_ms = 1_700_000_000_250
+        local_ms = utc_ms + offset_s * 1000  # the RTC as NtpClient sets it
+        assert rtc_to_unix_ms(local_ms, offset_s, 1970) == utc_ms
+        assert rtc_to_unix_ms(local_ms - MICROPYTHON_EPOCH_S * 1000, offset_s, 2000) == utc_ms
+
+        clock = WallClock(rtc_offset_s=offset_s, rtc=lambda: utc_ms)
+        assert not clock.synced and clock.time_ms() == utc_ms
+        clock.set(utc_ms + 1000, 0)
+        assert clock.time_ms(0) == utc_ms + 1000  # the RTC is no longer read once synced
+
+
+unittest.main()
@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 import sys
 import os
@@ -5,11 +6,44 @@ import os
 sys.path.append(os.getcwd())
 
 from msf.sensor import (
+    InvalidSensorConstructorArgs,
     LocalSensorsRegistry,
     RemoteSensorsRegistry,
     LocalSensor,
     RemoteSensor,
+    PublishPolicy,
+    BatchPublisher,
+    decode_frame,
+    History,
+    OfflineQueue,
+    DROP_OLDEST,
+    COALESCE_LATEST,
+    PollScheduler,
+    DerivedSensor,
+    Mean,
+    BackgroundPublisher,
+    BLOCK,
+    TimeSeriesStore,
+    RAW,
+    MINUTE,
+    decode_chunk,
+    Window,
 )
+from msf.utils.singleton import get_sniffs
+from msf.utils.events import CallbackQueue
+from msf.utils.codec import FLOAT32, INT16, SUMMARY, TEXT, Summary, set_topic_codec
+
+
+class RecordingClient:
+    def __init__(self, connected=True):
+        self.published = []
+        self.connected = connected
+
+    def isconnected(self):
+        return self.connected
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        self.published.append((topic, msg))
 
 
 class SensorTests(unittest.TestCase):
@@ -57,5 +91,640 @@ class SensorTests(unittest.TestCase):
         assert value_updated == 22, f"Expected: 22, Actual: {value_updated}"
         assert self.remote_sensors_registry.get("foo").value == 22, f"Expected: 22, Actual: {self.remote_sensors_registry.get('foo').value}"
 
+    def test_remote_sensor_wildcard_dispatch(self):
+        value_updated = 0
+        self.remote_sensors_registry.wildcard_dispatch = True
+        try:
+            remote_sensor = RemoteSensor(name="foo")
+            override_sensor = RemoteSensor(name="bar", topic_override="abc123")
+        finally:
+            self.remote_sensors_registry.wildcard_dispatch = False
+
+        @remote_sensor.on_update()
+        def update_new_value(value):
+            nonlocal value_updated
+            value_updated = value
+
+        self.remote_sensors_registry.dispatch("foo", "22")
+        self.remote_sensors_registry.dispatch("bar", "33")  # has its own route, not dispatched
+        self.remote_sensors_registry.dispatch("unknown", "44")  # dropped
+
+        assert value_updated == "22", f"Expected: 22, Actual: {value_updated}"
+        assert remote_sensor.value == "22", f"Expected: 22, Actual: {remote_sensor.value}"
+        assert override_sensor.value is None, f"Expected: None, Actual: {override_sensor.value}"
+
+    def test_sensor_topics__shared_between_sensors(self):
+        remote_sensor = RemoteSensor(name="foo")
+        local_sensor = LocalSensor(name="foo")
+        assert local_sensor.topic is remote_sensor.topic, f"Actual: {local_sensor.topic}, {remote_sensor.topic}"
+
+    def test_publish_policy__deadband(self):
+        policy = PublishPolicy(deadband=0.5)
+        assert not policy.should_publish(20.0, 0, 20.4, 10)
+        assert policy.should_publish(20.0, 0, 20.6, 10)
+        assert policy.should_publish("open", 0, "closed", 10)
+
+    def test_publish_policy__deadband_percent(self):
+        policy = PublishPolicy(deadband_percent=10)
+        assert not policy.should_publish(100, 0, 109, 10)
+        assert policy.should_publish(100, 0, 111, 10)
+
+    def test_publish_policy__intervals(self):
+        policy = PublishPolicy(min_interval_ms=100, max_interval_ms=1000)
+        assert policy.should_publish(None, None, 1, 0)  # never published
+        assert not policy.should_publish(1, 0, 2, 50)  # too soon
+        assert policy.should_publish(1, 0, 2, 150)
+        assert not policy.should_publish(1, 0, 1, 150)  # unchanged
+        assert policy.should_publish(1, 0, 1, 1000)  # heartbeat
+
+    def test_local_sensor_policy__counters(self):
+        sniffs = get_sniffs()
+        client, sniffs.client = sniffs.client, RecordingClient()
+        try:
+            local_sensor = LocalSensor(name="foo", policy=PublishPolicy())
+
+            async def updates():
+                for value in (1, 1, 1, 2, 2):
+                    await local_sensor.update(value)
+
+            asyncio.run(updates())
+            published = sniffs.client.published
+        finally:
+            sniffs.client = client
+
+        assert local_sensor.value == 2
+        assert local_sensor.published_count == 2, f"Expected: 2, Actual: {local_sensor.published_count}"
+        assert local_sensor.suppressed_count == 3, f"Expected: 3, Actual: {local_sensor.suppressed_count}"
+        assert published == [(local_sensor.topic, "1"), (local_sensor.topic, "2")], f"Actual: {published}"
+
+    def test_batch_publisher__one_frame(self):
+        sniffs = get_sniffs()
+        client, sniffs.client = sniffs.client, RecordingClient()
+        try:
+            batch = BatchPublisher("node", max_samples=3)
+            foo = LocalSensor(name="foo", batch=batch)
+            bar = LocalSensor(name="bar", batch=batch)
+
+            async def updates():
+                await foo.update(1)
+                await bar.update(2.5)
+                assert sniffs.client.published == []
+                await foo.update("three")
+
+            asyncio.run(updates())
+            published = sniffs.client.published
+        finally:
+            sniffs.client = client
+
+        assert len(published) == 1, f"Expected: 1, Actual: {len(published)}"
+        topic, frame = published[0]
+        assert topic == batch.topic
+        samples = decode_frame(frame)
+        assert [(name, value) for name, value, _ in samples] == [("foo", 1), ("bar", 2.5), ("foo", "three")]
+        assert samples[0][2] <= samples[2][2]
+
+    def test_remote_sensor_receive_batch(self):
+        received = []
+        foo = RemoteSensor(name="foo")
+        RemoteSensor(name="bar")
+
+        @foo.on_update()
+        def update_new_value(value):
+            received.append(value)
+
+        frame = '{"t": 1000, "s": [["foo", 1, -20], ["bar", 2.5, -10], ["unknown", 3, -5], ["foo", 4, 0]]}'
+        self.remote_sensors_registry.receive_batch(frame)
+
+        assert received == ["1", "4"], f"Expected: ['1', '4'], Actual: {received}"
+        assert foo.timestamp == 1000
+        assert self.remote_sensors_registry.get("bar").value == "2.5"
+        assert self.remote_sensors_registry.get("bar").timestamp == 990
+
+    def test_struct_codec__round_trip(self):
+        assert INT16.decode(INT16.encode(-1234)) == -1234
+        assert len(FLOAT32.encode(21.5)) == 4
+        assert FLOAT32.decode(FLOAT32.encode(21.5)) == 21.5
+        assert FLOAT32.decode("21.5") == 21.5  # text payloads are still understood
+        with self.assertRaises(ValueError):
+            INT16.decode(b"\x00")
+
+    def test_remote_sensor_codec__decodes_on_receipt(self):
+        remote_sensor = RemoteSensor(name="foo", codec=FLOAT32)
+        remote_sensor._receive(FLOAT32.encode(21.5))
+        assert remote_sensor.value == 21.5, f"Expected: 21.5, Actual: {remote_sensor.value}"
+        remote_sensor._receive(b"\x00")  # malformed, dropped
+        assert remote_sensor.value == 21.5
+
+    def test_local_sensor_codec__topic_codec(self):
+        set_topic_codec("abc123", INT16)
+        sniffs = get_sniffs()
+        client, sniffs.client = sniffs.client, RecordingClient()
+        try:
+            local_sensor = LocalSensor(name="foo", topic_override="abc123")
+            asyncio.run(local_sensor.update(300))
+            published = sniffs.client.published
+        finally:
+            sniffs.client = client
+            set_topic_codec("abc123", TEXT)
+        assert local_sensor.codec is INT16
+        assert published == [("abc123", INT16.encode(300))], f"Actual: {published}"
+
+    def test_remote_sensor_on_update__multiple_and_async_subscribers(self):
+        received = []
+        remote_sensor = RemoteSensor(name="foo")
+
+        @remote_sensor.on_update()
+        def first(value):
+            received.append(("first", value))
+
+        @remote_sensor.on_update()
+        async def second(value):
+            await asyncio.sleep(0)
+            received.append(("second", value))
+
+        async def receive():
+            self.remote_sensors_registry.update_remote_sensor("foo", 22)
+            assert received == [("first", 22)]  # the async subscriber does not run inline
+            await CallbackQueue().drain()
+
+        asyncio.run(receive())
+        assert received == [("first", 22), ("second", 22)], f"Actual: {received}"
+        assert [(stats.name, stats.calls) for stats in remote_sensor.subscribers.stats()] == [("first", 1), ("second", 1)]
+
+        remote_sensor.remove_on_update(first)
+        assert len(remote_sensor.subscribers) == 1
+
+    def test_callback_queue__drops_oldest_when_full(self):
+        queue = CallbackQueue()
+        received = []
+        remote_sensor = RemoteSensor(name="foo")
+
+        @remote_sensor.on_update()
+        async def slow(value):
+            received.append(value)
+
+        async def burst():
+            dropped = queue.dropped
+            for value in range(queue.size + 3):
+                self.remote_sensors_registry.update_remote_sensor("foo", value)
+            await queue.drain()
+            return queue.dropped - dropped
+
+        dropped = asyncio.run(burst())
+        # the first call starts right away; the rest wait for it, one at a time, and the two oldest waiting are dropped
+        assert dropped == 2, f"Expected: 2, Actual: {dropped}"
+        assert received == [0] + list(range(3, queue.size + 3)), f"Actual: {received}"
+
+    def test_callback_queue__slow_subscriber_does_not_delay_others(self):
+        received = []
+        slow_sensor = RemoteSensor(name="slow")
+        fast_sensor = RemoteSensor(name="fast")
+
+        @slow_sensor.on_update()
+        async def slow(value):
+            await asyncio.sleep(0.05)
+            received.append(("slow", value))
+
+        @fast_sensor.on_update()
+        async def fast(value):
+            await asyncio.sleep(0)
+            received.append(("fast", value))
+
+        async def receive():
+            for value in (1, 2):
+                self.remote_sensors_registry.update_remote_sensor("slow", value)
+                self.remote_sensors_registry.update_remote_sensor("fast", value)
+            await CallbackQueue().drain()
+
+        asyncio.run(receive())
+        assert received == [("fast", 1), ("fast", 2), ("slow", 1), ("slow", 2)], f"Actual: {received}"
+
+    def test_history__rolling_stats(self):
+        history = History(3)
+        assert history.mean is None and history.min is None
+        for ticks, value in enumerate((4.0, 1.0, 7.0, 2.0)):
+            history.append(value, ticks)
+        # window is [1.0, 7.0, 2.0]
+        assert len(history) == 3
+        assert history.min == 1.0 and history.max == 7.0, f"Actual: {history}"
+        assert abs(history.mean - 10 / 3) < 1e-5, f"Actual: {history.mean}"
+        assert abs(history.variance - 62 / 9) < 1e-4, f"Actual: {history.variance}"
+        assert list(history.items()) == [(1, 1.0), (2, 7.0), (3, 2.0)]
+        assert history.latest == 2.0
+
+    def test_remote_sensor_history(self):
+        remote_sensor = RemoteSensor(name="foo", history=4)
+        for message in ("1", "2", "not a number", "3"):
+            remote_sensor._receive(message)
+        assert remote_sensor.value == "3"
+        assert len(remote_sensor.history) == 3
+        assert remote_sensor.history.mean == 2.0
+
+    def test_offline_queue__drop_oldest_and_drain(self):
+        sniffs = get_sniffs()
+        client, sniffs.client = sniffs.client, RecordingClient(connected=False)
+        try:
+            queue = OfflineQueue(size=3, drain_interval_ms=0)
+            local_sensor = LocalSensor(name="foo", offline=queue)
+
+            async def outage():
+                for value in range(5):
+                    await local_sensor.update(value)
+                assert sniffs.client.published == []
+                sniffs.client.connected = True
+                await queue.drain(sniffs.client)
+
+            asyncio.run(outage())
+            published = sniffs.client.published
+        finally:
+            sniffs.client = client
+
+        assert published == [(local_sensor.topic, "2"), (local_sensor.topic, "3"), (local_sensor.topic, "4")], f"Actual: {published}"
+        stats = queue.stats()
+        assert stats["dropped"] == 2 and stats["max_depth"] == 3 and stats["depth"] == 0, f"Actual: {stats}"
+
+    def test_offline_queue__coalesce_latest_and_spill(self):
+        spill_path = "/tmp/msf_test_offline_spill"
+        try:
+            os.remove(spill_path)
+        except OSError:
+            pass
+        queue = OfflineQueue(size=2, policy=COALESCE_LATEST, spill_path=spill_path, spill_max=1, drain_interval_ms=0)
+        for topic, payload in (("a", "1"), ("b", "1"), ("a", "2"), ("c", "1"), ("d", b"\x01"), ("e", "1")):
+            queue.put(topic, payload)
+        # "a" coalesced, then spilled to flash when "c" arrived; "b" and "c" dropped once the spill file was full
+        assert queue.coalesced == 1 and queue.spilled == 1 and queue.dropped == 2, f"Actual: {queue.stats()}"
+
+        client = RecordingClient()
+        asyncio.run(queue.drain(client))
+        assert client.published == [("a", "2"), ("d", b"\x01"), ("e", "1")], f"Actual: {client.published}"
+        assert queue.depth == 0
+
+    def test_offline_queue__interrupted_drain_keeps_messages(self):
+        spill_path = "/tmp/msf_test_offline_interrupted"
+        for path in (spill_path, spill_path + ".drain"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        class FailingClient(RecordingClient):
+            def __init__(self, failures_after):
+                super().__init__()
+                self.failures_after = failures_after
+
+            async def publish(self, topic, msg, retain=False, qos=0):
+                if len(self.published) >= self.failures_after:
+                    raise OSError("Connection lost")
+                await super().publish(topic, msg, retain, qos)
+
+        queue = OfflineQueue(size=2, spill_path=spill_path, spill_max=4, drain_interval_ms=0)
+        for value in range(5):  # "0" to "2" spilled, "3" and "4" in RAM
+            queue.put("a", str(value))
+        published = []
+        for failures_after, depth in ((1, 4), (3, 1)):  # lost mid-spill, then mid-RAM
+            client = FailingClient(failures_after)
+            with self.assertRaises(OSError):
+                asyncio.run(queue.drain(client))
+            published += client.published
+            assert queue.depth == depth, f"Actual: {queue.stats()}"
+        client = RecordingClient()
+        asyncio.run(queue.drain(client))
+        published += client.published
+        assert published == [("a", str(value)) for value in range(5)], f"Actual: {published}"
+        assert queue.depth == 0 and queue.drained == 5
+
+        # a reset during a drain: the next queue picks up the drain file and drains it first, from the start
+        for value in range(5):
+            queue.put("b", str(value))
+        with self.assertRaises(OSError):
+            asyncio.run(queue.drain(FailingClient(1)))
+        queue.put("b", "5")  # pushes "3" out of RAM, into a fresh spill file
+        queue = OfflineQueue(size=2, spill_path=spill_path, spill_max=4, drain_interval_ms=0)
+        assert queue.depth == 4, f"Actual: {queue.stats()}"  # 3 in the drain file and "3"; RAM was lost
+        client = RecordingClient()
+        asyncio.run(queue.drain(client))
+        assert client.published == [("b", "0"), ("b", "1"), ("b", "2"), ("b", "3")], f"Actual: {client.published}"
+
+    def test_metrics__sensor_counts_and_latency(self):
+        from msf.utils.metrics import metrics
+
+        remote_sensor = RemoteSensor(name="foo")
+        local_sensor = LocalSensor(name="bar")
+        remote_sensor.on_update()(lambda value: None)
+        sniffs = get_sniffs()
+        client = sniffs.client
+        sniffs.client = RecordingClient()
+        metrics.enabled = True
+        try:
+            remote_sensor._receive("1")
+            remote_sensor._receive("2")
+            asyncio.run(local_sensor.update(3))
+            snapshot = metrics.snapshot()
+        finally:
+            metrics.enabled = False
+            metrics.reset()
+            sniffs.client = client
+        assert snapshot["received"] == {"foo": 2} and snapshot["published"] == {"bar": 1}, f"Actual: {snapshot}"
+        assert snapshot["histograms"]["dispatch_us"]["count"] == 2
+        assert snapshot["histograms"]["callback_us"]["count"] == 2
+        assert sum(snapshot["histograms"]["dispatch_us"]["buckets"]) == 2
+
+    def test_poll_scheduler__grouped_ticks_and_adaptive_interval(self):
+        scheduler = PollScheduler()
+        scheduler.reset()
+        steady_sensor = LocalSensor(name="steady")
+        moving_sensor = LocalSensor(name="moving")
+        readings = iter(range(1000))
+
+        async def read_moving():
+            return next(readings)
+
+        scheduler.add(steady_sensor, lambda: 20.0, interval_ms=20, max_interval_ms=80, threshold=0.5)
+        scheduler.add(moving_sensor, read_moving, interval_ms=20, max_interval_ms=80, threshold=0.5)
+        sniffs = get_sniffs()
+        client = sniffs.client
+        sniffs.client = RecordingClient()
+
+        async def poll_for_a_while():
+            scheduler.start()
+            await asyncio.sleep(0.25)
+
+        try:
+            asyncio.run(poll_for_a_while())
+            published = sniffs.client.published
+            stats = scheduler.stats()
+            ticks = scheduler.ticks
+        finally:
+            scheduler.reset()
+            sniffs.client = client
+
+        steady, moving = stats["steady"], stats["moving"]
+        assert steady["interval_ms"] == 80, f"Actual: {steady}"  # backed off
+        assert moving["interval_ms"] == 20, f"Actual: {moving}"  # kept sampling fast
+        assert moving["runs"] > steady["runs"] + 3, f"Actual: {stats}"
+        assert ticks == moving["runs"], f"Expected steady reads grouped into moving ticks, actual: {ticks}, {stats}"
+        assert len(published) == steady["runs"] + moving["runs"]
+        assert moving["jitter_max_ms"] < 20 and moving["errors"] == 0, f"Actual: {moving}"
+
+    def test_derived_sensor__recomputes_on_change(self):
+        temperature = RemoteSensor(name="temperature")
+        humidity = RemoteSensor(name="humidity")
+        spread = DerivedSensor("spread", ("temperature", humidity), compute=lambda t, h: float(t) - float(h) / 10)
+        updates = []
+        spread.on_update()(updates.append)
+
+        temperature._receive("20")
+        assert spread.value is None  # humidity has no value yet
+        humidity._receive("50")
+        temperature._receive("20")  # same input value, same result: no update
+        humidity._receive("60")
+        assert updates == [15.0, 14.0], f"Actual: {updates}"
+
+    def test_derived_sensor__lazy_and_aggregate(self):
+        zone = [RemoteSensor(name=f"zone_{i}") for i in range(50)]
+        mean = DerivedSensor("zone_mean", zone, aggregate=Mean(), lazy=True)
+        for i, sensor in enumerate(zone):
+            sensor._receive(str(i))
+        assert mean.recomputes == 0
+        assert mean.value == 24.5 and mean.value == 24.5
+        assert mean.recomputes == 1, f"Actual: {mean.recomputes}"
+        zone[0]._receive("50")
+        assert mean.value == 25.5, f"Actual: {mean.value}"
+
+    def test_derived_sensor__rate_limited_and_published(self):
+        source = RemoteSensor(name="source")
+        published_sensor = LocalSensor(name="doubled")
+        doubled = DerivedSensor(
+            "doubled", (source,), compute=lambda v: int(v) * 2, min_interval_ms=50, publish=published_sensor
+        )
+        sniffs = get_sniffs()
+        client = sniffs.client
+        sniffs.client = RecordingClient()
+
+        async def burst():
+            for value in range(1, 6):
+                source._receive(str(value))
+            await asyncio.sleep(0.1)
+            await CallbackQueue().drain()
+
+        try:
+            asyncio.run(burst())
+            published = sniffs.client.published
+        finally:
+            sniffs.client = client
+        assert doubled.value == 10 and doubled.recomputes == 3, f"Actual: {doubled.value}, {doubled.recomputes}"
+        assert published == [(published_sensor.topic, "2"), (published_sensor.topic, "10")], f"Actual: {published}"
+
+    def test_local_sensor_preallocate__reuses_buffers(self):
+        text_sensor = LocalSensor(name="foo", preallocate=True)
+        binary_sensor = LocalSensor(name="bar", codec=INT16, preallocate=True)
+        sniffs = get_sniffs()
+        client = sniffs.client
+        sniffs.client = RecordingClient()
+
+        async def updates():
+            payloads = []
+            for sensor, value in ((text_sensor, -1234), (text_sensor, 7), (text_sensor, 2.5), (binary_sensor, -300)):
+                await sensor.update(value)
+                topic, payload = sniffs.client.published[-1]
+                payloads.append((topic, payload if isinstance(payload, str) else bytes(payload)))
+            return payloads
+
+        try:
+            payloads = asyncio.run(updates())
+        finally:
+            sniffs.client = client
+        assert payloads == [
+            (text_sensor.topic.encode(), b"-1234"),
+            (text_sensor.topic.encode(), b"7"),
+            (text_sensor.topic.encode(), "2.5"),
+            (binary_sensor.topic.encode(), INT16.encode(-300)),
+        ], f"Actual: {payloads}"
+        assert INT16.decode(INT16.encode(-300)) == -300
+
+    def test_local_sensor_publisher__backpressure_policies(self):
+        class SlowClient(RecordingClient):
+            async def publish(self, topic, msg, retain=False, qos=0):
+                await asyncio.sleep(0.001)
+                self.published.append((topic, msg))
+
+        sniffs = get_sniffs()
+        client = sniffs.client
+
+        async def updates(policy):
+            sniffs.client = SlowClient()
+            publisher = BackgroundPublisher(size=2, policy=policy)
+            foo = LocalSensor(name="foo", publisher=publisher)
+            bar = LocalSensor(name="bar", publisher=publisher)
+            for value in range(5):
+                foo.update_nowait(value)
+            await bar.update("x")
+            await publisher.drain()
+            return [(topic.split("/")[-2], msg) for topic, msg in sniffs.client.published], publisher.stats()
+
+        try:
+            dropped, dropped_stats = asyncio.run(updates(DROP_OLDEST))
+            coalesced, coalesced_stats = asyncio.run(updates(COALESCE_LATEST))
+            blocked, blocked_stats = asyncio.run(updates(BLOCK))
+        finally:
+            sniffs.client = client
+        # nothing is published until the first await, so the queue only ever holds two updates
+        assert dropped == [("foo", "4"), ("bar", "x")], f"Actual: {dropped}"
+        assert dropped_stats["dropped"] == 4 and dropped_stats["max_depth"] == 2
+        assert coalesced == [("foo", "4"), ("bar", "x")], f"Actual: {coalesced}"
+        assert coalesced_stats["coalesced"] == 4 and coalesced_stats["dropped"] == 0
+        assert blocked == [("foo", "0"), ("foo", "1"), ("bar", "x")], f"Actual: {blocked}"
+        assert blocked_stats["rejected"] == 4  # update_nowait cannot wait; the awaited update did
+        assert blocked_stats["latency_max_us"] >= 1000  # "x" waited for a slow publish
+
+    def test_timeseries_store__tiers_budget_and_upload(self):
+        directory = "/tmp/msf_test_timeseries"
+        try:
+            for file_name in os.listdir(directory):
+                os.remove(directory + "/" + file_name)
+        except OSError:
+            pass
+        tiers = ((RAW, 1024), (MINUTE, 512))
+        store = TimeSeriesStore(directory + "/data", tiers=tiers, block_size=64)
+        local_sensor = LocalSensor(name="foo", timeseries=store)
+        sniffs = get_sniffs()
+        client = sniffs.client
+        sniffs.client = RecordingClient()
+        start_ms = 1_700_000_040_000  # a whole minute
+        try:
+            for i in range(1200):
+                local_sensor._accept(20 + (i % 60) / 10)  # record without publishing
+                store.append("bar", 1.5, start_ms + i * 1000)  # explicit times
+            store.append("bar", "not a number")
+            store.close()
+            # reopened from flash, as after a reset
+            store = TimeSeriesStore(directory + "/data", tiers=tiers, block_size=64)
+            raw = list(store.query("bar"))
+            minutes = list(store.query("bar", period_ms=MINUTE))
+            sent = asyncio.run(store.upload("bar", start_ms=start_ms + 1150 * 1000, chunk_size=20, interval_ms=0))
+            chunks = [decode_chunk(message) for _, message in sniffs.client.published]
+        finally:
+            sniffs.client = client
+        stats = store.stats()
+        assert store.series == ["foo", "bar"] and len(list(store.query("foo"))) > 0
+        assert stats["stored_bytes"][RAW] <= 1024 and stats["stored_bytes"][MINUTE] <= 512, f"Actual: {stats}"
+        # the oldest raw samples made room for newer ones; minute aggregates reach further back
+        assert 0 < len(raw) < 1200 and raw[-1] == (start_ms + 1199 * 1000, 1.5), f"Actual: {raw[-1]}"
+        assert len(minutes) == 20 and minutes[0] == (start_ms, 60, 1.5, 1.5, 1.5), f"Actual: {minutes[:1]}"
+        assert sent == 50 and [chunk["seq"] for chunk in chunks] == [0, 1, 2]
+        assert [len(chunk["rows"]) for chunk in chunks] == [20, 20, 10] and chunks[-1]["last"]
+        assert chunks[0]["rows"][0] == [start_ms + 1150 * 1000, 1.5]
+
+    def test_timeseries_store__reopens_root_level_segments(self):
+        path = "/msf_test_timeseries"
+        try:
+            open(path + ".series", "w").close()
+        except OSError:
+            self.skipTest("the root directory is not writable")
+        tiers = ((RAW, 256),)
+        try:
+            store = TimeSeriesStore(path, tiers=tiers, block_size=64)
+            for i in range(100):
+                store.append("foo", i, 1_700_000_000_000 + i * 1000)
+            store.close()
+            # reopened, as after a reset: segments from the previous boot count against the budget
+            store = TimeSeriesStore(path, tiers=tiers, block_size=64)
+            assert store.stats()["stored_bytes"][RAW] > 0, f"Actual: {store.stats()}"
+            for i in range(100, 400):
+                store.append("foo", i, 1_700_000_000_000 + i * 1000)
+            store.close()
+            stats = store.stats()
+            assert stats["stored_bytes"][RAW] <= 256, f"Actual: {stats}"
+            files = [name for name in os.listdir("/") if name.startswith("msf_test_timeseries.0.")]
+            assert len(files) <= 4, f"Actual: {files}"  # SEGMENTS_PER_TIER
+            assert list(store.query("foo"))[-1] == (1_700_000_000_000 + 399 * 1000, 399)
+        finally:
+            for name in os.listdir("/"):
+                if name.startswith("msf_test_timeseries."):
+                    os.remove("/" + name)
+
+    def test_window__tumbling_and_sliding(self):
+        tumbling = Window(1000)
+        sliding = Window(1000, slide_ms=250)
+        tumbling_summaries = []
+        sliding_summaries = []
+        for now, value in ((0, 1), (100, 3), (900, "2"), (1000, 10), (1300, "x"), (1600, 20), (5000, 7)):
+            tumbling_summaries.append(tumbling.add(value, now))
+            sliding_summaries.append(sliding.add(value, now))
+        assert tumbling_summaries == [
+            None, None, None, Summary(3, 2.0, 1, 3, 2.0), None, None, Summary(2, 15.0, 10, 20, 20)
+        ], f"Actual: {tumbling_summaries}"
+        # every 250 ms, the last 1000 ms: by 1600 the slide holding the first two samples has left the window
+        assert sliding_summaries == [
+            None, None, Summary(2, 2.0, 1, 3, 3), Summary(3, 2.0, 1, 3, 2.0), None, Summary(2, 6.0, 2.0, 10, 10),
+            Summary(3, 32 / 3, 2.0, 20, 20),
+        ], f"Actual: {sliding_summaries}"
+        assert tumbling.summaries == 2 and sliding.summaries == 4
+
+    def test_local_sensor_window__publishes_summaries_for_remote_sensors(self):
+        window = Window(1000)
+        local_sensor = LocalSensor(name="foo", window=window)
+        remote_sensor = RemoteSensor(name="foo", codec=SUMMARY, history=4)
+        sniffs = get_sniffs()
+        client = sniffs.client
+        sniffs.client = RecordingClient()
+
+        async def updates():
+            for value in (1, 2, 6):
+                await local_sensor.update(value)
+            window._pane_ticks -= 1000  # the window has ended
+            await local_sensor.update(5)
+
+        try:
+            asyncio.run(updates())
+            published = sniffs.client.published
+        finally:
+            sniffs.client = client
+        assert local_sensor.value == 5 and local_sensor.published_count == 1
+        assert len(published) == 1 and published[0][0] == local_sensor.topic
+        remote_sensor._receive(published[0][1])
+        assert remote_sensor.value == Summary(3, 3.0, 1, 6, 6), f"Actual: {remote_sensor.value}"
+        assert remote_sensor.history.latest == 3.0  # histories keep the mean
+        with self.assertRaises(InvalidSensorConstructorArgs):
+            LocalSensor(name="bar", window=Window(1000), codec=FLOAT32)
+        with self.assertRaises(InvalidSensorConstructorArgs):
+            LocalSensor(name="bar", window=Window(1000), batch=BatchPublisher("node"))
+
+    def test_loop_monitor__attributes_stalls(self):
+        import time
+        from msf.utils.loop_monitor import loop_monitor
+
+        loop_monitor.enabled = True
+        loop_monitor.interval_ms = 5
+        loop_monitor.stall_us = 20_000
+        loop_monitor.reset()
+        remote_sensor = RemoteSensor(name="foo")
+
+        @remote_sensor.on_update()
+        def blocking_callback(value):
+            time.sleep(0.05)
+
+        async def stalls():
+            loop_monitor.start()
+            await asyncio.sleep(0.02)
+            remote_sensor._receive("1")  # stalls in the callback
+            await asyncio.sleep(0.02)
+            time.sleep(0.05)  # stalls in uninstrumented code
+            await asyncio.sleep(0.02)
+            loop_monitor.enabled = False
+            await asyncio.sleep(0.01)
+
+        try:
+            asyncio.run(stalls())
+            stats = loop_monitor.stats()
+        finally:
+            loop_monitor.enabled = False
+            loop_monitor.reset()
+        assert stats["stalls"] == 2, f"Actual: {stats}"
+        assert set(stats["culprits"]) == {"blocking_callback", "unknown"}, f"Actual: {stats['culprits']}"
+        assert stats["last_stall"][0] == "unknown" and stats["max_lag_us"] >= 40_000
+        assert stats["p50_lag_us"] < 20_000 <= stats["p99_lag_us"] and stats["ticks"] > 4
+
 
 unittest.main()